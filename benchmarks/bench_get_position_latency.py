@@ -0,0 +1,107 @@
+"""
+Latency of `/get_position` polls while `share_data` commits sessions to the database
+concurrently, with the database calls offloaded to the thread pool as the routes do, or
+run on the event loop (`--blocking`) as before.
+
+The latency of a poll is measured from when it was due, so it includes the time the
+event loop was blocked. Uses a temporary SQLite database.
+
+    python -m benchmarks.bench_get_position_latency --pollers 200 --commits 500
+    python -m benchmarks.bench_get_position_latency --pollers 200 --commits 500 --blocking
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from types import SimpleNamespace
+
+# The coordination server reads its database URL on import
+_tmp_dir = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp_dir.name}/coordination.db"
+
+from starlette.concurrency import run_in_threadpool
+
+from mpc_demo_infra.coordination_server import routes
+from mpc_demo_infra.coordination_server.database import (
+    Base, MPCSession, SessionLocal, add_mpc_session, engine, get_dataset_counters, init_dataset_metadata,
+)
+from mpc_demo_infra.coordination_server.schemas import RequestGetPositionRequest
+from mpc_demo_infra.coordination_server.user_queue import UserQueue
+
+
+def commit_session(secret_index: int):
+    with SessionLocal() as db:
+        get_dataset_counters(db)
+    add_mpc_session(MPCSession(
+        eth_address=f"0x{secret_index:040x}",
+        uid=secret_index,
+        tlsn_proof_path=f"proof_{secret_index}.json",
+        secret_index=secret_index,
+        data_commitment=f"{secret_index:064x}",
+    ))
+
+
+async def commit_sessions(num_commits: int, blocking: bool):
+    for secret_index in range(1, num_commits + 1):
+        if blocking:
+            commit_session(secret_index)
+        else:
+            await run_in_threadpool(commit_session, secret_index)
+        # Let the pollers run between commits, as MPCs separate them in practice
+        await asyncio.sleep(0)
+
+
+async def poll(x, access_key: str, interval: float, stop: asyncio.Event, latencies: list[float]):
+    request = RequestGetPositionRequest(access_key=access_key)
+    due = time.perf_counter()
+    while not stop.is_set():
+        await routes.get_position(request, x)
+        latencies.append(time.perf_counter() - due)
+        due += interval
+        await asyncio.sleep(max(0, due - time.perf_counter()))
+
+
+async def bench(num_pollers: int, num_commits: int, interval: float, blocking: bool) -> tuple[list[float], float]:
+    user_queue = UserQueue(num_pollers, 300)
+    for i in range(num_pollers):
+        user_queue.add_user(f"user{i}")
+    x = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(user_queue=user_queue, rate_limiter=None)))
+    stop = asyncio.Event()
+    latencies = []
+    pollers = [
+        asyncio.create_task(poll(x, f"user{i}", interval, stop, latencies)) for i in range(num_pollers)
+    ]
+    start = time.perf_counter()
+    await commit_sessions(num_commits, blocking)
+    commit_time = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*pollers)
+    return latencies, commit_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /get_position latency during share_data commits")
+    parser.add_argument("--pollers", type=int, default=200)
+    parser.add_argument("--commits", type=int, default=500)
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between two polls of a client")
+    parser.add_argument("--blocking", action="store_true", help="Run the database calls on the event loop")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    init_dataset_metadata()
+    latencies, commit_time = asyncio.run(bench(args.pollers, args.commits, args.interval, args.blocking))
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{'mode':>10} {'polls':>7} {'median (ms)':>12} {'p99 (ms)':>9} {'max (ms)':>9} {'commits/s':>10}")
+    print(
+        f"{'blocking' if args.blocking else 'offloaded':>10} {len(latencies):>7} "
+        f"{statistics.median(latencies) * 1000:>12.2f} {p99 * 1000:>9.2f} {latencies[-1] * 1000:>9.2f} "
+        f"{args.commits / commit_time:>10.1f}"
+    )
+    _tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
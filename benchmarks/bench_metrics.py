@@ -0,0 +1,50 @@
+"""
+Cost of updating the metrics on the hot paths, and of rendering `/metrics`.
+
+    python -m benchmarks.bench_metrics --iterations 1000000
+"""
+import argparse
+import time
+
+from mpc_demo_infra.metrics import Counter, Gauge, Histogram, Registry
+
+
+def bench(func, iterations: int) -> float:
+    """Nanoseconds per call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the metrics registry")
+    parser.add_argument("--iterations", type=int, default=1_000_000)
+    parser.add_argument("--num-series", type=int, default=100)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests", ("event",)))
+    gauge = registry.register(Gauge("running", "Running", ("command",)))
+    histogram = registry.register(Histogram("stage_seconds", "Stage seconds", ("program", "stage")))
+
+    print(f"{'operation':>22} {'ns/op':>8}")
+    print(f"{'empty loop':>22} {bench(lambda: None, args.iterations):>8.0f}")
+    print(f"{'counter.inc':>22} {bench(lambda: counter.inc('get_position'), args.iterations):>8.0f}")
+    print(f"{'gauge.inc':>22} {bench(lambda: gauge.inc('compile'), args.iterations):>8.0f}")
+    print(f"{'histogram.observe':>22} {bench(lambda: histogram.observe(0.3, 'share_data', 'compile'), args.iterations):>8.0f}")
+
+    def time_block():
+        with histogram.time("share_data", "mpc_run"):
+            pass
+    print(f"{'histogram.time':>22} {bench(time_block, args.iterations):>8.0f}")
+
+    for i in range(args.num_series):
+        counter.inc(f"event_{i}")
+        histogram.observe(i, "share_data", f"stage_{i}")
+    render_ms = bench(registry.render, 100) / 1e6
+    print(f"Rendering {args.num_series} counter and histogram series: {render_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
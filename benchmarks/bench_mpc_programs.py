@@ -0,0 +1,240 @@
+"""
+Cost of `share_data.mpc` and `query_computation.mpc` across a grid of protocols, program
+bits, `MAX_DATA_PROVIDERS` and numbers of data providers.
+
+Each program is rendered with the party server's `generate_*_program`, compiled as the
+party server does and run on three local parties with its client. For each configuration
+the compile time, bytecode size and compiler requirements are recorded, along with the
+online time, rounds and data sent reported by party 0 of the fastest run. The results can
+be written as JSON and CSV to track regressions across revisions.
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`, with the
+`{protocol}-party.x` binary of each protocol.
+
+    python -m benchmarks.bench_mpc_programs --protocols malicious-rep-ring replicated-ring \\
+        --max-data-providers 100 1000 --num-data-providers 10 100 --output-csv mpc_programs.csv
+"""
+import argparse
+import csv
+import json
+import statistics
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from mpc_demo_infra.client_lib.lib import run_computation_query_client, run_data_sharing_client
+from mpc_demo_infra.computation_party_server.routes import (
+    generate_computation_query_program,
+    generate_data_sharing_program,
+)
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS, VALUE_SCALE
+from mpc_demo_infra.query_descriptor import DEFAULT_STATISTICS, QueryDescriptor, Statistic
+from mpc_demo_infra.tlsn_proof import parse_tlsn_proof
+
+from .mpspdz import (
+    CERTS_PATH,
+    CLIENT_ID,
+    DEFAULT_CLIENT_PORT_BASE,
+    DEFAULT_PROGRAM_BITS,
+    DEFAULT_PROTOCOL,
+    NUM_PARTIES,
+    RunStats,
+    compile_program,
+    ensure_certs,
+    preserve_shares,
+    random_values,
+    run_parties,
+    seed_shares,
+)
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+PROGRAMS = ["query_computation", "share_data"]
+
+
+@dataclass
+class Result:
+    program: str
+    protocol: str
+    program_bits: int
+    max_data_providers: int
+    num_data_providers: int
+    compile_time: float
+    bytecode_size: int
+    # Requirements reported by the compiler
+    integer_triples: Optional[int]
+    bit_triples: Optional[int]
+    vm_rounds: Optional[int]
+    # Of the fastest run, as reported by party 0
+    wall_time: float
+    median_wall_time: float
+    online_time: Optional[float]
+    rounds: Optional[int]
+    data_sent_mb: Optional[float]
+    global_data_sent_mb: Optional[float]
+
+
+def client_args() -> tuple:
+    return (
+        ["127.0.0.1"] * NUM_PARTIES,
+        DEFAULT_CLIENT_PORT_BASE,
+        str(CERTS_PATH),
+        CLIENT_ID,
+        str(CERTS_PATH / f"C{CLIENT_ID}.pem"),
+        str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+    )
+
+
+def bench_program(
+    program: str,
+    protocol: str,
+    program_bits: int,
+    max_data_providers: int,
+    num_data_providers: int,
+    tlsn_proof: str,
+    secret: dict,
+    query: QueryDescriptor,
+    compile_args: list[str],
+    repeat: int,
+) -> Result:
+    if program == "share_data":
+        proof = parse_tlsn_proof(tlsn_proof)
+        # Share as the next data provider, merging with the seeded shares unless there are none.
+        # Secret indices start at 1, as assigned by the coordination server.
+        circuit_name, _ = generate_data_sharing_program(
+            num_data_providers + 1,
+            DEFAULT_CLIENT_PORT_BASE,
+            max_data_providers,
+            num_data_providers == 0,
+            proof.num_bytes_input,
+            proof.delta,
+            proof.zero_encodings,
+        )
+
+        def client():
+            run_data_sharing_client(
+                *client_args(),
+                int(float(secret["eth_free"]) * VALUE_SCALE),
+                bytes(secret["nonce"]).hex(),
+                60,
+            )
+    else:
+        circuit_name, _ = generate_computation_query_program(
+            DEFAULT_CLIENT_PORT_BASE,
+            max_data_providers,
+            num_data_providers,
+            query,
+        )
+
+        def client():
+            return run_computation_query_client(*client_args(), 60, query)
+
+    compile_stats = compile_program(circuit_name, program_bits, compile_args, protocol)
+    runs: list[RunStats] = [
+        run_parties(circuit_name, protocol=protocol, client=client, program_bits=program_bits)[0]
+        for _ in range(repeat)
+    ]
+    fastest = min(runs, key=lambda stats: stats.wall_time)
+    return Result(
+        program=program,
+        protocol=protocol,
+        program_bits=program_bits,
+        max_data_providers=max_data_providers,
+        num_data_providers=num_data_providers,
+        compile_time=compile_stats.time,
+        bytecode_size=compile_stats.bytecode_size,
+        integer_triples=compile_stats.requirements.get("integer triples"),
+        bit_triples=compile_stats.requirements.get("bit triples"),
+        vm_rounds=compile_stats.requirements.get("virtual machine rounds"),
+        wall_time=fastest.wall_time,
+        median_wall_time=statistics.median(stats.wall_time for stats in runs),
+        online_time=fastest.time,
+        rounds=fastest.rounds,
+        data_sent_mb=fastest.data_sent_mb,
+        global_data_sent_mb=fastest.global_data_sent_mb,
+    )
+
+
+def print_result(result: Result):
+    print(
+        f"{result.program:>18} {result.protocol:>20} {result.program_bits:>5} {result.max_data_providers:>8} "
+        f"{result.num_data_providers:>8} {result.compile_time:>9.2f} {result.bytecode_size:>10} "
+        f"{result.wall_time:>9.3f} {str(result.online_time):>9} {str(result.rounds):>7} {str(result.data_sent_mb):>9}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MPC programs across protocols and sizes")
+    parser.add_argument("--programs", type=str, nargs="+", choices=PROGRAMS, default=PROGRAMS)
+    parser.add_argument("--protocols", type=str, nargs="+", default=[DEFAULT_PROTOCOL])
+    parser.add_argument("--program-bits", type=int, nargs="+", default=[DEFAULT_PROGRAM_BITS])
+    parser.add_argument("--max-data-providers", type=int, nargs="+", default=[MAX_DATA_PROVIDERS])
+    parser.add_argument("--num-data-providers", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--statistics", type=Statistic, nargs="+", default=DEFAULT_STATISTICS,
+                        help="Statistics computed by the query")
+    parser.add_argument("--compile-args", type=str, nargs="*", default=[],
+                        help="Extra `compile.py` arguments")
+    parser.add_argument("--proof", type=Path, default=TESTS_DIR / "proof.json")
+    parser.add_argument("--secret", type=Path, default=TESTS_DIR / "secret.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output-json", type=Path, default=None)
+    parser.add_argument("--output-csv", type=Path, default=None)
+    args = parser.parse_args()
+
+    tlsn_proof = args.proof.read_text()
+    secret = json.loads(args.secret.read_text())
+    query = QueryDescriptor(statistics=args.statistics)
+
+    ensure_certs()
+    results: list[Result] = []
+    print(
+        f"{'program':>18} {'protocol':>20} {'bits':>5} {'max':>8} {'num':>8} {'compile':>9} "
+        f"{'bytecode':>10} {'wall (s)':>9} {'time (s)':>9} {'rounds':>7} {'sent (MB)':>9}"
+    )
+    with preserve_shares():
+        for protocol in args.protocols:
+            for program_bits in args.program_bits:
+                for max_data_providers in args.max_data_providers:
+                    for num_data_providers in args.num_data_providers:
+                        if num_data_providers > max_data_providers:
+                            continue
+                        # Shares are in the format of the protocol, so they are seeded for each configuration
+                        seed_shares(
+                            random_values(num_data_providers),
+                            max_data_providers,
+                            protocol=protocol,
+                            program_bits=program_bits,
+                        )
+                        # The query runs first, as `share_data` adds a data provider to the shares
+                        for program in sorted(args.programs):
+                            # No room for the next data provider
+                            if program == "share_data" and num_data_providers + 1 > max_data_providers:
+                                continue
+                            if program == "query_computation" and num_data_providers == 0:
+                                continue
+                            result = bench_program(
+                                program,
+                                protocol,
+                                program_bits,
+                                max_data_providers,
+                                num_data_providers,
+                                tlsn_proof,
+                                secret,
+                                query,
+                                args.compile_args,
+                                args.repeat,
+                            )
+                            print_result(result)
+                            results.append(result)
+
+    if args.output_json is not None:
+        args.output_json.write_text(json.dumps([asdict(result) for result in results], indent=2))
+    if args.output_csv is not None:
+        with open(args.output_csv, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(Result.__dataclass_fields__))
+            writer.writeheader()
+            for result in results:
+                writer.writerow(asdict(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Online latency of `share_data.mpc` and `query_computation.mpc` under each protocol profile,
+to weigh the security of a protocol against its cost before selecting it with
+`mpspdz_protocol`. Protocols whose VM binary isn't built are skipped.
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`.
+
+    python -m benchmarks.bench_protocols --num-data-providers 100
+    python -m benchmarks.bench_protocols --protocols replicated-ring malicious-rep-ring malicious-rep-field
+"""
+import argparse
+import json
+
+from mpc_demo_infra.computation_party_server.protocols import PROTOCOL_PROFILES, get_protocol_profile
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS
+from mpc_demo_infra.query_descriptor import QueryDescriptor
+
+from .bench_mpc_programs import TESTS_DIR, bench_program
+from .mpspdz import (
+    DEFAULT_PROGRAM_BITS,
+    MPSPDZ_ROOT,
+    ensure_certs,
+    preserve_shares,
+    random_values,
+    seed_shares,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the online latency of the MPC programs across protocols")
+    parser.add_argument("--protocols", type=str, nargs="+", default=list(PROTOCOL_PROFILES))
+    parser.add_argument("--program-bits", type=int, default=DEFAULT_PROGRAM_BITS)
+    parser.add_argument("--max-data-providers", type=int, default=MAX_DATA_PROVIDERS)
+    parser.add_argument("--num-data-providers", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tlsn_proof = (TESTS_DIR / "proof.json").read_text()
+    secret = json.loads((TESTS_DIR / "secret.json").read_text())
+    query = QueryDescriptor()
+
+    ensure_certs()
+    print(
+        f"{'protocol':>20} {'security':>12} {'majority':>9} {'query (s)':>10} {'query MB':>9} "
+        f"{'share (s)':>10} {'share MB':>9}"
+    )
+    with preserve_shares():
+        for protocol in args.protocols:
+            profile = get_protocol_profile(protocol)
+            if not (MPSPDZ_ROOT / profile.vm_binary).exists():
+                print(f"{protocol:>20} skipped, {profile.vm_binary} isn't built")
+                continue
+            seed_shares(
+                random_values(args.num_data_providers),
+                args.max_data_providers,
+                protocol=protocol,
+                program_bits=args.program_bits,
+            )
+            # The query runs first, as `share_data` adds a data provider to the shares
+            results = {
+                program: bench_program(
+                    program,
+                    protocol,
+                    args.program_bits,
+                    args.max_data_providers,
+                    args.num_data_providers,
+                    tlsn_proof,
+                    secret,
+                    query,
+                    [],
+                    args.repeat,
+                )
+                for program in ["query_computation", "share_data"]
+            }
+            query_result, share_result = results["query_computation"], results["share_data"]
+            print(
+                f"{protocol:>20} {profile.security.value:>12} "
+                f"{'honest' if profile.honest_majority else 'dishonest':>9} "
+                f"{query_result.wall_time:>10.3f} {str(query_result.data_sent_mb):>9} "
+                f"{share_result.wall_time:>10.3f} {str(share_result.data_sent_mb):>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
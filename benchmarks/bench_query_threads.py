@@ -0,0 +1,84 @@
+"""
+Wall time of the query computation program against the number of threads of its
+`for_range_multithread` loops.
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`.
+
+    python -m benchmarks.bench_query_threads --num-data-providers 1000 --threads 1 2 4 8
+"""
+import argparse
+import statistics
+
+from mpc_demo_infra.client_lib.lib import run_computation_query_client
+from mpc_demo_infra.computation_party_server.config import ExecutionProfile
+from mpc_demo_infra.computation_party_server.routes import generate_computation_query_program
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS
+from mpc_demo_infra.query_descriptor import QueryDescriptor, Statistic, DEFAULT_STATISTICS
+
+from .mpspdz import (
+    CERTS_PATH,
+    CLIENT_ID,
+    DEFAULT_CLIENT_PORT_BASE,
+    NUM_PARTIES,
+    compile_program,
+    ensure_certs,
+    preserve_shares,
+    random_values,
+    run_parties,
+    seed_shares,
+)
+
+
+def bench_threads(query: QueryDescriptor, num_data_providers: int, num_threads: int, repeat: int, vm_args: list[str]):
+    profile = ExecutionProfile(num_threads=num_threads, extra_vm_args=vm_args)
+    circuit_name, _ = generate_computation_query_program(
+        DEFAULT_CLIENT_PORT_BASE,
+        MAX_DATA_PROVIDERS,
+        num_data_providers,
+        query,
+        profile.num_threads,
+    )
+    compile_time = compile_program(circuit_name, compile_args=profile.extra_compile_args).time
+
+    def query_client():
+        return run_computation_query_client(
+            ["127.0.0.1"] * NUM_PARTIES,
+            DEFAULT_CLIENT_PORT_BASE,
+            str(CERTS_PATH),
+            CLIENT_ID,
+            str(CERTS_PATH / f"C{CLIENT_ID}.pem"),
+            str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+            60,
+            query,
+        )
+
+    runs = [run_parties(circuit_name, vm_args=profile.vm_args(), client=query_client) for _ in range(repeat)]
+    wall_times = [stats.wall_time for stats, _ in runs]
+    return compile_time, wall_times, runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the query computation against the number of threads")
+    parser.add_argument("--num-data-providers", type=int, default=100)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--statistics", type=Statistic, nargs="+", default=DEFAULT_STATISTICS)
+    parser.add_argument("--vm-args", type=str, nargs="*", default=[],
+                        help="Extra VM arguments, e.g. `-b 10000`")
+    args = parser.parse_args()
+
+    query = QueryDescriptor(statistics=args.statistics)
+    ensure_certs()
+    with preserve_shares():
+        seed_shares(random_values(args.num_data_providers), MAX_DATA_PROVIDERS)
+        print(f"{'threads':>8} {'compile (s)':>12} {'median wall (s)':>16} {'min wall (s)':>13}")
+        for num_threads in args.threads:
+            compile_time, wall_times, results = bench_threads(
+                query, args.num_data_providers, num_threads, args.repeat, args.vm_args,
+            )
+            print(f"{num_threads:>8} {compile_time:>12.2f} {statistics.median(wall_times):>16.3f} {min(wall_times):>13.3f}")
+        print(f"Last results: {results}")
+
+
+if __name__ == "__main__":
+    main()
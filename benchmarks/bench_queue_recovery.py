@@ -0,0 +1,67 @@
+"""
+Time taken to restore the in-memory user queue from its journal on startup, with the
+queue holding `--sizes` users, after `--churn` times as many users were served.
+
+    python -m benchmarks.bench_queue_recovery --sizes 100 1000 10000
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from mpc_demo_infra.coordination_server.queue_journal import QueueJournal
+from mpc_demo_infra.coordination_server.user_queue import UserQueue, AddResult
+
+
+def fill_journal(journal_path: Path, size: int, churn: int, compact_threshold: int) -> str:
+    queue = UserQueue(size, 300, QueueJournal(str(journal_path), compact_threshold=compact_threshold))
+    # Users served before the current ones only add events to the journal
+    for i in range(size * churn):
+        access_key = f"served{i}"
+        assert queue.add_user(access_key) == AddResult.SUCCEEDED
+        assert queue.finish_computation(access_key, queue.get_computation_key(access_key))
+    for i in range(size):
+        add = queue.add_priority_user if i % 10 == 0 else queue.add_user
+        assert add(f"user{i}") == AddResult.SUCCEEDED
+    queue.journal.close()
+    return queue._queue_to_str()
+
+
+def bench_recovery(size: int, churn: int, repeat: int) -> tuple[int, int, list[float]]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal_path = Path(tmp_dir) / "queue.jsonl"
+        compact_threshold = 10 * size
+        expected = fill_journal(journal_path, size, churn, compact_threshold)
+        num_events = len(journal_path.read_text().splitlines())
+        journal_size = journal_path.stat().st_size
+        times = []
+        for _ in range(repeat):
+            # Recovery compacts the journal, so restore the original one for every run
+            original = journal_path.read_bytes()
+            start = time.perf_counter()
+            queue = UserQueue(size, 300, QueueJournal(str(journal_path), compact_threshold=compact_threshold))
+            times.append(time.perf_counter() - start)
+            assert queue._queue_to_str() == expected
+            queue.journal.close()
+            journal_path.write_bytes(original)
+        return num_events, journal_size, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark restoring the user queue from its journal")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="Number of users in the queue, e.g. `user_queue_size`")
+    parser.add_argument("--churn", type=int, default=2,
+                        help="Users served before the queue was filled, as a multiple of its size")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'users':>8} {'events':>8} {'journal (KB)':>13} {'median (ms)':>12} {'max (ms)':>9}")
+    for size in args.sizes:
+        num_events, journal_size, times = bench_recovery(size, args.churn, args.repeat)
+        print(f"{size:>8} {num_events:>8} {journal_size / 1024:>13.1f} {statistics.median(times) * 1000:>12.2f} {max(times) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
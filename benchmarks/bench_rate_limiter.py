@@ -0,0 +1,43 @@
+"""
+Overhead of the coordination server rate limiter per request, with every request from a
+new client (worst case, evicting a bucket once full) and from a few known clients.
+
+    python -m benchmarks.bench_rate_limiter --requests 1000000 --max-keys 100000
+"""
+import argparse
+import time
+
+from mpc_demo_infra.coordination_server.rate_limiter import RateLimiter
+
+
+def bench(rate_limiter: RateLimiter, clients: list[tuple[str, str]], num_requests: int) -> tuple[float, int]:
+    rejected = 0
+    start = time.perf_counter()
+    for i in range(num_requests):
+        ip, access_key = clients[i % len(clients)]
+        try:
+            rate_limiter.check(ip, access_key)
+        except Exception:
+            rejected += 1
+    return time.perf_counter() - start, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rate limiter overhead")
+    parser.add_argument("--requests", type=int, default=1000000)
+    parser.add_argument("--max-keys", type=int, default=100000)
+    args = parser.parse_args()
+
+    scenarios = {
+        "known clients": [(f"10.0.0.{i}", f"key{i}") for i in range(100)],
+        "new clients": [(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", f"key{i}") for i in range(args.requests)],
+    }
+    print(f"{'scenario':>14} {'ns/request':>11} {'rejected':>9}")
+    for name, clients in scenarios.items():
+        rate_limiter = RateLimiter(5, 50, 1, 5, args.max_keys)
+        elapsed, rejected = bench(rate_limiter, clients, args.requests)
+        print(f"{name:>14} {elapsed / args.requests * 1e9:>11.0f} {rejected:>9}")
+
+
+if __name__ == "__main__":
+    main()
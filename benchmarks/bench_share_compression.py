@@ -0,0 +1,141 @@
+"""
+Bandwidth and latency of the share flow requests with and without `CompressionMiddleware`
+over a simulated slow link. Each request is sent through an in-process app with the
+middleware, so the compression and decompression times are measured, and the transfer
+time is computed from the bytes on the wire:
+
+    latency = rtt + 8 * request_bytes / uplink + 8 * response_bytes / downlink + codec time
+
+    python -m benchmarks.bench_share_compression --uplink-mbps 1 --downlink-mbps 5 --rtt-ms 100
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import secrets
+import statistics
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, Request
+
+from mpc_demo_infra.compression import CompressionMiddleware, compress_json
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.post("/share_data")
+    async def share_data(request: Request):
+        data = await request.json()
+        return {"client_port_base": 8100, "num_bytes": len(data["tlsn_proof"])}
+
+    @app.get("/commitments")
+    async def commitments(limit: int = 1000):
+        return {
+            "commitments": [
+                {"secret_index": i, "data_commitment": secrets.token_hex(32)} for i in range(limit)
+            ],
+            "total": limit,
+        }
+
+    return app
+
+
+async def call(app, method: str, path: str, query_string: bytes, body: bytes, headers: dict[str, str]) -> tuple[int, bytes]:
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string,
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    request_messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"body": b""}
+
+    async def receive():
+        return request_messages.pop(0) if request_messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    response_body = response["body"]
+    if response["headers"].get("content-encoding") == "gzip":
+        response_body = gzip.decompress(response_body)
+    json.loads(response_body)
+    return len(body), len(response["body"])
+
+
+async def bench_request(app, compressed: bool, method: str, path: str, query_string: bytes, payload, repeat: int):
+    """Median codec time, request bytes and response bytes"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if payload is None:
+            body, headers = b"", {}
+        elif compressed:
+            body, headers = compress_json(payload)
+        else:
+            body, headers = json.dumps(payload).encode(), {"Content-Type": "application/json"}
+        if compressed:
+            headers["Accept-Encoding"] = "gzip"
+        request_bytes, response_bytes = await call(app, method, path, query_string, body, headers)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), request_bytes, response_bytes
+
+
+async def run(args):
+    app = create_app()
+    share_data_payload = {
+        "eth_address": "0x" + secrets.token_hex(20),
+        "tlsn_proof": (TESTS_DIR / "proof.json").read_text(),
+        "client_cert_file": secrets.token_urlsafe(1200),
+        "client_id": 1,
+        "access_key": secrets.token_urlsafe(16),
+        "computation_key": secrets.token_urlsafe(16),
+    }
+    requests = [
+        ("share_data", "POST", "/share_data", b"", share_data_payload),
+        ("commitments", "GET", "/commitments", f"limit={args.num_commitments}".encode(), None),
+    ]
+    print(f"Link: {args.uplink_mbps} Mbit/s up, {args.downlink_mbps} Mbit/s down, {args.rtt_ms} ms RTT")
+    print(f"{'request':>12} {'gzip':>5} {'up KB':>8} {'down KB':>8} {'codec (ms)':>11} {'latency (ms)':>13}")
+    for name, method, path, query_string, payload in requests:
+        for compressed in [False, True]:
+            codec_time, request_bytes, response_bytes = await bench_request(
+                app, compressed, method, path, query_string, payload, args.repeat,
+            )
+            latency = (
+                args.rtt_ms / 1000
+                + 8 * request_bytes / (args.uplink_mbps * 1e6)
+                + 8 * response_bytes / (args.downlink_mbps * 1e6)
+                + codec_time
+            )
+            print(
+                f"{name:>12} {'on' if compressed else 'off':>5} {request_bytes / 1024:>8.1f} "
+                f"{response_bytes / 1024:>8.1f} {codec_time * 1000:>11.2f} {latency * 1000:>13.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the share flow requests with and without compression")
+    parser.add_argument("--uplink-mbps", type=float, default=1)
+    parser.add_argument("--downlink-mbps", type=float, default=5)
+    parser.add_argument("--rtt-ms", type=float, default=100)
+    parser.add_argument("--num-commitments", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
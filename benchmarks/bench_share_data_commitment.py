@@ -0,0 +1,115 @@
+"""
+Compile time, circuit size and online cost of `share_data.mpc`, which is dominated by
+the TLSN data commitment circuit. Pass the template of another revision to compare, e.g.
+
+    git show <rev>:mpc_demo_infra/program/share_data.mpc > /tmp/share_data_baseline.mpc
+    python -m benchmarks.bench_share_data_commitment --baseline-template /tmp/share_data_baseline.mpc
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`.
+"""
+import argparse
+import json
+import re
+from pathlib import Path
+
+from mpc_demo_infra.client_lib.lib import run_data_sharing_client
+from mpc_demo_infra.computation_party_server.routes import (
+    TEMPLATE_PROGRAM_DIR,
+    generate_data_sharing_program,
+)
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS, VALUE_SCALE
+from mpc_demo_infra.tlsn_proof import parse_tlsn_proof
+
+from .mpspdz import (
+    CERTS_PATH,
+    CLIENT_ID,
+    DEFAULT_CLIENT_PORT_BASE,
+    NUM_PARTIES,
+    compile_program,
+    ensure_certs,
+    preserve_shares,
+    run_parties,
+)
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+
+def bench_template(template_path: Path, tlsn_proof: str, value: float, nonce: str, repeat: int) -> dict:
+    proof = parse_tlsn_proof(tlsn_proof)
+    circuit_name, _ = generate_data_sharing_program(
+        1,
+        DEFAULT_CLIENT_PORT_BASE,
+        MAX_DATA_PROVIDERS,
+        True,
+        proof.num_bytes_input,
+        proof.delta,
+        proof.zero_encodings,
+        template_path,
+    )
+    compile_stats = compile_program(circuit_name)
+
+    def data_sharing_client():
+        run_data_sharing_client(
+            ["127.0.0.1"] * NUM_PARTIES,
+            DEFAULT_CLIENT_PORT_BASE,
+            str(CERTS_PATH),
+            CLIENT_ID,
+            str(CERTS_PATH / f"C{CLIENT_ID}.pem"),
+            str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+            int(value * VALUE_SCALE),
+            nonce,
+            60,
+        )
+
+    runs = []
+    for _ in range(repeat):
+        stats, _ = run_parties(circuit_name, client=data_sharing_client)
+        commitment = re.search(r"^Reg\[0\] = 0x([0-9a-f]+)", stats.output, re.MULTILINE)
+        if commitment is None or commitment.group(1) != proof.data_commitment_hash:
+            raise Exception(f"Commitment of {template_path} doesn't match the TLSN proof: {commitment and commitment.group(1)} != {proof.data_commitment_hash}")
+        runs.append(stats)
+    fastest = min(runs, key=lambda stats: stats.wall_time)
+    return {
+        "compile_time": compile_stats.time,
+        "bytecode_size": compile_stats.bytecode_size,
+        "bit_triples": compile_stats.requirements.get("bit triples"),
+        "vm_rounds": compile_stats.requirements.get("virtual machine rounds"),
+        "wall_time": fastest.wall_time,
+        "online_time": fastest.time,
+        "data_sent_mb": fastest.data_sent_mb,
+        "rounds": fastest.rounds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the data commitment circuit of share_data.mpc")
+    parser.add_argument("--baseline-template", type=Path, default=None,
+                        help="share_data.mpc template to compare with")
+    parser.add_argument("--proof", type=Path, default=TESTS_DIR / "proof.json")
+    parser.add_argument("--secret", type=Path, default=TESTS_DIR / "secret.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tlsn_proof = args.proof.read_text()
+    secret = json.loads(args.secret.read_text())
+    value = float(secret["eth_free"])
+    nonce = bytes(secret["nonce"]).hex()
+
+    templates = {"current": TEMPLATE_PROGRAM_DIR / "share_data.mpc"}
+    if args.baseline_template is not None:
+        templates["baseline"] = args.baseline_template
+
+    ensure_certs()
+    results = {}
+    with preserve_shares():
+        for name, template_path in templates.items():
+            results[name] = bench_template(template_path, tlsn_proof, value, nonce, args.repeat)
+
+    metrics = list(results["current"].keys())
+    print(f"{'metric':>16} " + " ".join(f"{name:>14}" for name in results))
+    for metric in metrics:
+        print(f"{metric:>16} " + " ".join(f"{str(results[name][metric]):>14}" for name in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Latency of the sort and median in `query_computation.mpc` against `stats_bits`, the bit
+length of the comparisons on the balances. 256 bits is the previous behaviour, where the
+comparisons used the full domain of `-R 257`.
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`.
+
+    python -m benchmarks.bench_stats_bits --num-data-providers 100 1000 --stats-bits 64 128 256
+"""
+import argparse
+import statistics
+
+from mpc_demo_infra.client_lib.lib import run_computation_query_client
+from mpc_demo_infra.computation_party_server.routes import generate_computation_query_program
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS
+from mpc_demo_infra.query_descriptor import QueryDescriptor, Statistic
+
+from .mpspdz import (
+    CERTS_PATH,
+    CLIENT_ID,
+    DEFAULT_CLIENT_PORT_BASE,
+    NUM_PARTIES,
+    compile_program,
+    ensure_certs,
+    preserve_shares,
+    random_values,
+    run_parties,
+    seed_shares,
+)
+
+
+def bench_stats_bits(query: QueryDescriptor, num_data_providers: int, stats_bits: int, repeat: int):
+    circuit_name, _ = generate_computation_query_program(
+        DEFAULT_CLIENT_PORT_BASE,
+        MAX_DATA_PROVIDERS,
+        num_data_providers,
+        query,
+        stats_bits=stats_bits,
+    )
+    compile_stats = compile_program(circuit_name)
+
+    def query_client():
+        return run_computation_query_client(
+            ["127.0.0.1"] * NUM_PARTIES,
+            DEFAULT_CLIENT_PORT_BASE,
+            str(CERTS_PATH),
+            CLIENT_ID,
+            str(CERTS_PATH / f"C{CLIENT_ID}.pem"),
+            str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+            60,
+            query,
+        )
+
+    runs = [run_parties(circuit_name, client=query_client) for _ in range(repeat)]
+    return compile_stats, [stats for stats, _ in runs], runs[-1][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sort and median against the bit length of the statistics")
+    parser.add_argument("--num-data-providers", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--stats-bits", type=int, nargs="+", default=[64, 128, 256])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # The median sorts the data, so this measures the sort and the median together
+    query = QueryDescriptor(statistics=[Statistic.MEDIAN])
+    ensure_certs()
+    with preserve_shares():
+        print(f"{'providers':>10} {'bits':>5} {'bit triples':>12} {'median wall (s)':>16} {'time (s)':>9} {'sent (MB)':>10} {'median':>12}")
+        for num_data_providers in args.num_data_providers:
+            seed_shares(random_values(num_data_providers), MAX_DATA_PROVIDERS)
+            for stats_bits in args.stats_bits:
+                compile_stats, runs, results = bench_stats_bits(query, num_data_providers, stats_bits, args.repeat)
+                fastest = min(runs, key=lambda stats: stats.wall_time)
+                print(
+                    f"{num_data_providers:>10} {stats_bits:>5} {str(compile_stats.requirements.get('bit triples')):>12} "
+                    f"{statistics.median(stats.wall_time for stats in runs):>16.3f} {str(fastest.time):>9} "
+                    f"{str(fastest.data_sent_mb):>10} {str(results.median):>12}"
+                )
+
+
+if __name__ == "__main__":
+    main()
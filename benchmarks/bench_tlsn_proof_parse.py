@@ -0,0 +1,76 @@
+"""
+Time to extract the fields used by the servers from the TLSN proofs in `tests/`, with
+`parse_tlsn_proof` and with the previous per-server extraction, which parsed the proof
+in each server and converted the labels one `bytes` at a time.
+
+    python -m benchmarks.bench_tlsn_proof_parse --repeat 20
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+from mpc_demo_infra.tlsn_proof import TLSNProof, parse_tlsn_proof
+
+TESTS_DIR = Path(__file__).parent.parent / "tests"
+
+
+def extract_baseline(tlsn_proof: str):
+    """The extraction before `tlsn_proof.py`, as the party and coordination servers did it"""
+    proof = json.loads(tlsn_proof)
+    _, openings = list(proof["substrings"]["private_openings"].items())[0]
+    data_commitment_hash = bytes(openings[1]["hash"]).hex()
+    deltas = []
+    zero_encodings = []
+    for e in proof["encodings"]:
+        deltas.append(bytes(e["U8"]["state"]["delta"]).hex())
+        for label in e["U8"]["labels"]:
+            zero_encodings.append(bytes(label).hex())
+    # The coordination server parsed the proof again for the commitment hash
+    coordination_proof = json.loads(tlsn_proof)
+    _, openings = list(coordination_proof["substrings"]["private_openings"].items())[0]
+    assert bytes(openings[1]["hash"]).hex() == data_commitment_hash
+    return len(proof["encodings"]), data_commitment_hash, deltas[0], zero_encodings
+
+
+def extract(tlsn_proof: str):
+    proof = TLSNProof(tlsn_proof)
+    return proof.num_bytes_input, proof.data_commitment_hash, proof.delta, proof.zero_encodings
+
+
+def extract_cached(tlsn_proof: str):
+    # Later accesses of a request, e.g. the coordination server's commitment check then the proof archive
+    proof = parse_tlsn_proof(tlsn_proof)
+    return proof.num_bytes_input, proof.data_commitment_hash, proof.delta, proof.zero_encodings
+
+
+def bench(func, tlsn_proof: str, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(tlsn_proof)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extracting the TLSN proof fields")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'proof':>14} {'KB':>6} {'baseline (ms)':>14} {'parse (ms)':>11} {'cached (ms)':>12}")
+    for proof_path in sorted(TESTS_DIR.glob("proof*.json")):
+        tlsn_proof = proof_path.read_text()
+        assert extract(tlsn_proof) == extract_baseline(tlsn_proof)
+        baseline_time = bench(extract_baseline, tlsn_proof, args.repeat)
+        parse_time = bench(extract, tlsn_proof, args.repeat)
+        cached_time = bench(extract_cached, tlsn_proof, args.repeat)
+        print(
+            f"{proof_path.name:>14} {len(tlsn_proof) / 1024:>6.0f} {baseline_time * 1000:>14.2f} "
+            f"{parse_time * 1000:>11.2f} {cached_time * 1000:>12.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
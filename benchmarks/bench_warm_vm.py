@@ -0,0 +1,114 @@
+"""
+Latency of a query on a warm VM, where the parties stay connected between queries,
+against a cold VM started for each query.
+
+Needs a built MP-SPDZ checkout at the party server's `mpspdz_project_root`.
+
+    python -m benchmarks.bench_warm_vm --num-data-providers 100 --queries 10
+"""
+import argparse
+import statistics
+import time
+
+from mpc_demo_infra.client_lib.lib import run_computation_query_client
+from mpc_demo_infra.computation_party_server.protocols import get_protocol_profile
+from mpc_demo_infra.computation_party_server.routes import generate_computation_query_program
+from mpc_demo_infra.computation_party_server.warm_vm import WarmVMPool
+from mpc_demo_infra.constants import MAX_DATA_PROVIDERS
+from mpc_demo_infra.query_descriptor import QueryDescriptor
+
+from .mpspdz import (
+    CERTS_PATH,
+    CLIENT_ID,
+    DEFAULT_CLIENT_PORT_BASE,
+    DEFAULT_MPC_PORT_BASE,
+    DEFAULT_PROGRAM_BITS,
+    DEFAULT_PROTOCOL,
+    MPSPDZ_ROOT,
+    NUM_PARTIES,
+    compile_program,
+    ensure_certs,
+    preserve_shares,
+    random_values,
+    run_parties,
+    seed_shares,
+    write_ip_file,
+)
+
+
+def query_client():
+    return run_computation_query_client(
+        ["127.0.0.1"] * NUM_PARTIES,
+        DEFAULT_CLIENT_PORT_BASE,
+        str(CERTS_PATH),
+        CLIENT_ID,
+        str(CERTS_PATH / f"C{CLIENT_ID}.pem"),
+        str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+        60,
+        QueryDescriptor(),
+    )
+
+
+def bench_cold(num_data_providers: int, queries: int) -> list[float]:
+    circuit_name, _ = generate_computation_query_program(
+        DEFAULT_CLIENT_PORT_BASE, MAX_DATA_PROVIDERS, num_data_providers, QueryDescriptor(),
+    )
+    compile_program(circuit_name)
+    return [run_parties(circuit_name, client=query_client)[0].wall_time for _ in range(queries)]
+
+
+def bench_warm(num_data_providers: int, queries: int) -> tuple[float, list[float]]:
+    """Returns (seconds until the first query is served, latency of each query once warm)"""
+    circuit_name, _ = generate_computation_query_program(
+        DEFAULT_CLIENT_PORT_BASE, MAX_DATA_PROVIDERS, num_data_providers, QueryDescriptor(), num_jobs=queries + 1,
+    )
+    compile_program(circuit_name)
+    profile = get_protocol_profile(DEFAULT_PROTOCOL)
+    vm_args = " ".join(profile.vm_args(DEFAULT_PROGRAM_BITS))
+    ip_file_path = write_ip_file(NUM_PARTIES, DEFAULT_MPC_PORT_BASE)
+    # One pool per party, as each party server holds its own
+    pools = [WarmVMPool() for _ in range(NUM_PARTIES)]
+    try:
+        start = time.perf_counter()
+        vms = [
+            pool.start(
+                circuit_name,
+                f"./{profile.vm_binary} -ip {ip_file_path} -p {party_id} {vm_args} -OF . {circuit_name}",
+                str(MPSPDZ_ROOT),
+                queries + 1,
+            )
+            for party_id, pool in enumerate(pools)
+        ]
+        latencies = []
+        for i in range(queries + 1):
+            query_start = time.perf_counter()
+            query_client()
+            for pool, vm in zip(pools, vms):
+                pool.run_job(vm, timeout=60)
+            latencies.append(time.perf_counter() - (start if i == 0 else query_start))
+    finally:
+        for pool in pools:
+            pool.stop()
+        ip_file_path.unlink(missing_ok=True)
+    return latencies[0], latencies[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark queries on a warm VM against a VM per query")
+    parser.add_argument("--num-data-providers", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=10)
+    args = parser.parse_args()
+
+    ensure_certs()
+    with preserve_shares():
+        seed_shares(random_values(args.num_data_providers), MAX_DATA_PROVIDERS)
+        cold = bench_cold(args.num_data_providers, args.queries)
+        first, warm = bench_warm(args.num_data_providers, args.queries)
+    print(f"{'mode':>6} {'median (s)':>11} {'min (s)':>8} {'max (s)':>8}")
+    print(f"{'cold':>6} {statistics.median(cold):>11.3f} {min(cold):>8.3f} {max(cold):>8.3f}")
+    print(f"{'warm':>6} {statistics.median(warm):>11.3f} {min(warm):>8.3f} {max(warm):>8.3f}")
+    print(f"First query on the warm VM, including its startup: {first:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+End-to-end load test of the coordination server, without MP-SPDZ or TLSN binaries.
+
+Starts the coordination server with three stub parties (`benchmarks.stub_party`) and a
+stub TLSN verifier, which only take the configured delays, then drives simulated clients
+through the queue and a share data or query computation session each. A client waits for
+its MPC as long as the stub parties take, in place of running the MPC client.
+
+Reports the session throughput, the distribution of the time spent waiting in the queue,
+and the p50/p99 latency of each endpoint. `--output` saves the report as JSON, to compare
+runs before and after a change.
+
+    python -m benchmarks.load_test --clients 2000 --arrival-seconds 30 --mpc-delay 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import aiohttp
+
+from mpc_demo_infra.constants import MAX_CLIENT_ID
+from mpc_demo_infra.tlsn_proof import compress_proof
+
+PROJECT_ROOT = Path(__file__).parent.parent
+PROOF_PATH = PROJECT_ROOT / "tests" / "proof.json"
+NUM_PARTIES = 3
+PARTY_API_KEY = "load_test_api_key"
+
+STUB_VERIFIER = """#!/bin/sh
+sleep {delay}
+echo '{{"uid":1}}'
+"""
+
+
+@dataclass
+class Results:
+    # endpoint -> latencies in seconds of the successful requests
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    # endpoint -> number of failed requests
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    # Seconds from joining the queue to getting the computation key
+    queue_waits: list[float] = field(default_factory=list)
+    # Session kind -> number of completed sessions
+    completed: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    failed_sessions: int = 0
+
+
+def percentile(values: list[float], p: float) -> float:
+    if len(values) == 0:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+class Client:
+    def __init__(self, session: aiohttp.ClientSession, base_url: str, results: Results):
+        self.session = session
+        self.base_url = base_url
+        self.results = results
+
+    async def request(self, endpoint: str, method: str = "POST", expected_status: int = 200, **kwargs) -> Optional[dict]:
+        start = time.perf_counter()
+        try:
+            async with self.session.request(method, f"{self.base_url}/{endpoint}", **kwargs) as response:
+                data = await response.json(content_type=None)
+                if response.status != expected_status:
+                    self.results.errors[endpoint] += 1
+                    return None
+        except aiohttp.ClientError:
+            self.results.errors[endpoint] += 1
+            return None
+        self.results.latencies[endpoint].append(time.perf_counter() - start)
+        return data
+
+
+async def run_client(client: Client, index: int, kind: str, compressed_proof: bytes, args) -> None:
+    access_key = secrets.token_urlsafe(16)
+    while True:
+        data = await client.request("add_user_to_queue", json={"access_key": access_key})
+        if data is not None and data["result"] != 2:  # AddResult.QUEUE_IS_FULL
+            break
+        await asyncio.sleep(args.poll_interval)
+    added_at = time.perf_counter()
+
+    computation_key = None
+    while computation_key is None:
+        await asyncio.sleep(args.poll_interval)
+        data = await client.request("get_position", json={"access_key": access_key})
+        if data is not None:
+            computation_key = data["computation_key"]
+    client.results.queue_waits.append(time.perf_counter() - added_at)
+
+    keys = {"access_key": access_key, "computation_key": computation_key}
+    client_id = index % MAX_CLIENT_ID
+    if kind == "share_data":
+        ok = await client.request("validate_computation_key", json=keys) is not None
+        data = await client.request(
+            "tlsn_proofs",
+            params=keys,
+            data=compressed_proof,
+            headers={"Content-Type": "application/gzip"},
+        ) if ok else None
+        if data is not None:
+            ok = await client.request("share_data", json={
+                "eth_address": "0x" + secrets.token_hex(20),
+                "tlsn_proof_digest": data["digest"],
+                "client_id": client_id,
+                "client_cert_file": "stub",
+                **keys,
+            }) is not None
+        else:
+            ok = False
+        mpc_time = args.verify_delay + args.compile_delay + args.mpc_delay
+    else:
+        ok = await client.request("query_computation", json={
+            "client_id": client_id,
+            "client_cert_file": "stub",
+            **keys,
+        }) is not None
+        mpc_time = args.compile_delay + args.mpc_delay
+    if ok:
+        # In place of the MPC client, which returns once the parties finished
+        await asyncio.sleep(mpc_time)
+    await client.request("finish_computation", json=keys)
+    if ok:
+        client.results.completed[kind] += 1
+    else:
+        client.results.failed_sessions += 1
+
+
+def start_servers(work_dir: Path, server_log, args) -> list[subprocess.Popen]:
+    verifier_path = work_dir / "binance_verifier"
+    verifier_path.write_text(STUB_VERIFIER.format(delay=args.verify_delay))
+    verifier_path.chmod(0o755)
+
+    coordination_server_url = f"http://127.0.0.1:{args.port}"
+    party_ports = [args.port + 1 + i for i in range(NUM_PARTIES)]
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(PROJECT_ROOT),
+        "PORT": str(args.port),
+        "PARTY_HOSTS": json.dumps(["127.0.0.1"] * NUM_PARTIES),
+        "PARTY_PORTS": json.dumps(party_ports),
+        "PARTY_API_KEY": PARTY_API_KEY,
+        "DATABASE_URL": f"sqlite:///{work_dir / 'coordination.db'}",
+        "TLSN_PROOFS_DIR": str(work_dir / "tlsn_proofs"),
+        "QUEUE_JOURNAL_PATH": "",
+        "USER_QUEUE_SIZE": str(args.clients),
+        "USER_QUEUE_HEAD_TIMEOUT": str(args.head_timeout),
+        "RATE_LIMIT_ENABLED": "false",
+        "PROHIBIT_MULTIPLE_CONTRIBUTIONS": "false",
+        "PREPROCESSING_ENABLED": "false",
+    }
+    processes = []
+    for party_id, party_port in enumerate(party_ports):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_party",
+             "--party-id", str(party_id),
+             "--port", str(party_port),
+             "--coordination-server-url", coordination_server_url,
+             "--party-api-key", PARTY_API_KEY,
+             "--verify-delay", str(args.verify_delay),
+             "--compile-delay", str(args.compile_delay),
+             "--mpc-delay", str(args.mpc_delay)],
+            cwd=PROJECT_ROOT,
+            env=env,
+            stdout=server_log,
+            stderr=server_log,
+        ))
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mpc_demo_infra.coordination_server.main:app",
+         "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+        cwd=work_dir,
+        env=env,
+        stdout=server_log,
+        stderr=server_log,
+    ))
+    return processes
+
+
+async def wait_until_ready(urls: list[str], timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        for url in urls:
+            while True:
+                try:
+                    async with session.get(url) as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"{url} not ready after {timeout} seconds")
+                await asyncio.sleep(0.2)
+
+
+async def run_load(args) -> tuple[Results, float]:
+    rng = random.Random(args.seed)
+    # The first client shares data so that queries have a dataset
+    kinds = ["share_data"] + [
+        "query_computation" if rng.random() < args.query_ratio else "share_data" for _ in range(args.clients - 1)
+    ]
+    compressed_proof = compress_proof(PROOF_PATH.read_text())
+    results = Results()
+    connector = aiohttp.TCPConnector(limit=args.max_connections)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.request_timeout)) as session:
+        client = Client(session, f"http://127.0.0.1:{args.port}", results)
+
+        async def arrive(index: int, kind: str):
+            await asyncio.sleep(args.arrival_seconds * index / args.clients)
+            await run_client(client, index, kind, compressed_proof, args)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[arrive(index, kind) for index, kind in enumerate(kinds)])
+        return results, time.perf_counter() - start
+
+
+def report(results: Results, duration: float, args) -> dict:
+    completed = sum(results.completed.values())
+    summary = {
+        "clients": args.clients,
+        "duration": duration,
+        "completed_sessions": dict(results.completed),
+        "failed_sessions": results.failed_sessions,
+        "sessions_per_second": completed / duration,
+        "queue_wait": {
+            f"p{p}": percentile(results.queue_waits, p) for p in (50, 90, 99)
+        } | {"max": max(results.queue_waits, default=float("nan"))},
+        "endpoints": {
+            endpoint: {
+                "requests": len(latencies),
+                "errors": results.errors.get(endpoint, 0),
+                "p50": percentile(latencies, 50),
+                "p99": percentile(latencies, 99),
+            }
+            for endpoint, latencies in sorted(results.latencies.items())
+        },
+    }
+    print(f"{args.clients} clients in {duration:.1f}s: {completed} sessions completed {dict(results.completed)}, "
+          f"{results.failed_sessions} failed, {summary['sessions_per_second']:.2f} sessions/s")
+    print("Queue wait (s): " + ", ".join(f"{key}={value:.2f}" for key, value in summary["queue_wait"].items()))
+    print(f"{'endpoint':>26} {'requests':>9} {'errors':>7} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:>26} {stats['requests']:>9} {stats['errors']:>7} {stats['p50'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the coordination server with stub parties")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--arrival-seconds", type=float, default=10,
+                        help="Clients arrive evenly over this many seconds")
+    parser.add_argument("--query-ratio", type=float, default=0.2)
+    parser.add_argument("--poll-interval", type=float, default=1)
+    parser.add_argument("--verify-delay", type=float, default=0.01)
+    parser.add_argument("--compile-delay", type=float, default=0.01)
+    parser.add_argument("--mpc-delay", type=float, default=0.02)
+    parser.add_argument("--head-timeout", type=int, default=300)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--request-timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=18005,
+                        help="Port of the coordination server, the stub parties use the next ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Save the report as JSON")
+    parser.add_argument("--server-log", type=str, default=os.devnull, help="Output of the servers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir, open(args.server_log, "a") as server_log:
+        processes = start_servers(Path(work_dir), server_log, args)
+        try:
+            asyncio.run(wait_until_ready(
+                [f"http://127.0.0.1:{args.port}/stats"]
+                + [f"http://127.0.0.1:{args.port + 1 + i}/get_party_cert" for i in range(NUM_PARTIES)]
+            ))
+            results, duration = asyncio.run(run_load(args))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    summary = report(results, duration, args)
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Helpers to compile and run the MPC programs of `mpc_demo_infra/program` on a local
+MP-SPDZ checkout, with all the parties and the client on this machine.
+
+NOTE: Running programs overwrites `Persistence/` under the MP-SPDZ root. Use
+`preserve_shares` to restore the shares of a party server afterwards.
+"""
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from mpc_demo_infra.computation_party_server.config import settings as party_settings
+from mpc_demo_infra.computation_party_server.protocols import get_protocol_profile
+from mpc_demo_infra.constants import VALUE_SCALE
+
+MPSPDZ_ROOT = Path(party_settings.mpspdz_project_root)
+TEMPLATE_PROGRAM_DIR = Path(__file__).parent.parent / "mpc_demo_infra" / "program"
+CERTS_PATH = MPSPDZ_ROOT / "Player-Data"
+SHARES_DIR = MPSPDZ_ROOT / "Persistence"
+
+NUM_PARTIES = 3
+DEFAULT_PROTOCOL = party_settings.mpspdz_protocol
+DEFAULT_PROGRAM_BITS = party_settings.program_bits
+DEFAULT_MPC_PORT_BASE = 14000
+DEFAULT_CLIENT_PORT_BASE = 15000
+CLIENT_ID = 0
+
+# Writes the values in the same layout as `share_data.mpc`: the count, then the values
+SEED_PROGRAM = """
+from Compiler.types import sint
+
+MAX_DATA_PROVIDERS = {max_data_providers}
+VALUES = {values}
+
+client_values = sint.Array(1 + MAX_DATA_PROVIDERS)
+client_values.assign_all(0)
+client_values[0] = len(VALUES)
+for i, value in enumerate(VALUES):
+    client_values[1 + i] = value
+client_values.write_to_file(0)
+"""
+
+
+@dataclass
+class CompileStats:
+    # Seconds taken by `compile.py`
+    time: float
+    # Total size of the bytecode files
+    bytecode_size: int
+    # Preprocessing and rounds reported by the compiler, e.g. {"integer triples": 100, "virtual machine rounds": 10}
+    requirements: dict[str, int]
+
+
+@dataclass
+class RunStats:
+    # Seconds from starting the parties until all of them exited
+    wall_time: float
+    # Statistics reported by party 0
+    time: Optional[float] = None
+    data_sent_mb: Optional[float] = None
+    rounds: Optional[int] = None
+    global_data_sent_mb: Optional[float] = None
+    # Output of party 0
+    output: str = ""
+
+
+def parse_stats(output: str, wall_time: float) -> RunStats:
+    stats = RunStats(wall_time=wall_time, output=output)
+    if m := re.search(r"^Time = ([\d.e+-]+) seconds", output, re.MULTILINE):
+        stats.time = float(m.group(1))
+    if m := re.search(r"^Data sent = ([\d.e+-]+) MB in ~(\d+) rounds", output, re.MULTILINE):
+        stats.data_sent_mb = float(m.group(1))
+        stats.rounds = int(m.group(2))
+    if m := re.search(r"^Global data sent = ([\d.e+-]+) MB", output, re.MULTILINE):
+        stats.global_data_sent_mb = float(m.group(1))
+    return stats
+
+
+def parse_compile_requirements(output: str) -> dict[str, int]:
+    """Parse the `Program requires:` section printed by the compiler"""
+    requirements = {}
+    in_requirements = False
+    for line in output.splitlines():
+        if line.startswith("Program requires"):
+            in_requirements = True
+            continue
+        if in_requirements:
+            if m := re.match(r"^\s+(\d+) (.+)$", line):
+                requirements[m.group(2).strip()] = int(m.group(1))
+            else:
+                in_requirements = False
+    return requirements
+
+
+def render_program(template_source: str, circuit_name: str, replacements: dict[str, object]) -> Path:
+    """Replace `{key}` placeholders and write the program to `Programs/Source`"""
+    for key, value in replacements.items():
+        template_source = template_source.replace(f"{{{key}}}", str(value))
+    program_path = MPSPDZ_ROOT / "Programs" / "Source" / f"{circuit_name}.mpc"
+    program_path.write_text(template_source)
+    return program_path
+
+
+def read_template(name: str) -> str:
+    return (TEMPLATE_PROGRAM_DIR / name).read_text()
+
+
+def compile_program(
+    circuit_name: str,
+    program_bits: int = DEFAULT_PROGRAM_BITS,
+    compile_args: list[str] = [],
+    protocol: str = DEFAULT_PROTOCOL,
+) -> CompileStats:
+    """
+    Compile the program for the domain of `protocol`, as the party server does.
+    """
+    protocol_args = get_protocol_profile(protocol).compile_args(program_bits)
+    start = time.perf_counter()
+    process = subprocess.run(
+        ["./compile.py", *protocol_args, *compile_args, circuit_name],
+        cwd=MPSPDZ_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    compile_time = time.perf_counter() - start
+    bytecode_size = sum(
+        path.stat().st_size for path in (MPSPDZ_ROOT / "Programs" / "Bytecode").glob(f"{circuit_name}-*.bc")
+    )
+    return CompileStats(compile_time, bytecode_size, parse_compile_requirements(process.stdout))
+
+
+def ensure_certs(num_parties: int = NUM_PARTIES):
+    """Generate the party certs and the client cert if missing"""
+    if not all((CERTS_PATH / f"P{i}.pem").exists() for i in range(num_parties)):
+        subprocess.run(["Scripts/setup-ssl.sh", str(num_parties)], cwd=MPSPDZ_ROOT, check=True, capture_output=True)
+    if not (CERTS_PATH / f"C{CLIENT_ID}.pem").exists():
+        subprocess.run(
+            ["openssl", "req", "-newkey", "rsa", "-nodes", "-x509",
+             "-out", str(CERTS_PATH / f"C{CLIENT_ID}.pem"), "-keyout", str(CERTS_PATH / f"C{CLIENT_ID}.key"),
+             "-subj", f"/CN=C{CLIENT_ID}"],
+            check=True,
+            capture_output=True,
+        )
+    subprocess.run(["c_rehash", str(CERTS_PATH)], check=True, capture_output=True)
+
+
+def write_ip_file(num_parties: int, mpc_port_base: int) -> Path:
+    with tempfile.NamedTemporaryFile("w", delete=False, suffix=".ip") as ip_file:
+        ip_file.write("\n".join(f"127.0.0.1:{mpc_port_base + i}" for i in range(num_parties)))
+    return Path(ip_file.name)
+
+
+def run_parties(
+    circuit_name: str,
+    num_parties: int = NUM_PARTIES,
+    protocol: str = DEFAULT_PROTOCOL,
+    vm_args: list[str] = [],
+    mpc_port_base: int = DEFAULT_MPC_PORT_BASE,
+    client: Optional[Callable[[], object]] = None,
+    timeout: Optional[float] = None,
+    program_bits: int = DEFAULT_PROGRAM_BITS,
+) -> tuple[RunStats, object]:
+    """
+    Run the program on all parties, and `client` in a thread if given.
+    Returns (stats reported by party 0, return value of `client`).
+    """
+    profile = get_protocol_profile(protocol)
+    binary = profile.vm_binary
+    vm_args = profile.vm_args(program_bits) + vm_args
+    if not (MPSPDZ_ROOT / binary).exists():
+        raise Exception(f"Binary {binary} not found. Build it by running `make {binary}` under {MPSPDZ_ROOT}")
+    ip_file_path = write_ip_file(num_parties, mpc_port_base)
+    client_result = {}
+
+    def run_client():
+        try:
+            client_result["value"] = client()
+        except Exception as e:
+            client_result["error"] = e
+
+    start = time.perf_counter()
+    processes = [
+        subprocess.Popen(
+            [f"./{binary}", "-ip", str(ip_file_path), "-p", str(party_id), *vm_args, "-OF", ".", circuit_name],
+            cwd=MPSPDZ_ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+        for party_id in range(num_parties)
+    ]
+    client_thread = None
+    if client is not None:
+        client_thread = threading.Thread(target=run_client)
+        client_thread.start()
+    try:
+        outputs = [process.communicate(timeout=timeout)[0] for process in processes]
+    finally:
+        for process in processes:
+            process.kill()
+        ip_file_path.unlink(missing_ok=True)
+    if client_thread is not None:
+        client_thread.join()
+    wall_time = time.perf_counter() - start
+
+    for party_id, process in enumerate(processes):
+        if process.returncode != 0:
+            raise Exception(f"Party {party_id} failed to run {circuit_name}: {outputs[party_id]}")
+    if "error" in client_result:
+        raise client_result["error"]
+    return parse_stats(outputs[0], wall_time), client_result.get("value")
+
+
+@contextmanager
+def preserve_shares(num_parties: int = NUM_PARTIES):
+    """Restore the shares under `Persistence/` on exit"""
+    SHARES_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as backup_dir:
+        backups = {}
+        for party_id in range(num_parties):
+            shares_path = SHARES_DIR / f"Transactions-P{party_id}.data"
+            if shares_path.exists():
+                backups[shares_path] = Path(backup_dir) / shares_path.name
+                shutil.copy(shares_path, backups[shares_path])
+        try:
+            yield
+        finally:
+            for party_id in range(num_parties):
+                shares_path = SHARES_DIR / f"Transactions-P{party_id}.data"
+                if shares_path in backups:
+                    shutil.copy(backups[shares_path], shares_path)
+                else:
+                    shares_path.unlink(missing_ok=True)
+
+
+def random_values(num_values: int, seed: int = 0, max_eth: float = 100) -> list[int]:
+    """Random balances, scaled like the shared values"""
+    rng = random.Random(seed)
+    return [round(rng.uniform(0, max_eth) * VALUE_SCALE) for _ in range(num_values)]
+
+
+def seed_shares(
+    values: list[int],
+    max_data_providers: int,
+    num_parties: int = NUM_PARTIES,
+    protocol: str = DEFAULT_PROTOCOL,
+    program_bits: int = DEFAULT_PROGRAM_BITS,
+):
+    """Secret share `values` to `Persistence/` as if they were shared with `share_data`"""
+    circuit_name = "bench_seed_shares"
+    render_program(SEED_PROGRAM, circuit_name, {"max_data_providers": max_data_providers, "values": values})
+    compile_program(circuit_name, program_bits, protocol=protocol)
+    for party_id in range(num_parties):
+        (SHARES_DIR / f"Transactions-P{party_id}.data").unlink(missing_ok=True)
+    run_parties(circuit_name, num_parties, protocol, program_bits=program_bits)
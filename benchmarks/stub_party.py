@@ -0,0 +1,99 @@
+"""
+Computation party server stub for load tests. It serves the party server API used by the
+coordination server, with the TLSN proof verification, the program compilation and the
+MPC run replaced by configurable delays. The data commitment is read from the proof, so
+the coordination server's checks pass.
+
+    python -m benchmarks.stub_party --party-id 0 --port 18006 --coordination-server-url http://127.0.0.1:18005
+"""
+import argparse
+import asyncio
+
+import aiohttp
+from fastapi import FastAPI, HTTPException
+
+from mpc_demo_infra.computation_party_server.schemas import (
+    GetPartyCertResponse,
+    GetPreprocessingStockResponse,
+    RequestQueryComputationMPCRequest,
+    RequestQueryComputationMPCResponse,
+    RequestSharingDataMPCRequest,
+    RequestSharingDataMPCResponse,
+)
+from mpc_demo_infra.tlsn_proof import decompress_proof, parse_tlsn_proof
+
+MAX_PROOF_SIZE = 4 * 1024 * 1024
+
+
+def create_app(
+    party_id: int,
+    coordination_server_url: str,
+    party_api_key: str,
+    verify_delay: float,
+    compile_delay: float,
+    mpc_delay: float,
+) -> FastAPI:
+    app = FastAPI(title=f"Stub Computation Party {party_id}")
+    # One MPC at a time, as the MP-SPDZ ports of a party are fixed
+    mpc_lock = asyncio.Lock()
+
+    async def fetch_tlsn_proof(digest: str) -> str:
+        url = f"{coordination_server_url}/tlsn_proofs/uploads/{digest}"
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url, headers={"X-API-Key": party_api_key}) as response:
+                if response.status != 200:
+                    raise HTTPException(status_code=500, detail=f"Failed to fetch TLSN proof {digest}: {response.status}")
+                return decompress_proof(await response.read(), MAX_PROOF_SIZE)
+
+    @app.get("/get_party_cert", response_model=GetPartyCertResponse)
+    async def get_party_cert():
+        return GetPartyCertResponse(party_id=party_id, cert_file="stub")
+
+    @app.get("/preprocessing_stock", response_model=GetPreprocessingStockResponse)
+    async def get_preprocessing_stock():
+        return GetPreprocessingStockResponse(stock={})
+
+    @app.post("/request_sharing_data_mpc", response_model=RequestSharingDataMPCResponse)
+    async def request_sharing_data_mpc(request: RequestSharingDataMPCRequest):
+        tlsn_proof = request.tlsn_proof
+        if tlsn_proof is None:
+            tlsn_proof = await fetch_tlsn_proof(request.tlsn_proof_digest)
+        data_commitment = parse_tlsn_proof(tlsn_proof).data_commitment_hash
+        await asyncio.sleep(verify_delay)
+        async with mpc_lock:
+            await asyncio.sleep(compile_delay + mpc_delay)
+        return RequestSharingDataMPCResponse(data_commitment=data_commitment)
+
+    @app.post("/request_querying_computation_mpc", response_model=RequestQueryComputationMPCResponse)
+    async def request_querying_computation_mpc(request: RequestQueryComputationMPCRequest):
+        async with mpc_lock:
+            await asyncio.sleep(compile_delay + mpc_delay)
+        return RequestQueryComputationMPCResponse()
+
+    return app
+
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Run a stub computation party server")
+    parser.add_argument("--party-id", type=int, required=True)
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--coordination-server-url", type=str, required=True)
+    parser.add_argument("--party-api-key", type=str, default="1234567890")
+    parser.add_argument("--verify-delay", type=float, default=0.05)
+    parser.add_argument("--compile-delay", type=float, default=0.05)
+    parser.add_argument("--mpc-delay", type=float, default=0.1)
+    args = parser.parse_args()
+    app = create_app(
+        args.party_id,
+        args.coordination_server_url,
+        args.party_api_key,
+        args.verify_delay,
+        args.compile_delay,
+        args.mpc_delay,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
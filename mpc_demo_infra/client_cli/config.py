@@ -19,6 +19,9 @@ class Settings(BaseSettings):
     party_hosts: list[str] = ["localhost", "localhost", "localhost"]
     party_ports: list[int] = [8006, 8007, 8008]
 
+    # File the spans of the sessions are appended to in OTLP/JSON. Tracing isn't exported if empty
+    tracing_path: str = ""
+
     # logging
     max_bytes_mb = 20
     backup_count = 10
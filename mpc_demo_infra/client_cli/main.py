@@ -10,9 +10,12 @@ from typing import Optional
 from ..client_lib.lib import fetch_parties_certs, share_data, query_computation, add_user_to_queue, poll_queue_until_ready, mark_queue_computation_to_be_finished
 from .config import settings
 from ..logger_config import configure_console_logger
+from ..tracing import configure_tracing
 from ..constants import MAX_CLIENT_ID
+from ..query_descriptor import QueryDescriptor, DEFAULT_QUERY, DEFAULT_STATISTICS, Statistic
 
 configure_console_logger()
+configure_tracing('client', settings.tracing_path)
 logger = logging.getLogger(__name__)
 
 # project_root/certs
@@ -125,7 +128,7 @@ async def notarize_and_share_data(eth_address: str, api_key: str, api_secret: st
     logger.info(f"Binance ETH balance data has been shared secretly to MPC parties.")
 
 
-async def query_computation_and_verify():
+async def query_computation_and_verify(query: QueryDescriptor = DEFAULT_QUERY):
     access_key = secrets.token_urlsafe(16)
     await add_user_to_queue(settings.coordination_server_url, access_key, settings.poll_duration, True)
     computation_key = await poll_queue_until_ready(settings.coordination_server_url, access_key, settings.poll_duration, True)
@@ -147,6 +150,7 @@ async def query_computation_and_verify():
             access_key,
             computation_key,
             settings.max_client_wait,
+            query,
         )
         logger.info("Query computation fisnihed")
     except Exception as e:
@@ -173,9 +177,25 @@ def notarize_and_share_data_cli():
 
 
 def query_computation_and_verify_cli():
+    parser = argparse.ArgumentParser(description="Query computation")
+    parser.add_argument("--statistics", type=Statistic, nargs="+", default=DEFAULT_STATISTICS,
+                        help=f"Statistics to compute (choices: {', '.join(s.value for s in Statistic)})")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=[],
+                        help="Percentiles in [0, 100] to compute with `percentiles`")
+    parser.add_argument("--histogram-bounds", type=float, nargs="+", default=[],
+                        help="Ascending bucket upper bounds in ETH to compute with `histogram`")
+    parser.add_argument("--top-k", type=int, default=0,
+                        help="Number of largest values to reveal with `top_k`")
+    args = parser.parse_args()
     try:
         logger.info(f"Started with settings: {settings}")
-        asyncio.run(query_computation_and_verify())
+        query = QueryDescriptor(
+            statistics=args.statistics,
+            percentiles=args.percentiles,
+            histogram_bounds=args.histogram_bounds,
+            top_k=args.top_k,
+        )
+        asyncio.run(query_computation_and_verify(query))
     except Exception as e:
         logger.error(e)
 
@@ -59,14 +59,12 @@ def Z2(k):
     return Z
 
 def Fp(mod):
-    import gmpy2
-
     class Fp(Domain):
         modulus = mod
         n_words = (modulus.bit_length() + 63) // 64
         n_bytes = 8 * n_words
         R = 2 ** (64 * n_words) % modulus
-        R_inv = gmpy2.invert(R, modulus)
+        R_inv = pow(R, -1, modulus)
 
         def unpack(self, os):
             Domain.unpack(self, os)
@@ -6,17 +6,18 @@ from pathlib import Path
 import secrets
 import logging
 import subprocess
+from typing import Optional
 
 from .client import Client, octetStream
-from ..constants import MAX_CLIENT_ID, MAX_DATA_PROVIDERS, CLIENT_TIMEOUT
+from ..constants import MAX_CLIENT_ID, CLIENT_TIMEOUT, BINANCE_DECIMAL_SCALE, VALUE_SCALE
 from mpc_demo_infra.coordination_server.user_queue import AddResult
+from ..query_descriptor import QueryDescriptor, Statistic, DEFAULT_QUERY, output_layout, num_outputs
+from ..tlsn_proof import compress_proof
+from ..compression import compress_json
+from ..tracing import SPAN_KIND_CLIENT, join_trace, span, trace_headers
 
 logger = logging.getLogger(__name__)
 
-EMPTY_COMMITMENT = '0'
-BINANCE_DECIMAL_PRECISION = 2
-BINANCE_DECIMAL_SCALE = 10**BINANCE_DECIMAL_PRECISION
-
 def hex_to_int(hex):
     return int(hex, 16)
 
@@ -68,10 +69,18 @@ from dataclasses import dataclass
 @dataclass(frozen=True)
 class StatsResults:
     num_data_providers: int
-    max: float
-    mean: float
-    median: float
-    gini_coefficient: float
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    median: Optional[float] = None
+    gini_coefficient: Optional[float] = None
+    min: Optional[float] = None
+    variance: Optional[float] = None
+    # percentile -> value
+    percentiles: Optional[dict[float, float]] = None
+    # Number of values in each bucket (-inf, b0], (b0, b1], ..., (b_last, inf)
+    histogram: Optional[list[int]] = None
+    # Largest values, largest first
+    top_k: Optional[list[float]] = None
 
 
 def safe_div(a, b):
@@ -81,6 +90,51 @@ def safe_div(a, b):
         return a / b
 
 
+def decode_stats_results(query: QueryDescriptor, output_list: list[int]) -> StatsResults:
+    """
+    Decode the raw outputs of `query_computation.mpc` laid out by `output_layout(query)`.
+    """
+    outputs = {}
+    offset = 0
+    for name, size in output_layout(query):
+        outputs[name] = output_list[offset:offset + size]
+        offset += size
+    num_data_providers = int(outputs["count"][0])
+    statistics = set(query.statistics)
+
+    def scale(value):
+        return safe_div(value, VALUE_SCALE)
+
+    results = {}
+    if Statistic.MAX in statistics:
+        results["max"] = scale(outputs["max"][0])
+    if Statistic.MIN in statistics:
+        results["min"] = scale(outputs["min"][0])
+    if Statistic.MEAN in statistics:
+        results["mean"] = safe_div(outputs["sum"][0], num_data_providers * VALUE_SCALE)
+    if Statistic.MEDIAN in statistics:
+        results["median"] = scale(outputs["median"][0])
+    if Statistic.GINI_COEFFICIENT in statistics:
+        results["gini_coefficient"] = safe_div(outputs["area"][0], num_data_providers * outputs["sum"][0]) - 1
+    if Statistic.VARIANCE in statistics:
+        mean = safe_div(outputs["sum"][0], num_data_providers)
+        mean_of_squares = safe_div(outputs["sum_of_squares"][0], num_data_providers)
+        results["variance"] = (mean_of_squares - mean * mean) / (VALUE_SCALE * VALUE_SCALE)
+    if Statistic.PERCENTILES in statistics:
+        results["percentiles"] = {
+            p: scale(value) for p, value in zip(query.percentiles, outputs["percentiles"])
+        }
+    if Statistic.HISTOGRAM in statistics:
+        # The MPC outputs the number of values less than or equal to each bound
+        cumulative_counts = outputs["histogram"] + [num_data_providers]
+        results["histogram"] = [
+            count - prev for prev, count in zip([0] + cumulative_counts[:-1], cumulative_counts)
+        ]
+    if Statistic.TOP_K in statistics:
+        results["top_k"] = [scale(value) for value in outputs["top_k"][:num_data_providers]]
+    return StatsResults(num_data_providers=num_data_providers, **results)
+
+
 def run_computation_query_client(
     party_hosts: list[str],
     port_base: int,
@@ -88,8 +142,8 @@ def run_computation_query_client(
     client_id: int,
     cert_file: str,
     key_file: str,
-    max_data_providers: int,
     max_client_wait: int,
+    query: QueryDescriptor = DEFAULT_QUERY,
 ):
     # client id should be assigned by our server
     client = Client(party_hosts, port_base, client_id, certs_path, cert_file, key_file, CLIENT_TIMEOUT, max_client_wait)
@@ -99,34 +153,31 @@ def run_computation_query_client(
         # computationIndex is public, not need to be secret shared.
         os.store(0)
         os.Send(socket)
-    # If computation returns more than one value, need to change the following line.
-    output_list = client.receive_outputs(5 + max_data_providers)
+    output_list = client.receive_outputs(num_outputs(query))
     logger.info(f"Stats of Data: {output_list}")
-    num_data_providers = int(output_list[0])
-
-    results = StatsResults(
-        num_data_providers = num_data_providers,
-        max = safe_div(output_list[1], 10 * BINANCE_DECIMAL_SCALE),
-        mean = safe_div(output_list[2], num_data_providers * 10 * BINANCE_DECIMAL_SCALE),
-        median = safe_div(output_list[3], 10 * BINANCE_DECIMAL_SCALE),
-        gini_coefficient = safe_div(output_list[4], num_data_providers * output_list[2]) - 1,
-    )
-    logger.info(f"Number of data providers: {results.num_data_providers}")
-    logger.info(f"Max: {results.max}")
-    logger.info(f"Mean: {results.mean}")
-    logger.info(f"Median: {results.median}")
-    logger.info(f"Gini Coefficient: {results.gini_coefficient}")
 
-    # return {index -> commitment}
-    data_commitments = [hex(reverse_bytes(i))[2:] for i in output_list[5:]]
-    commitments = {
-        # index is 1-based, commitment is hex string without 0x prefix
-        index + 1: commitment for index, commitment in enumerate(data_commitments) if commitment != EMPTY_COMMITMENT
-    }
-    return results, commitments
+    results = decode_stats_results(query, output_list)
+    logger.info(f"Stats results: {results}")
+    return results
+
+
+async def is_client_cert_valid(cert_path: Path, key_path: Path) -> bool:
+    """Whether the cert and its key exist, and the cert is valid for at least another day"""
+    if not cert_path.exists() or not key_path.exists():
+        return False
+    process = await asyncio.create_subprocess_exec(
+        "openssl", "x509", "-checkend", "86400", "-noout", "-in", str(cert_path),
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    return await process.wait() == 0
 
 
 async def generate_client_cert(max_client_id: int, certs_path: Path, client_id: int = None) -> tuple[int, Path, Path]:
+    """
+    Generate the cert and key of the client, or reuse the ones generated before. A warm query
+    VM of the parties is only reused for queries with the same client cert.
+    """
     if client_id is None:
         # currently the number of simultaneously executing computations is limited to 1
         # and the client_id is fixed to 0 unless overridden
@@ -135,6 +186,8 @@ async def generate_client_cert(max_client_id: int, certs_path: Path, client_id:
     # openssl req -newkey rsa -nodes -x509 -out Player-Data/C$i.pem -keyout Player-Data/C$i.key -subj "/CN=C$i"
     cert_path = certs_path / f"C{client_id}.pem"
     key_path = certs_path / f"C{client_id}.key"
+    if await is_client_cert_valid(cert_path, key_path):
+        return client_id, cert_path, key_path
     certs_path.mkdir(parents=True, exist_ok=True)
     process = await asyncio.create_subprocess_exec(
         "openssl", "req", "-newkey", "rsa", "-nodes", "-x509", "-out", str(cert_path), "-keyout", str(key_path), "-subj", f"/CN=C{client_id}",
@@ -154,7 +207,7 @@ async def generate_client_cert(max_client_id: int, certs_path: Path, client_id:
 
 
 async def validate_computation_key(coordination_server_url: str, access_key: str, computation_key: str) -> None:
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
         async with session.post(f"{coordination_server_url}/validate_computation_key", json={
             "access_key": access_key,
             "computation_key": computation_key,
@@ -167,7 +220,7 @@ async def validate_computation_key(coordination_server_url: str, access_key: str
 
 
 async def mark_queue_computation_to_be_finished(coordination_server_url: str, access_key: str, computation_key: str) -> bool:
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
         logger.info(f"Marking computation to be finished with {computation_key=}...")
         async with session.post(f"{coordination_server_url}/finish_computation", json={
             "access_key": access_key,
@@ -180,6 +233,52 @@ async def mark_queue_computation_to_be_finished(coordination_server_url: str, ac
             return data["is_finished"]
 
 
+async def get_dataset_version(coordination_server_url: str, after: Optional[int] = None, timeout: int = 0) -> int:
+    """
+    Get the dataset version from the coordination server. If `after` is given, the
+    server holds the request until the version changes or `timeout` seconds passed.
+    """
+    params = {} if after is None else {"after": after, "timeout": timeout}
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout + 30), headers=trace_headers()) as session:
+        async with session.get(f"{coordination_server_url}/dataset_version", params=params) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to get dataset version. Response: {response.status} {response.reason}")
+            data = await response.json()
+            return data["version"]
+
+
+async def get_commitments(coordination_server_url: str, offset: int = 0, limit: int = 100) -> tuple[dict[int, str], int]:
+    """
+    Get a page of the public data commitments from the coordination server.
+    Returns ({secret_index -> commitment}, total number of commitments). Commitments are hex strings without 0x prefix.
+    """
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
+        async with session.get(f"{coordination_server_url}/commitments", params={"offset": offset, "limit": limit}) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to get commitments. Response: {response.status} {response.reason}")
+            data = await response.json()
+            commitments = {
+                item["secret_index"]: item["data_commitment"] for item in data["commitments"]
+                if item["data_commitment"] is not None
+            }
+            return commitments, data["total"]
+
+
+async def upload_tlsn_proof(coordination_server_url: str, tlsn_proof: str, access_key: str, computation_key: str) -> str:
+    """Upload the proof compressed, and return the digest referencing it in `share_data`"""
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
+        async with session.post(
+            f"{coordination_server_url}/tlsn_proofs",
+            params={"access_key": access_key, "computation_key": computation_key},
+            data=compress_proof(tlsn_proof),
+            headers={"Content-Type": "application/gzip"},
+        ) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to upload TLSN proof. Response: {response.status} {await response.text()}")
+            data = await response.json()
+            return data["digest"]
+
+
 async def share_data(
     all_certs_path: Path,
     coordination_server_url: str,
@@ -202,15 +301,18 @@ async def share_data(
     with open(cert_path, "r") as cert_file:
         cert_file_content = cert_file.read()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{coordination_server_url}/share_data", json={
+    tlsn_proof_digest = await upload_tlsn_proof(coordination_server_url, tlsn_proof, access_key, computation_key)
+
+    body, headers = compress_json({
         "eth_address": eth_address,
-        "tlsn_proof": tlsn_proof,
+        "tlsn_proof_digest": tlsn_proof_digest,
         "client_cert_file": cert_file_content,
         "client_id": client_id,
         "access_key": access_key,
         "computation_key": computation_key,
-        }) as response:
+    })
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
+        async with session.post(f"{coordination_server_url}/share_data", data=body, headers=headers) as response:
             if response.status != 200:
                 json = await response.json()
                 raise Exception(f"{json['detail']}")
@@ -220,25 +322,26 @@ async def share_data(
     # Wait until all computation parties started their MPC servers.
     logger.info(f"!@# Running data sharing client for {eth_address=}, {client_port_base=}, {client_id=}, {cert_path=}, {key_path=}, {value=}, {nonce=}")
 
-    result = await asyncio.get_event_loop().run_in_executor(
-        None,
-        run_data_sharing_client,
-        computation_party_hosts,
-        client_port_base,
-        str(all_certs_path),
-        client_id,
-        str(cert_path),
-        str(key_path),
-        int(value*10*BINANCE_DECIMAL_SCALE),
-        nonce,
-        max_client_wait,
-    )
+    with span("data_sharing_client", kind=SPAN_KIND_CLIENT, client_id=client_id):
+        result = await asyncio.get_event_loop().run_in_executor(
+            None,
+            run_data_sharing_client,
+            computation_party_hosts,
+            client_port_base,
+            str(all_certs_path),
+            client_id,
+            str(cert_path),
+            str(key_path),
+            int(value*10*BINANCE_DECIMAL_SCALE),
+            nonce,
+            max_client_wait,
+        )
     return result
 
 
 async def add_user_to_queue(coordination_server_url: str, access_key: str, poll_duration: int, use_print: bool = False) -> None:
     while True:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=trace_headers()) as session:
             async with session.post(f"{coordination_server_url}/add_user_to_queue", json={
                 "access_key": access_key,
             }) as response:
@@ -250,13 +353,16 @@ async def add_user_to_queue(coordination_server_url: str, access_key: str, poll_
                         else:
                             logger.warn(f"The queue is currently full. Please wait for your turn.")
                     else:
+                        # Continue the trace of the session started by the coordination server
+                        if data.get("trace_id") is not None:
+                            join_trace(data["trace_id"])
                         return
         await asyncio.sleep(poll_duration)
 
 
 async def add_priority_user_to_queue(coordination_server_url: str, access_key: str, poll_duration: int, use_print: bool = False) -> None:
     while True:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=trace_headers()) as session:
             async with session.post(f"{coordination_server_url}/add_priority_user_to_queue", json={
                 "access_key": access_key,
             }) as response:
@@ -268,13 +374,16 @@ async def add_priority_user_to_queue(coordination_server_url: str, access_key: s
                         else:
                             logger.warn(f"The queue is currently full. Please wait for your turn.")
                     else:
+                        # Continue the trace of the session started by the coordination server
+                        if data.get("trace_id") is not None:
+                            join_trace(data["trace_id"])
                         return
         await asyncio.sleep(poll_duration)
 
 
 async def poll_queue_until_ready(coordination_server_url: str, access_key: str, poll_duration: int, use_print: bool = False) -> str:
     while True:
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(headers=trace_headers()) as session:
             async with session.post(f"{coordination_server_url}/get_position", json={
                 "access_key": access_key,
             }) as response:
@@ -316,6 +425,7 @@ async def query_computation_from_data_consumer_api(
     party_hosts: list[str],
     party_ports: list[int],
     max_client_wait: int,
+    query: QueryDescriptor = DEFAULT_QUERY,
 ):
     access_key = secrets.token_urlsafe(16)
     await add_priority_user_to_queue(coordination_server_url, access_key, poll_duration)
@@ -337,6 +447,7 @@ async def query_computation_from_data_consumer_api(
             access_key,
             computation_key,
             max_client_wait,
+            query,
         )
     finally:
         logger.info("Query computation finished")
@@ -350,6 +461,7 @@ async def query_computation(
     access_key: str,
     computation_key: str,
     max_client_wait: int,
+    query: QueryDescriptor = DEFAULT_QUERY,
 ):
     if await validate_computation_key(coordination_server_url, access_key, computation_key) == False:
         raise Exception(f"Error: Computation key is invalid")
@@ -358,30 +470,33 @@ async def query_computation(
     with open(cert_path, "r") as cert_file:
         cert_file_content = cert_file.read()
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(f"{coordination_server_url}/query_computation", json={
-            "client_id": client_id,
-            "client_cert_file": cert_file_content,
-            "computation_key": computation_key,
-            "access_key": access_key,
-        }) as response:
+    body, headers = compress_json({
+        "client_id": client_id,
+        "client_cert_file": cert_file_content,
+        "computation_key": computation_key,
+        "access_key": access_key,
+        "query": query.dict(),
+    })
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
+        async with session.post(f"{coordination_server_url}/query_computation", data=body, headers=headers) as response:
             if response.status != 200:
                 raise Exception(f"Failed to query computation: {response.status=}, {await response.text()=}")
             data = await response.json()
             client_port_base = data["client_port_base"]
     logger.info(f"!@# Running computation query client for {access_key=}, {computation_key=}, {client_port_base=}")
-    results, commitments = await asyncio.get_event_loop().run_in_executor(
-        None,
-        run_computation_query_client,
-        computation_party_hosts,
-        client_port_base,
-        str(all_certs_path),
-        client_id,
-        str(cert_path),
-        str(key_path),
-        MAX_DATA_PROVIDERS,
-        max_client_wait,
-    )
+    with span("computation_query_client", kind=SPAN_KIND_CLIENT, client_id=client_id):
+        results = await asyncio.get_event_loop().run_in_executor(
+            None,
+            run_computation_query_client,
+            computation_party_hosts,
+            client_port_base,
+            str(all_certs_path),
+            client_id,
+            str(cert_path),
+            str(key_path),
+            max_client_wait,
+            query,
+        )
     return results
 
 
@@ -403,7 +518,7 @@ async def fetch_parties_certs(
                 raise Exception(f'{data["party_id"]=}, {party_id=}')
             return data["cert_file"]
     # Get party certs concurrently
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(headers=trace_headers()) as session:
         party_certs = await asyncio.gather(
             *[get_party_cert(session, host, port, party_id) for party_id, (host, port) in enumerate(zip(party_hosts, party_ports))]
         )
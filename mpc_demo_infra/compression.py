@@ -0,0 +1,147 @@
+"""
+gzip compression of the request and response bodies of the FastAPI services.
+
+Requests with `Content-Encoding: gzip` or `deflate` are decompressed before reaching the
+routes, and responses are gzip-compressed when the client accepts it and the body is at
+least `minimum_size` bytes. TLSN proofs and commitment listings are mostly integer arrays,
+so they shrink several times.
+"""
+import json
+import zlib
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Don't compress bodies smaller than this, the gzip header and CPU time don't pay off
+DEFAULT_MINIMUM_SIZE = 1024
+DEFAULT_COMPRESSLEVEL = 6
+# Max bytes of a decompressed request body
+DEFAULT_MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+REQUEST_ENCODINGS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+# Responses already compressed by the routes
+COMPRESSED_MEDIA_TYPES = ("application/gzip", "application/zip", "application/octet-stream")
+
+
+def compress_json(payload: object, minimum_size: int = DEFAULT_MINIMUM_SIZE) -> tuple[bytes, dict[str, str]]:
+    """Encode `payload` as a JSON request body, gzip-compressed if large enough. Returns (body, headers)"""
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(body) >= minimum_size:
+        compressor = zlib.compressobj(DEFAULT_COMPRESSLEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        body = compressor.compress(body) + compressor.flush()
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def decompress_body(body: bytes, encoding: str, max_size: int) -> bytes:
+    """Decompress a request body, raising ValueError if invalid or larger than `max_size`"""
+    decompressor = zlib.decompressobj(REQUEST_ENCODINGS[encoding])
+    try:
+        data = decompressor.decompress(body, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid {encoding} body: {e}")
+    if len(data) > max_size or decompressor.unconsumed_tail:
+        raise ValueError(f"Request body larger than {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError(f"Truncated {encoding} body")
+    return data
+
+
+class _Responder(GZipResponder):
+    """`GZipResponder` passing through the responses of already compressed media types"""
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(COMPRESSED_MEDIA_TYPES):
+                self.started = True
+                await self.send(message)
+                return
+        elif self.started and not self.initial_message:
+            await self.send(message)
+            return
+        await super().send_with_gzip(message)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        compresslevel: int = DEFAULT_COMPRESSLEVEL,
+        max_request_size: int = DEFAULT_MAX_REQUEST_SIZE,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = headers.get("content-encoding", "").strip().lower()
+        if encoding not in ("", "identity"):
+            if encoding not in REQUEST_ENCODINGS:
+                await self._send_error(send, 415, f"Unsupported Content-Encoding {encoding}")
+                return
+            try:
+                body = decompress_body(await self._read_body(receive), encoding, self.max_request_size)
+            except ValueError as e:
+                status_code = 413 if "larger than" in str(e) else 400
+                await self._send_error(send, status_code, str(e))
+                return
+            scope, receive = self._with_body(scope, body)
+        if "gzip" in headers.get("accept-encoding", ""):
+            await _Responder(self.app, self.minimum_size, self.compresslevel)(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _read_body(self, receive: Receive) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            # Compressed bodies are never larger than the decompressed ones
+            if size > self.max_request_size:
+                raise ValueError(f"Request body larger than {self.max_request_size} bytes")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    def _with_body(self, scope: Scope, body: bytes) -> tuple[Scope, Receive]:
+        """Scope and receive of the request as if `body` was sent uncompressed"""
+        raw_headers = [
+            (name, value) for name, value in scope["headers"]
+            if name not in (b"content-encoding", b"content-length")
+        ]
+        raw_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        sent = False
+
+        async def receive() -> Message:
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return {**scope, "headers": raw_headers}, receive
+
+    async def _send_error(self, send: Send, status_code: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("latin-1"))],
+        })
+        await send({"type": "http.response.body", "body": body})
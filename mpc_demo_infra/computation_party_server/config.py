@@ -1,13 +1,64 @@
-from pydantic import BaseSettings
+from typing import Optional
+from pydantic import BaseModel, BaseSettings, validator
 from pathlib import Path
 
+from .protocols import get_protocol_profile
+
 this_file_path = Path(__file__).parent.resolve()
 
+
+class ExecutionProfile(BaseModel):
+    """
+    How an MPC program is compiled and run on the MP-SPDZ VM.
+    """
+    # Threads used by the `for_range_multithread` loops of the program. It's a compile-time
+    # constant of the program, the VM runs one thread per tape.
+    num_threads: int = 1
+    # Size of the preprocessing batches generated at once (`-b`). VM default if None.
+    batch_size: Optional[int] = None
+    # Bucket size used to check the preprocessing in malicious protocols (`-B`). VM default if None.
+    bucket_size: Optional[int] = None
+    # Any other VM arguments, e.g. buffer options like `--disk-memory`
+    extra_vm_args: list[str] = []
+    # Any other `compile.py` arguments
+    extra_compile_args: list[str] = []
+    # Arguments of the offline phase binary generating one preprocessing batch for the program,
+    # e.g. the number of triples and bits the program uses
+    preprocessing_args: list[str] = []
+
+    def vm_args(self) -> list[str]:
+        args = []
+        if self.batch_size is not None:
+            args += ["-b", str(self.batch_size)]
+        if self.bucket_size is not None:
+            args += ["-B", str(self.bucket_size)]
+        return args + self.extra_vm_args
+
+
 class Settings(BaseSettings):
     num_parties: int = 3
     party_id: int = 0
+    # Bits of the MPC domain. 256 bits are needed for the nonce committed with the balance
     program_bits: int = 256
+    # Bit length of the balances and of the comparisons on them in the statistics. The cost of
+    # each comparison, e.g. in the sort, is proportional to it. Balances must fit in it.
+    stats_bits: int = 64
+    # MP-SPDZ protocol run by all the parties, one of `protocols.PROTOCOL_PROFILES`,
+    # e.g. `replicated-ring` if semi-honest security is acceptable
     mpspdz_protocol: str = "malicious-rep-ring"
+    # Execution profiles of each MPC program. Set in the env file as JSON,
+    # e.g. `QUERY_COMPUTATION_PROFILE='{"num_threads": 4, "batch_size": 10000}'`
+    share_data_profile: ExecutionProfile = ExecutionProfile()
+    query_computation_profile: ExecutionProfile = ExecutionProfile()
+    # Keep the query VM running with the parties connected between queries, instead of starting
+    # one per query. A VM is only reused for the same query from the same client certificate,
+    # which the client library keeps across queries. The VM generates its preprocessing inline,
+    # so no query preprocessing batches are stocked for the coordination server.
+    warm_vm_enabled: bool = False
+    # Queries served by a warm VM before it's restarted
+    warm_vm_max_jobs: int = 100
+    # Seconds to wait for a warm VM to serve a query
+    warm_vm_job_timeout: int = 600
 
     # Database settings
     database_url: str = None
@@ -18,6 +69,8 @@ class Settings(BaseSettings):
     # `request_sharing_data_mpc` and `request_querying_computation_mpc` endpoints.
     # In production, we need https to protect the API key from being exposed.
     party_api_key: str = "1234567890"
+    # Max bytes of an uncompressed TLSN proof pulled from the coordination server
+    tlsn_proof_max_size: int = 4 * 1024 * 1024
 
     # project-root/tlsn
     tlsn_project_root: str = str(this_file_path.parent.parent / "tlsn")
@@ -31,12 +84,33 @@ class Settings(BaseSettings):
     fullchain_pem_path: str = "ssl_certs/fullchain.pem"
     privkey_pem_path: str = "ssl_certs/privkey.pem"
 
+    # Responses of at least this many bytes are gzip-compressed for clients accepting it
+    compression_minimum_size: int = 1024
+    # Max bytes of a request body once decompressed
+    max_request_size: int = 16 * 1024 * 1024
+
+    # File the spans of the sessions are appended to in OTLP/JSON. Tracing isn't exported if empty
+    tracing_path: str = ""
+
     # logging
     max_bytes_mb = 20
     backup_count = 10
     
     # Debug flags
     perform_commitment_check: bool = True
+    # Compile debug output into the MPC programs. Reveals intermediate values and costs extra rounds.
+    mpc_debug: bool = False
+
+    @validator("mpspdz_protocol")
+    def check_mpspdz_protocol(cls, value):
+        get_protocol_profile(value)
+        return value
+
+    @validator("stats_bits")
+    def check_stats_bits(cls, value, values):
+        if "program_bits" in values and value > values["program_bits"]:
+            raise ValueError(f"stats_bits {value} exceeds program_bits {values['program_bits']}")
+        return value
 
     class Config:
         env_file = ".env.party"
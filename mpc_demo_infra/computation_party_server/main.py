@@ -9,6 +9,10 @@ from .middleware import APIKeyMiddleware
 from .limiter import limiter
 from .database import engine, Base
 from .config import settings
+from .warm_vm import warm_vm_pool
+from .preprocessing import PREPROCESSING_OFFLINE_BINARY, get_offline_binary_path
+from ..compression import CompressionMiddleware
+from ..tracing import TracingMiddleware, configure_tracing
 from ..logger_config import configure_file_console_loggers
 
 configure_file_console_loggers(
@@ -16,6 +20,7 @@ configure_file_console_loggers(
     max_bytes_mb=settings.max_bytes_mb,
     backup_count=settings.backup_count
 )
+configure_tracing(f'party_{settings.party_id}', settings.tracing_path)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -32,6 +37,12 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
 app.add_middleware(APIKeyMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    max_request_size=settings.max_request_size,
+)
+app.add_middleware(TracingMiddleware)
 # Add middlewares
 # app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
@@ -42,10 +53,13 @@ app.include_router(router)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Computation Party Server is starting up...")
+    if get_offline_binary_path() is None:
+        logger.info(f"No offline phase binary built for {settings.mpspdz_protocol} ({PREPROCESSING_OFFLINE_BINARY}), preprocessing is generated inline")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Computation Party Server is shutting down...")
+    warm_vm_pool.stop()
 
 # Custom exception handlers can be added here
 
@@ -0,0 +1,50 @@
+"""
+Metrics of the computation party server, exposed at `/metrics`.
+"""
+import subprocess
+
+from ..metrics import counter, gauge, histogram
+
+# Stages of the MPC requests: fetch_proof, verify, backup, fetch_certs, compile, mpc_run, rollback
+STAGE_SECONDS = histogram(
+    "party_stage_seconds",
+    "Seconds spent in each stage of the MPC requests",
+    ("program", "stage"),
+)
+CERT_FETCH_SECONDS = histogram(
+    "party_cert_fetch_seconds",
+    "Seconds to fetch the cert of another party",
+    ("party_id",),
+)
+SUBPROCESSES = counter(
+    "party_subprocesses_total",
+    "Subprocesses run, by command and result",
+    ("command", "result"),
+)
+SUBPROCESSES_RUNNING = gauge(
+    "party_subprocesses_running",
+    "Subprocesses currently running, by command",
+    ("command",),
+)
+WARM_VM_STARTS = counter(
+    "party_warm_vm_starts_total",
+    "Warm query VMs started",
+)
+WARM_VM_JOBS = counter(
+    "party_warm_vm_jobs_total",
+    "Queries served by warm VMs, by result",
+    ("result",),
+)
+
+
+def run_subprocess(command: str, *args, **kwargs) -> subprocess.CompletedProcess:
+    """`subprocess.run`, counted under `command`, e.g. `compile` or `mpc_vm`"""
+    result = "failed"
+    try:
+        with SUBPROCESSES_RUNNING.track_inprogress(command):
+            process = subprocess.run(*args, **kwargs)
+        if process.returncode == 0:
+            result = "succeeded"
+        return process
+    finally:
+        SUBPROCESSES.inc(command, result)
@@ -0,0 +1,127 @@
+"""
+Pool of preprocessing material (triples, bits, ...) generated ahead of the MPC sessions.
+
+All the parties generate a batch together in the offline phase of the protocol, into
+`Preprocessing/<program>/<batch_id>` under the MP-SPDZ root. The coordination server
+requests batches while no session is running and picks a batch held by all parties for
+each session, whose online phase then reads it with `-F`. A batch is deleted once used
+since preprocessing material must never be reused.
+
+Only `mascot` has a separate offline phase binary in MP-SPDZ, `mascot-offline.x`. With any
+other protocol, including the default `malicious-rep-ring`, no batches are stocked and the
+sessions generate their preprocessing inline.
+"""
+import logging
+import re
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from fastapi import HTTPException
+
+from .config import settings, ExecutionProfile
+from .metrics import run_subprocess
+from .protocols import get_protocol_profile
+from ..constants import PREPROCESSING_PROGRAMS
+
+logger = logging.getLogger(__name__)
+
+PREPROCESSING_ROOT = Path(settings.mpspdz_project_root) / "Preprocessing"
+PROTOCOL_PROFILE = get_protocol_profile(settings.mpspdz_protocol)
+PREPROCESSING_OFFLINE_BINARY = PROTOCOL_PROFILE.offline_binary
+
+PARTIAL_SUFFIX = ".partial"
+IN_USE_SUFFIX = ".in-use"
+BATCH_ID_PATTERN = re.compile(r"^[0-9a-f]{1,64}$")
+
+
+def get_offline_binary_path() -> Optional[Path]:
+    """Path of the built offline phase binary, or None if the batches can't be generated"""
+    if not PREPROCESSING_OFFLINE_BINARY:
+        return None
+    binary_path = Path(settings.mpspdz_project_root) / PREPROCESSING_OFFLINE_BINARY
+    return binary_path if binary_path.exists() else None
+
+
+def preprocessed_programs() -> tuple[str, ...]:
+    """Programs run with batches from the pool. A warm query VM generates its preprocessing inline."""
+    if get_offline_binary_path() is None:
+        return ()
+    if settings.warm_vm_enabled:
+        return tuple(program for program in PREPROCESSING_PROGRAMS if program != "query_computation")
+    return PREPROCESSING_PROGRAMS
+
+
+def get_batch_dir(program: str, batch_id: str) -> Path:
+    if program not in preprocessed_programs():
+        raise HTTPException(status_code=400, detail=f"Program {program} doesn't use preprocessing batches")
+    if BATCH_ID_PATTERN.match(batch_id) is None:
+        raise HTTPException(status_code=400, detail=f"Invalid batch id {batch_id}")
+    return PREPROCESSING_ROOT / program / batch_id
+
+
+def list_batches(program: str) -> list[str]:
+    """Ids of the complete batches of `program`, oldest first"""
+    program_dir = PREPROCESSING_ROOT / program
+    if not program_dir.exists():
+        return []
+    return sorted(
+        path.name for path in program_dir.iterdir()
+        if path.is_dir() and BATCH_ID_PATTERN.match(path.name) is not None
+    )
+
+
+def generate_batch(program: str, batch_id: str, ip_file_path: str, profile: ExecutionProfile):
+    """
+    Run the offline phase with the other parties. The batch only becomes visible in the
+    stock once it is complete.
+    """
+    batch_dir = get_batch_dir(program, batch_id)
+    if batch_dir.exists():
+        raise HTTPException(status_code=400, detail=f"Batch {batch_id} of {program} already exists")
+    partial_dir = batch_dir.with_name(batch_id + PARTIAL_SUFFIX)
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    partial_dir.mkdir(parents=True)
+
+    preprocessing_args = " ".join(PROTOCOL_PROFILE.vm_args(settings.program_bits) + profile.preprocessing_args)
+    cmd_run_offline = f"./{PREPROCESSING_OFFLINE_BINARY} -ip {ip_file_path} -p {settings.party_id} --prep-dir {partial_dir} {preprocessing_args}"
+    logger.info(f"Generating preprocessing batch {batch_id} for {program}: {cmd_run_offline}")
+    process = run_subprocess(
+        "offline",
+        cmd_run_offline,
+        cwd=settings.mpspdz_project_root,
+        shell=True,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise HTTPException(status_code=500, detail=f"Failed to generate preprocessing batch {batch_id}: {process.stdout}, {process.stderr}")
+    partial_dir.rename(batch_dir)
+    logger.info(f"Generated preprocessing batch {batch_id} for {program}")
+
+
+@contextmanager
+def use_batch(program: str, batch_id: Optional[str]):
+    """
+    Yield the directory of the batch for `--prep-dir`, or None to generate the preprocessing
+    inline. The batch is taken out of the stock first, and deleted afterwards even if the
+    run failed, since the run may have used part of it.
+    """
+    if batch_id is None:
+        yield None
+        return
+    batch_dir = get_batch_dir(program, batch_id)
+    in_use_dir = batch_dir.with_name(batch_id + IN_USE_SUFFIX)
+    try:
+        batch_dir.rename(in_use_dir)
+    except FileNotFoundError:
+        # All parties must agree on using the batch, so fail rather than falling back to inline preprocessing
+        raise HTTPException(status_code=409, detail=f"Preprocessing batch {batch_id} of {program} not in stock")
+    logger.info(f"Using preprocessing batch {batch_id} for {program}")
+    try:
+        yield in_use_dir
+    finally:
+        shutil.rmtree(in_use_dir, ignore_errors=True)
+        logger.info(f"Deleted used preprocessing batch {batch_id} of {program}")
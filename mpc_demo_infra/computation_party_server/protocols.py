@@ -0,0 +1,83 @@
+"""
+MP-SPDZ protocols the parties can run, selected per deployment with `mpspdz_protocol`.
+
+A profile holds what differs between protocols: the VM binaries, how the programs are
+compiled for the protocol's domain, and the security it provides, from fastest to safest
+roughly semi-honest honest-majority < malicious honest-majority < dishonest-majority.
+All parties must run the same protocol. The client learns the domain from the parties
+when it connects, so it needs no configuration.
+
+Ring protocols compute modulo 2^(program_bits + 1). Field protocols compute modulo a prime
+larger than `program_bits` by the statistical security of the comparisons, which needs
+the VMs to be built for primes of that size, e.g. `MOD = -DGFP_MOD_SZ=5` in `CONFIG.mine`
+for 256-bit programs. Likewise ring sizes above 64 bits need `-DRING_SIZE` at build time.
+"""
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+# Statistical security of the comparisons in a prime field, the compiler's default
+FIELD_STATISTICAL_SECURITY = 40
+
+
+class ProtocolDomain(str, Enum):
+    RING = "ring"
+    FIELD = "field"
+
+
+class Security(str, Enum):
+    SEMI_HONEST = "semi-honest"
+    MALICIOUS = "malicious"
+
+
+class ProtocolProfile(BaseModel):
+    # Name of the protocol in MP-SPDZ, e.g. `malicious-rep-ring`
+    name: str
+    domain: ProtocolDomain
+    security: Security
+    # Secure as long as a majority of the parties is honest, otherwise even if all but one are corrupted
+    honest_majority: bool
+    # Binary running only the offline phase, for the VM to read with `-F`. Most protocols have none.
+    offline_binary: Optional[str] = None
+
+    @property
+    def vm_binary(self) -> str:
+        return f"{self.name}-party.x"
+
+    def compile_args(self, program_bits: int) -> list[str]:
+        if self.domain == ProtocolDomain.RING:
+            # To achieve program bits = 256, we need to use ring size = 257
+            # Ref: https://github.com/data61/MP-SPDZ/blob/894d38c748ab06a6eae8381f6b8c385cf0b2f5fa/Compiler/program.py#L277
+            return ["-R", str(program_bits + 1)]
+        return ["-F", str(program_bits)]
+
+    def vm_args(self, program_bits: int) -> list[str]:
+        """Arguments of the VM and offline binaries for programs compiled with `compile_args`"""
+        if self.domain == ProtocolDomain.RING:
+            return []
+        return ["-lgp", str(program_bits + FIELD_STATISTICAL_SECURITY + 1)]
+
+
+PROTOCOL_PROFILES: dict[str, ProtocolProfile] = {
+    profile.name: profile for profile in [
+        ProtocolProfile(name="replicated-ring", domain=ProtocolDomain.RING, security=Security.SEMI_HONEST, honest_majority=True),
+        ProtocolProfile(name="malicious-rep-ring", domain=ProtocolDomain.RING, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="ps-rep-ring", domain=ProtocolDomain.RING, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="sy-rep-ring", domain=ProtocolDomain.RING, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="semi2k", domain=ProtocolDomain.RING, security=Security.SEMI_HONEST, honest_majority=False),
+        ProtocolProfile(name="replicated-field", domain=ProtocolDomain.FIELD, security=Security.SEMI_HONEST, honest_majority=True),
+        ProtocolProfile(name="malicious-rep-field", domain=ProtocolDomain.FIELD, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="ps-rep-field", domain=ProtocolDomain.FIELD, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="sy-rep-field", domain=ProtocolDomain.FIELD, security=Security.MALICIOUS, honest_majority=True),
+        ProtocolProfile(name="semi", domain=ProtocolDomain.FIELD, security=Security.SEMI_HONEST, honest_majority=False),
+        ProtocolProfile(name="mascot", domain=ProtocolDomain.FIELD, security=Security.MALICIOUS, honest_majority=False, offline_binary="mascot-offline.x"),
+    ]
+}
+
+
+def get_protocol_profile(name: str) -> ProtocolProfile:
+    try:
+        return PROTOCOL_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown MP-SPDZ protocol {name}, must be one of {list(PROTOCOL_PROFILES)}")
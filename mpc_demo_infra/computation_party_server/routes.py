@@ -1,5 +1,6 @@
-import json
 from concurrent.futures import ThreadPoolExecutor
+import contextvars
+import hashlib
 import tempfile
 import logging
 import subprocess
@@ -9,10 +10,11 @@ from datetime import datetime
 import asyncio
 import os
 import glob
+from typing import Optional
 from filelock import FileLock
 
 import requests
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
@@ -23,15 +25,34 @@ from .schemas import (
     RequestSharingDataMPCResponse,
     RequestQueryComputationMPCRequest,
     RequestQueryComputationMPCResponse,
+    RequestPreprocessingMPCRequest,
+    RequestPreprocessingMPCResponse,
+    GetPreprocessingStockResponse,
+    ResetWarmVMResponse,
 )
 from .database import get_db
-from .config import settings
+from .config import settings, ExecutionProfile
 from .limiter import limiter
+from .preprocessing import generate_batch, list_batches, preprocessed_programs, use_batch
+from .metrics import STAGE_SECONDS, CERT_FETCH_SECONDS, run_subprocess
+from .protocols import get_protocol_profile
+from .warm_vm import JOB_DONE_MARKER, warm_vm_pool
 from ..constants import MAX_DATA_PROVIDERS
+from ..query_descriptor import (
+    QueryDescriptor,
+    output_layout,
+    percentile_index,
+    scaled_histogram_bounds,
+)
 from ..client_lib.lib import locate_binance_verifier
+from ..tlsn_proof import parse_tlsn_proof, decompress_proof, proof_digest
+from ..metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from ..tracing import SPAN_KIND_CLIENT, span, stage, trace_headers
 
 SHARE_DATA_ENDPOINT = "/request_sharing_data_mpc"
 QUERY_COMPUTATION_ENDPOINT = "/request_querying_computation_mpc"
+PREPROCESSING_ENDPOINT = "/request_preprocessing_mpc"
+RESET_WARM_VM_ENDPOINT = "/reset_warm_vm"
 
 router = APIRouter()
 
@@ -53,10 +74,9 @@ SHARES_DIR = MP_SPDZ_PROJECT_ROOT / "Persistence"
 SHARES_DIR.mkdir(parents=True, exist_ok=True)
 BACKUP_SHARES_ROOT = MP_SPDZ_PROJECT_ROOT / "Backup"
 BACKUP_SHARES_ROOT.mkdir(parents=True, exist_ok=True)
-# To achieve program bits = 256, we need to use ring size = 257
-# Ref: https://github.com/data61/MP-SPDZ/blob/894d38c748ab06a6eae8381f6b8c385cf0b2f5fa/Compiler/program.py#L277
-CMD_COMPILE_MPC = f"./compile.py -R {settings.program_bits+1}"
-MPC_VM_BINARY = f"{settings.mpspdz_protocol}-party.x"
+PROTOCOL_PROFILE = get_protocol_profile(settings.mpspdz_protocol)
+CMD_COMPILE_MPC = "./compile.py " + " ".join(PROTOCOL_PROFILE.compile_args(settings.program_bits))
+MPC_VM_BINARY = PROTOCOL_PROFILE.vm_binary
 
 @router.get("/get_party_cert", response_model=GetPartyCertResponse)
 # @limiter.limit("1/minute")  # Override default limit for this route
@@ -68,10 +88,14 @@ def get_party_cert():
     return GetPartyCertResponse(party_id=party_id, cert_file=cert)
 
 
+@router.get("/metrics")
+def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @router.post(SHARE_DATA_ENDPOINT, response_model=RequestSharingDataMPCResponse)
 def request_sharing_data_mpc(request: RequestSharingDataMPCRequest, db: Session = Depends(get_db)):
     secret_index = request.secret_index
-    tlsn_proof = request.tlsn_proof
     mpc_port_base = request.mpc_port_base
     client_id = request.client_id
     client_port_base = request.client_port_base
@@ -81,6 +105,13 @@ def request_sharing_data_mpc(request: RequestSharingDataMPCRequest, db: Session
         detail = f"Secret index {secret_index} exceeds the maximum {MAX_DATA_PROVIDERS}"
         logger.error(detail)
         raise HTTPException(status_code=400, detail=detail)
+    if request.tlsn_proof is not None:
+        tlsn_proof = request.tlsn_proof
+    elif request.tlsn_proof_digest is not None:
+        with stage(STAGE_SECONDS, "share_data", "fetch_proof"):
+            tlsn_proof = fetch_tlsn_proof(request.tlsn_proof_digest)
+    else:
+        raise HTTPException(status_code=400, detail="Either `tlsn_proof` or `tlsn_proof_digest` must be given")
     # 1. Verify TLSN proof
     with tempfile.NamedTemporaryFile() as temp_file:
         # Store TLSN proof in temporary file.
@@ -95,21 +126,33 @@ def request_sharing_data_mpc(request: RequestSharingDataMPCRequest, db: Session
         binance_verifier_dir, binance_verifier_exec_cmd = locate_binance_verifier(binance_verifier_locations)
         logger.info("Verifying TLSN proof...")
         try:
-            subprocess.run(
-                f"{binance_verifier_exec_cmd} {temp_file.name}",
-                cwd=binance_verifier_dir,
-                check=True,
-                shell=True,
-                capture_output=True,
-                text=True,
-            )
+            with stage(STAGE_SECONDS, "share_data", "verify"):
+                run_subprocess(
+                    "tlsn_verifier",
+                    f"{binance_verifier_exec_cmd} {temp_file.name}",
+                    cwd=binance_verifier_dir,
+                    check=True,
+                    shell=True,
+                    capture_output=True,
+                    text=True,
+                )
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to verify TLSN proof: {str(e)}, stdout={e.stdout.strip()}, stderr={e.stderr.strip()}")
             raise HTTPException(status_code=400, detail="Failed when verifying TLSN proof")
         logger.info("TLSN proof is valid")
 
+    # The statistics compare balances with `stats_bits` bits, the scaled balance has at most `num_bytes_input` digits
+    if 10 ** parse_tlsn_proof(tlsn_proof).num_bytes_input >= 2 ** (settings.stats_bits - 1):
+        detail = f"Balance may not fit in {settings.stats_bits} bits"
+        logger.error(detail)
+        raise HTTPException(status_code=400, detail=detail)
+
+    # The warm query VM holds the MPC ports, and its program is for the previous number of data providers
+    warm_vm_pool.stop()
+
     # 2. Backup previous shares
-    backup_shares_path = backup_shares(settings.party_id)
+    with stage(STAGE_SECONDS, "share_data", "backup"):
+        backup_shares_path = backup_shares(settings.party_id)
     logger.info(f"!@# backup_shares_path: {backup_shares_path}")
     logger.info(f"Backed up shares to {backup_shares_path}")
 
@@ -121,28 +164,33 @@ def request_sharing_data_mpc(request: RequestSharingDataMPCRequest, db: Session
     generate_client_cert_file(client_id, client_cert_file)
 
     # 5. Fetch other parties' certs
-    fetch_other_parties_certs()
+    with stage(STAGE_SECONDS, "share_data", "fetch_certs"):
+        fetch_other_parties_certs()
 
     logger.info(f"Preparing data sharing program")
-    num_bytes_input, tlsn_data_commitment_hash, tlsn_delta, tlsn_zero_encodings = extract_tlsn_proof_data(tlsn_proof)
+    proof = parse_tlsn_proof(tlsn_proof)
+    tlsn_data_commitment_hash = proof.data_commitment_hash
     # Compile and run share_data program
     circuit_name, target_program_path = generate_data_sharing_program(
         secret_index,
         client_port_base,
         MAX_DATA_PROVIDERS,
         backup_shares_path is None,
-        num_bytes_input,
-        tlsn_delta,
-        tlsn_zero_encodings,
+        proof.num_bytes_input,
+        proof.delta,
+        proof.zero_encodings,
     )
     logger.info(f"Compiling data sharing program {circuit_name}")
-    compile_program(circuit_name)
+    with stage(STAGE_SECONDS, "share_data", "compile"):
+        compile_program(circuit_name, settings.share_data_profile)
     try:
         logger.info(f"Started computation: {circuit_name}")
-        mpc_data_commitment_hash = run_data_sharing_program(circuit_name, ip_file_path)
+        with stage(STAGE_SECONDS, "share_data", "mpc_run"), use_batch("share_data", request.preprocessing_batch_id) as prep_dir:
+            mpc_data_commitment_hash = run_data_sharing_program(circuit_name, ip_file_path, prep_dir)
     except Exception as e:
         logger.error(f"Computation {circuit_name} failed: {str(e)}")
-        rollback_shares(settings.party_id, backup_shares_path)
+        with stage(STAGE_SECONDS, "share_data", "rollback"):
+            rollback_shares(settings.party_id, backup_shares_path)
         raise HTTPException(status_code=500, detail=str(e))
 
     logger.info(f"Verifying data commitment hash")
@@ -155,7 +203,8 @@ def request_sharing_data_mpc(request: RequestSharingDataMPCRequest, db: Session
         logger.info(f"TLSN data commitment: {tlsn_data_commitment_hash}")
         if mpc_data_commitment_hash != tlsn_data_commitment_hash:
             logger.error(f"Data commitment hash mismatch between TLSN proof and MPC. Rolling back shares to {backup_shares_path}")
-            rollback_shares(settings.party_id, backup_shares_path)
+            with stage(STAGE_SECONDS, "share_data", "rollback"):
+                rollback_shares(settings.party_id, backup_shares_path)
             raise HTTPException(status_code=500, detail="Data commitment hash mismatch between TLSN proof and MPC")
 
     return RequestSharingDataMPCResponse(data_commitment=tlsn_data_commitment_hash)
@@ -168,7 +217,8 @@ def request_querying_computation_mpc(request: RequestQueryComputationMPCRequest,
     client_port_base = request.client_port_base
     client_cert_file = request.client_cert_file
     num_data_providers = request.num_data_providers
-    logger.info(f"Querying computation")
+    query = request.query
+    logger.info(f"Querying computation: {query=}")
 
     shares_path = SHARES_DIR / f"Transactions-P{settings.party_id}.data"
     if not shares_path.exists():
@@ -182,19 +232,38 @@ def request_querying_computation_mpc(request: RequestQueryComputationMPCRequest,
     generate_client_cert_file(client_id, client_cert_file)
 
     # Fetch other parties' certs
-    fetch_other_parties_certs()
+    with stage(STAGE_SECONDS, "query_computation", "fetch_certs"):
+        fetch_other_parties_certs()
+
+    if any(abs(bound) >= 2 ** (settings.stats_bits - 1) for bound in scaled_histogram_bounds(query)):
+        raise HTTPException(status_code=400, detail=f"Histogram bounds must fit in {settings.stats_bits} bits")
 
+    profile = settings.query_computation_profile
     circuit_name, target_program_path = generate_computation_query_program(
         client_port_base,
         MAX_DATA_PROVIDERS,
         num_data_providers,
+        query,
+        profile.num_threads,
+        num_jobs=settings.warm_vm_max_jobs if settings.warm_vm_enabled else 1,
     )
 
+    if settings.warm_vm_enabled:
+        try:
+            run_warm_computation_query_program(circuit_name, target_program_path, ip_file_path, profile, client_cert_file)
+        except Exception as e:
+            logger.error(f"Computation {circuit_name} failed on the warm VM: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+        logger.info("MPC query computation finished on the warm VM")
+        return RequestQueryComputationMPCResponse()
+
     logger.info(f"Compiling computation query program {circuit_name}")
-    compile_program(circuit_name)
+    with stage(STAGE_SECONDS, "query_computation", "compile"):
+        compile_program(circuit_name, profile)
     logger.info(f"Started computation: {circuit_name}")
     try:
-        run_computation_query_program(circuit_name, ip_file_path)
+        with stage(STAGE_SECONDS, "query_computation", "mpc_run"), use_batch("query_computation", request.preprocessing_batch_id) as prep_dir:
+            run_computation_query_program(circuit_name, ip_file_path, profile, prep_dir)
     except Exception as e:
         logger.error(f"Computation {circuit_name} failed: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -202,6 +271,39 @@ def request_querying_computation_mpc(request: RequestQueryComputationMPCRequest,
     return RequestQueryComputationMPCResponse()
 
 
+@router.post(RESET_WARM_VM_ENDPOINT, response_model=ResetWarmVMResponse)
+def reset_warm_vm():
+    """
+    Stop the warm query VM. Called on all parties when a query failed on any of them, so
+    that no VM keeps holding the MPC ports while waiting for a peer that restarted.
+    """
+    warm_vm_pool.stop()
+    return ResetWarmVMResponse()
+
+
+@router.post(PREPROCESSING_ENDPOINT, response_model=RequestPreprocessingMPCResponse)
+def request_preprocessing_mpc(request: RequestPreprocessingMPCRequest):
+    program = request.program
+    batch_id = request.batch_id
+    logger.info(f"Requesting preprocessing MPC for {program=}, {batch_id=}, {request.mpc_port_base=}")
+    profile = settings.share_data_profile if program == "share_data" else settings.query_computation_profile
+    ip_file_path = generate_ip_file(request.mpc_port_base)
+    fetch_other_parties_certs()
+    try:
+        with stage(STAGE_SECONDS, program, "preprocessing"):
+            generate_batch(program, batch_id, ip_file_path, profile)
+    finally:
+        Path(ip_file_path).unlink(missing_ok=True)
+    return RequestPreprocessingMPCResponse(batch_id=batch_id)
+
+
+@router.get("/preprocessing_stock", response_model=GetPreprocessingStockResponse)
+def get_preprocessing_stock():
+    return GetPreprocessingStockResponse(
+        stock={program: list_batches(program) for program in preprocessed_programs()},
+    )
+
+
 def generate_ip_file(mpc_port_base: int) -> str:
     # Prepare for IP file
     mpc_addresses = [
@@ -232,7 +334,8 @@ def generate_client_cert_file(client_id: int, client_cert_file: str) -> Path:
     with open(client_cert_path, "w") as cert_file:
         cert_file.write(client_cert_file)
     # c_rehash
-    subprocess.run(
+    run_subprocess(
+        "c_rehash",
         f"c_rehash {CERTS_PATH}",
         check=True,
         shell=True,
@@ -287,10 +390,10 @@ def generate_data_sharing_program(
     is_first_run: bool,
     input_bytes: int,
     tlsn_delta: str,
-    tlsn_zero_encodings: list[str]
+    tlsn_zero_encodings: list[str],
+    template_path: Path = TEMPLATE_PROGRAM_DIR / "share_data.mpc",
 ) -> str:
     # Generate share_data_<client_id>.mpc with template in program/share_data.mpc
-    template_path = TEMPLATE_PROGRAM_DIR / "share_data.mpc"
     with open(template_path, "r") as template_file:
         program_content = template_file.read()
     circuit_name = f"share_data_{secret_index}"
@@ -301,6 +404,7 @@ def generate_data_sharing_program(
     program_content = program_content.replace("{input_bytes}", str(input_bytes))
     program_content = program_content.replace("{delta}", repr(tlsn_delta))
     program_content = program_content.replace("{zero_encodings}", repr(tlsn_zero_encodings))
+    program_content = program_content.replace("{debug}", str(settings.mpc_debug))
 
     # Remove lines that contains '# NOTE: Skipped if it's the first run'
     if is_first_run:
@@ -317,6 +421,10 @@ def generate_computation_query_program(
     client_port_base: int,
     max_data_providers: int,
     num_data_providers: int,
+    query: QueryDescriptor,
+    num_threads: int = 1,
+    stats_bits: int = settings.stats_bits,
+    num_jobs: int = 1,
 ) -> str:
     template_path = TEMPLATE_PROGRAM_DIR / "query_computation.mpc"
     with open(template_path, "r") as template_file:
@@ -326,36 +434,55 @@ def generate_computation_query_program(
     program_content = program_content.replace("{client_port_base}", str(client_port_base))
     program_content = program_content.replace("{max_data_providers}", str(max_data_providers))
     program_content = program_content.replace("{num_data_providers}", str(num_data_providers))
-    logger.info(f"Generated query computation program from the template with parameters: {circuit_name=}, {client_port_base=}, {max_data_providers=}, {num_data_providers=}")
+    program_content = program_content.replace("{output_layout}", repr(output_layout(query)))
+    program_content = program_content.replace("{percentile_indices}", repr([percentile_index(p, num_data_providers) for p in query.percentiles]))
+    program_content = program_content.replace("{histogram_bounds}", repr(scaled_histogram_bounds(query)))
+    program_content = program_content.replace("{top_k}", str(query.top_k))
+    program_content = program_content.replace("{num_threads}", str(num_threads))
+    program_content = program_content.replace("{stats_bits}", str(stats_bits))
+    program_content = program_content.replace("{num_jobs}", str(num_jobs))
+    program_content = program_content.replace("{job_done_marker}", repr(JOB_DONE_MARKER))
+    logger.info(f"Generated query computation program from the template with parameters: {circuit_name=}, {client_port_base=}, {max_data_providers=}, {num_data_providers=}, {query=}, {num_threads=}, {stats_bits=}, {num_jobs=}")
     logger.debug(f"Generated program: {program_content}")
     with open(target_program_path, "w") as program_file:
         program_file.write(program_content)
     return circuit_name, target_program_path
 
 
-def compile_program(circuit_name: str):
+def compile_program(circuit_name: str, profile: ExecutionProfile = ExecutionProfile()):
     # Compile share_data_<client_id>.mpc
-    subprocess.run(
-        f"{CMD_COMPILE_MPC} {circuit_name}",
+    compile_args = " ".join(profile.extra_compile_args)
+    run_subprocess(
+        "compile",
+        f"{CMD_COMPILE_MPC} {compile_args} {circuit_name}",
         cwd=settings.mpspdz_project_root,
         check=True,
         shell=True,
     )
 
 
-def run_program(circuit_name: str, ip_file_path: str):
+def mpc_vm_command(circuit_name: str, ip_file_path: str, profile: ExecutionProfile, prep_dir: Optional[Path] = None) -> str:
     binary_path = Path(settings.mpspdz_project_root) / MPC_VM_BINARY
     if not binary_path.exists():
         # Build the binary if not exists
         raise Exception(f"Binary {binary_path} not found. Build it by running `make {MPC_VM_BINARY}` under {settings.mpspdz_project_root}")
-    # Run share_data_<client_id>.mpc
     # cmd_run_mpc = f"./{MPC_VM_BINARY} -N {settings.num_parties} -p {settings.party_id} -OF . {circuit_name} -ip {str(ip_file_path)}"
     # ./replicated-ring-party.x -ip ip_rep -p 0 tutorial
-    cmd_run_mpc = f"./{MPC_VM_BINARY} -ip {str(ip_file_path)} -p {settings.party_id} -OF . {circuit_name}"
+    vm_args = " ".join(PROTOCOL_PROFILE.vm_args(settings.program_bits) + profile.vm_args())
+    if prep_dir is not None:
+        # Read the preprocessing generated ahead of time instead of generating it inline
+        vm_args += f" -F --prep-dir {prep_dir}"
+    return f"./{MPC_VM_BINARY} -ip {str(ip_file_path)} -p {settings.party_id} {vm_args} -OF . {circuit_name}"
+
+
+def run_program(circuit_name: str, ip_file_path: str, profile: ExecutionProfile = ExecutionProfile(), prep_dir: Optional[Path] = None):
+    # Run share_data_<client_id>.mpc
+    cmd_run_mpc = mpc_vm_command(circuit_name, ip_file_path, profile, prep_dir)
     logger.info(f"Executing a program on {MPC_VM_BINARY} vm: {cmd_run_mpc}")
     # Run the MPC program
     try:
-        process = subprocess.run(
+        process = run_subprocess(
+            "mpc_vm",
             f"{cmd_run_mpc}",
             cwd=settings.mpspdz_project_root,
             shell=True,
@@ -372,8 +499,8 @@ def run_program(circuit_name: str, ip_file_path: str):
     return process
 
 
-def run_data_sharing_program(circuit_name: str, ip_file_path: Path) -> list[str]:
-    process = run_program(circuit_name, ip_file_path)
+def run_data_sharing_program(circuit_name: str, ip_file_path: Path, prep_dir: Optional[Path] = None) -> list[str]:
+    process = run_program(circuit_name, ip_file_path, settings.share_data_profile, prep_dir)
     output_lines = process.stdout.split('\n')
 
     commitments = []
@@ -395,8 +522,8 @@ def run_data_sharing_program(circuit_name: str, ip_file_path: Path) -> list[str]
     return commitments[0]
 
 
-def run_computation_query_program(circuit_name: str, ip_file_path: Path) -> list[str]:
-    return run_program(circuit_name, ip_file_path)
+def run_computation_query_program(circuit_name: str, ip_file_path: Path, profile: ExecutionProfile = ExecutionProfile(), prep_dir: Optional[Path] = None) -> list[str]:
+    return run_program(circuit_name, ip_file_path, profile, prep_dir)
     # # 'Result of computation 0: 10'
     # output_lines = process.stdout.split('\n')
     # outputs = []
@@ -411,43 +538,48 @@ def run_computation_query_program(circuit_name: str, ip_file_path: Path) -> list
     # return outputs
 
 
-def extract_tlsn_proof_data(tlsn_proof: str):
-    WORD_SIZE = 16
-    WORDS_PER_LABEL = 8
-
-    tlsn_proof = json.loads(tlsn_proof)
-    private_openings = tlsn_proof["substrings"]["private_openings"]
-    if len(private_openings) != 1:
-        raise Exception(f"Expected 1 private opening, got {len(private_openings)}")
-    commitment_index, openings = list(private_openings.items())[0]
-    commitment_info, commitment = openings
-    data_commitment_hash = bytes(commitment["hash"]).hex()
-    # FIXME: `nonce` shouldn't be included in the proof
-    # data_commitment_nonce = bytes(commitment["nonce"]).hex()
-
-    encodings = tlsn_proof["encodings"]
-    deltas = []
-    zero_encodings = []
-    num_bytes_input = len(encodings)
-    for e in encodings:
-        delta = e["U8"]["state"]["delta"]
-        labels = e["U8"]["labels"]
-        if len(delta) != WORD_SIZE:
-            raise Exception(f"Expected {WORD_SIZE} bytes in delta, got {len(delta)}")
-        delta_hex = bytes(delta).hex()
-        deltas.append(delta_hex)
-        if len(labels) != WORDS_PER_LABEL:
-            raise Exception(f"Expected {WORDS_PER_LABEL} labels, got {len(labels)}")
-        for l in labels:
-            if len(l) != WORD_SIZE:
-                raise Exception(f"Expected {WORD_SIZE} bytes in label, got {len(l)}")
-            label_hex = bytes(l).hex()
-            zero_encodings.append(label_hex)
-    if len(zero_encodings) != WORDS_PER_LABEL * len(encodings):
-        raise Exception(f"Expected {WORDS_PER_LABEL * len(encodings)} labels, got {len(zero_encodings)}")
-    if not len(set(deltas)) == 1:
-        raise Exception(f"Expected all deltas to be the same, got {deltas}")
-    return num_bytes_input, data_commitment_hash, deltas[0], zero_encodings
+def run_warm_computation_query_program(circuit_name: str, program_path: Path, ip_file_path: str, profile: ExecutionProfile, client_cert_file: str) -> list[str]:
+    """
+    Serve the query on the warm VM of the program, compiling and starting it first if it
+    isn't running. Returns the output of the VM for the query.
+    """
+    vm_args = " ".join(profile.vm_args())
+    # The VM sets up TLS with the certificates in `CERTS_PATH` when it starts. It isn't known to
+    # trust client certificates added afterwards, so it only serves the client it started for.
+    key = hashlib.sha256(program_path.read_bytes() + vm_args.encode() + client_cert_file.encode()).hexdigest()
+    vm = warm_vm_pool.get(key)
+    if vm is None:
+        logger.info(f"Compiling computation query program {circuit_name} for a warm VM")
+        with stage(STAGE_SECONDS, "query_computation", "compile"):
+            compile_program(circuit_name, profile)
+        vm = warm_vm_pool.start(
+            key,
+            mpc_vm_command(circuit_name, ip_file_path, profile),
+            settings.mpspdz_project_root,
+            settings.warm_vm_max_jobs,
+        )
+    with stage(STAGE_SECONDS, "query_computation", "mpc_run"):
+        return warm_vm_pool.run_job(vm, settings.warm_vm_job_timeout)
+
+
+# Keeps the connection to the coordination server alive across requests
+coordination_server_session = requests.Session()
+
+def fetch_tlsn_proof(digest: str) -> str:
+    """Pull the gzip-compressed proof uploaded to the coordination server, and check its digest"""
+    url = f"{settings.coordination_server_url}/tlsn_proofs/uploads/{digest}"
+    logger.info(f"Fetching TLSN proof {digest} from the coordination server")
+    response = coordination_server_session.get(url, headers={"X-API-Key": settings.party_api_key, **trace_headers()})
+    if response.status_code != 200:
+        logger.error(f"Failed to fetch TLSN proof {digest}: {response.status_code} {response.text}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch TLSN proof {digest} from the coordination server")
+    try:
+        tlsn_proof = decompress_proof(response.content, settings.tlsn_proof_max_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid TLSN proof {digest}: {e}")
+    if proof_digest(tlsn_proof) != digest:
+        raise HTTPException(status_code=400, detail=f"TLSN proof doesn't match its digest {digest}")
+    return tlsn_proof
 
 
 def fetch_other_parties_certs():
@@ -456,7 +588,8 @@ def fetch_other_parties_certs():
     def get_party_cert(host: str, port: int, party_id: int):
         url = f"{settings.party_web_protocol}://{host}:{port}/get_party_cert"
         logger.info(f"Fetching party cert from {host}:{port}")
-        response = requests.get(url)
+        with CERT_FETCH_SECONDS.time(party_id), span("fetch_cert", kind=SPAN_KIND_CLIENT, party_id=party_id):
+            response = requests.get(url, headers=trace_headers())
         if response.status_code != 200:
             logger.error(f"Failed to fetch party cert from {host}:{port}, text: {response.text}")
             raise HTTPException(status_code=500, detail=f"Failed to fetch party cert from {host}:{port}, text: {response.text}")
@@ -474,7 +607,8 @@ def fetch_other_parties_certs():
 
     with ThreadPoolExecutor() as executor:
         futures = [
-            executor.submit(get_party_cert, host, port, party_id)
+            # In the context of the request, to trace the fetch under it
+            executor.submit(contextvars.copy_context().run, get_party_cert, host, port, party_id)
             for party_id, (host, port) in enumerate(zip(settings.party_hosts, settings.party_ports))
             if party_id != settings.party_id
         ]
@@ -1,16 +1,23 @@
+from typing import Optional
 from pydantic import BaseModel
 
+from ..query_descriptor import QueryDescriptor, DEFAULT_QUERY
+
 class GetPartyCertResponse(BaseModel):
     party_id: int
     cert_file: str
 
 class RequestSharingDataMPCRequest(BaseModel):
-    tlsn_proof: str
+    # Either the proof, or its digest to pull it from the coordination server
+    tlsn_proof: Optional[str] = None
+    tlsn_proof_digest: Optional[str] = None
     mpc_port_base: int
     secret_index: int
     client_id: int
     client_port_base: int
     client_cert_file: str
+    # Preprocessing batch held by all parties, generated inline if None
+    preprocessing_batch_id: Optional[str] = None
 
 class RequestSharingDataMPCResponse(BaseModel):
     data_commitment: str
@@ -21,6 +28,24 @@ class RequestQueryComputationMPCRequest(BaseModel):
     client_id: int
     client_port_base: int
     client_cert_file: str
+    query: QueryDescriptor = DEFAULT_QUERY
+    # Preprocessing batch held by all parties, generated inline if None
+    preprocessing_batch_id: Optional[str] = None
 
 class RequestQueryComputationMPCResponse(BaseModel):
     pass
+
+class ResetWarmVMResponse(BaseModel):
+    pass
+
+class RequestPreprocessingMPCRequest(BaseModel):
+    program: str
+    batch_id: str
+    mpc_port_base: int
+
+class RequestPreprocessingMPCResponse(BaseModel):
+    batch_id: str
+
+class GetPreprocessingStockResponse(BaseModel):
+    # program -> ids of the batches in stock, oldest first
+    stock: dict[str, list[str]]
@@ -0,0 +1,148 @@
+"""
+Warm MP-SPDZ VM for the query computation.
+
+A cold query starts `{protocol}-party.x`, which loads the program and connects to the
+other parties before serving the client, then exits. A warm VM runs the query program
+compiled with `NUM_JOBS > 1`: once connected, the parties loop over client connections,
+reading the latest shares for each query. The VM's output is the control channel. The
+party server waits for the VM to print `JOB_DONE_MARKER` after each query, and stops the
+VM to release it.
+
+The program is specific to the number of data providers and the query, so a VM is kept
+for one program at a time, keyed by its source. The key also covers the client
+certificate: the VM trusts the certificates present when it started, so it only serves
+repeated queries of a client keeping its certificate. The client library reuses its
+certificate until it's about to expire, so the queries of the data consumer API and of
+a client CLI with the same certs directory hit the same VM. A VM is replaced when
+another program or client queries, and stopped before sharing data, which uses the same
+MPC ports and changes the number of data providers. All parties get the same requests, so
+they start and stop their VMs together. If a job fails, the VM is stopped, and the
+coordination server resets the VMs of all parties, so that they start afresh on the next
+query instead of waiting for the failed peer on the MPC ports.
+"""
+import logging
+import os
+import queue
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional
+
+from .metrics import WARM_VM_JOBS, WARM_VM_STARTS
+
+logger = logging.getLogger(__name__)
+
+JOB_DONE_MARKER = "Query computation done"
+
+
+class WarmVMError(Exception):
+    pass
+
+
+class WarmVM:
+    def __init__(self, key: str, command: str, cwd: str, num_jobs: int):
+        self.key = key
+        self.command = command
+        self.cwd = cwd
+        self.jobs_left = num_jobs
+        self.process: Optional[subprocess.Popen] = None
+        # Output lines of the VM, None once it exited
+        self.lines: queue.Queue[Optional[str]] = queue.Queue()
+
+    def start(self) -> None:
+        logger.info(f"Starting warm VM: {self.command}")
+        self.process = subprocess.Popen(
+            self.command,
+            cwd=self.cwd,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            # In its own process group, to stop the VM along with the shell running it
+            start_new_session=True,
+        )
+        # Drain the output so that the VM never blocks on a full pipe
+        threading.Thread(target=self._read_output, daemon=True).start()
+
+    def _read_output(self) -> None:
+        for line in self.process.stdout:
+            self.lines.put(line.rstrip("\n"))
+        self.lines.put(None)
+
+    @property
+    def is_running(self) -> bool:
+        return self.process is not None and self.process.poll() is None and self.jobs_left > 0
+
+    def wait_for_job(self, timeout: float) -> list[str]:
+        """Wait until the VM served a query, and return its output for the query"""
+        deadline = time.monotonic() + timeout
+        output = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise WarmVMError(f"Warm VM didn't finish the query in {timeout} seconds: {output}")
+            if line is None:
+                raise WarmVMError(f"Warm VM exited with {self.process.wait()}: {output}")
+            if line == JOB_DONE_MARKER:
+                self.jobs_left -= 1
+                return output
+            output.append(line)
+
+    def stop(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        logger.info(f"Stopping warm VM {self.key}")
+        os.killpg(self.process.pid, signal.SIGTERM)
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+
+
+class WarmVMPool:
+    """
+    Holds the warm VM of the party. Only one VM runs at a time, since the MPC and client
+    ports of the queries are fixed.
+    """
+    def __init__(self):
+        self.vm: Optional[WarmVM] = None
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[WarmVM]:
+        """The running VM for `key`, if any. Any other VM is stopped."""
+        with self.lock:
+            if self.vm is not None and (self.vm.key != key or not self.vm.is_running):
+                self.vm.stop()
+                self.vm = None
+            return self.vm
+
+    def start(self, key: str, command: str, cwd: str, num_jobs: int) -> WarmVM:
+        with self.lock:
+            if self.vm is not None:
+                self.vm.stop()
+            self.vm = WarmVM(key, command, cwd, num_jobs)
+            self.vm.start()
+            WARM_VM_STARTS.inc()
+            return self.vm
+
+    def run_job(self, vm: WarmVM, timeout: float) -> list[str]:
+        try:
+            output = vm.wait_for_job(timeout)
+        except WarmVMError:
+            WARM_VM_JOBS.inc("failed")
+            self.stop()
+            raise
+        WARM_VM_JOBS.inc("succeeded")
+        return output
+
+    def stop(self) -> None:
+        with self.lock:
+            if self.vm is not None:
+                self.vm.stop()
+                self.vm = None
+
+
+warm_vm_pool = WarmVMPool()
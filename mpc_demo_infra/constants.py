@@ -3,3 +3,11 @@ MAX_CLIENT_ID = 1000
 # Max number of data providers
 MAX_DATA_PROVIDERS = 1000
 CLIENT_TIMEOUT = 6000
+# Binance balances have 2 decimals
+BINANCE_DECIMAL_PRECISION = 2
+BINANCE_DECIMAL_SCALE = 10**BINANCE_DECIMAL_PRECISION
+# Balances are shared multiplied by this factor. The extra 10 is required by the digit
+# extraction in the commitment circuit of `share_data.mpc`.
+VALUE_SCALE = 10 * BINANCE_DECIMAL_SCALE
+# MPC programs that can run on preprocessing generated ahead of time
+PREPROCESSING_PROGRAMS = ("share_data", "query_computation")
@@ -0,0 +1,33 @@
+from .config import settings
+from .user_queue import UserQueueBase, UserQueue
+from .queue_journal import QueueJournal
+from .sqlite_user_queue import SqliteUserQueue
+from .locks import AsyncLockBase, LocalLock, SqliteLeaseLock
+
+# Backends of the queue and the locks.
+# - "memory": in the memory of a single process, journaled to `queue_journal_path`
+# - "sqlite": in a SQLite database shared by the workers on a host
+QUEUE_BACKENDS = ("memory", "sqlite")
+
+
+def create_user_queue() -> UserQueueBase:
+    if settings.queue_backend == "memory":
+        journal = None
+        if settings.queue_journal_path:
+            journal = QueueJournal(
+                settings.queue_journal_path,
+                fsync=settings.queue_journal_fsync,
+                compact_threshold=10 * settings.user_queue_size,
+            )
+        return UserQueue(settings.user_queue_size, settings.user_queue_head_timeout, journal)
+    elif settings.queue_backend == "sqlite":
+        return SqliteUserQueue(settings.queue_sqlite_path, settings.user_queue_size, settings.user_queue_head_timeout)
+    raise ValueError(f"Unknown queue backend {settings.queue_backend}, expected one of {QUEUE_BACKENDS}")
+
+
+def create_sharing_data_lock() -> AsyncLockBase:
+    if settings.queue_backend == "memory":
+        return LocalLock()
+    elif settings.queue_backend == "sqlite":
+        return SqliteLeaseLock(settings.queue_sqlite_path, "sharing_data", settings.sharing_data_lock_lease)
+    raise ValueError(f"Unknown queue backend {settings.queue_backend}, expected one of {QUEUE_BACKENDS}")
@@ -11,17 +11,74 @@ class Settings(BaseSettings):
     # User queue
     user_queue_size: int = 1000
     user_queue_head_timeout: int = 300
+    # Where the queue and the sharing data lock live, see `backends.py`.
+    # "sqlite" is required to run several workers.
+    queue_backend: str = "memory"
+    queue_sqlite_path: str = "./coordination_queue.db"
+    # Journal of the "memory" queue, to restore it after a restart. Empty to disable.
+    queue_journal_path: str = "./coordination_queue.jsonl"
+    # fsync the journal on every change, to keep it across host crashes and not only process restarts
+    queue_journal_fsync: bool = False
+    # Max seconds the sharing data lock is held by a worker with the "sqlite" backend
+    sharing_data_lock_lease: int = 3600
+    # Number of uvicorn worker processes. More than one requires the "sqlite" queue backend
+    # and no preprocessing.
+    workers: int = 1
+
+    # Token bucket rate limits of `/add_user_to_queue`, `/get_position` and `/validate_computation_key`,
+    # in requests per second and burst size, per client IP and per access key. Clients behind a NAT,
+    # e.g. on the WiFi of an event, share the IP limit: the defaults allow ~200 clients polling every 10s.
+    rate_limit_enabled: bool = True
+    rate_limit_ip_rate: float = 20
+    rate_limit_ip_burst: int = 200
+    rate_limit_access_key_rate: float = 1
+    rate_limit_access_key_burst: int = 5
+    # Max number of IPs and of access keys tracked, the least recently seen ones are forgotten
+    rate_limit_max_keys: int = 100000
+    # IPs of the reverse proxies in front of the server. The client IP of their requests is taken
+    # from `X-Forwarded-For`, otherwise all the clients would share the proxy's limit.
+    rate_limit_trusted_proxies: List[str] = []
+
+    # Fraction of the queue endpoint requests logging the whole queue at debug level
+    queue_dump_sample_rate: float = 0.01
+
+    # Max seconds a `/dataset_version` long-poll is held before returning the unchanged version
+    dataset_version_max_wait: int = 60
+    # Seconds between two reads of the dataset version from the database, which is how a
+    # worker learns about data shared through another worker
+    dataset_version_poll_interval: float = 1
+
+    # Max number of commitments returned by one `/commitments` page
+    commitments_page_max_limit: int = 1000
+
+    # Preprocessing pool on the computation parties, generated while no user is in the queue.
+    # Only works with the `mascot` protocol, the only one with an offline phase binary, built
+    # on the parties. Requires a single worker. If the parties stock nothing, e.g. with the
+    # default `malicious-rep-ring`, the pool is turned off.
+    preprocessing_enabled: bool = False
+    # Number of batches kept in stock for each program
+    preprocessing_target_stock: int = 2
+    # Seconds between two checks of the queue and the stock
+    preprocessing_check_interval: int = 10
 
     # Allowed IPs for access control
     allowed_ips: List[str] = ["192.168.1.100", "192.168.1.101"]
 
     # Database settings
     database_url: str = "sqlite:///./coordination.db"
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    # Max milliseconds a SQLite write waits for another writer
+    database_busy_timeout_ms: int = 5000
 
     tlsn_project_root: str = str(this_file_path.parent.parent / "tlsn")
 
     # mpc-demo-infra/tlsn_proofs
     tlsn_proofs_dir: str = str(this_file_path.parent.parent / "tlsn_proofs")
+    # Max bytes of an uncompressed TLSN proof
+    tlsn_proof_max_size: int = 4 * 1024 * 1024
+    # Seconds an uploaded TLSN proof is kept if no `share_data` uses it
+    tlsn_proof_upload_ttl: int = 3600
 
     # API Keys for additional authentication (optional)
     api_keys: List[str] = ["your_api_key_1", "your_api_key_2"]
@@ -41,6 +98,14 @@ class Settings(BaseSettings):
     fullchain_pem_path: str = "ssl_certs/fullchain.pem"
     privkey_pem_path: str = "ssl_certs/privkey.pem"
 
+    # Responses of at least this many bytes are gzip-compressed for clients accepting it
+    compression_minimum_size: int = 1024
+    # Max bytes of a request body once decompressed
+    max_request_size: int = 16 * 1024 * 1024
+
+    # File the spans of the sessions are appended to in OTLP/JSON. Tracing isn't exported if empty
+    tracing_path: str = ""
+
     # Logging
     max_bytes_mb = 20
     backup_count = 10
@@ -2,19 +2,39 @@
 
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, JSON
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import case, create_engine, event, inspect, text
+from sqlalchemy.pool import QueuePool
 from .config import settings
 from sqlalchemy.sql import func
 import logging
+from dataclasses import dataclass
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+is_sqlite = "sqlite" in settings.database_url
+
 engine = create_engine(
     settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
+    connect_args={"check_same_thread": False} if is_sqlite else {},
+    # Reuse connections across requests. SQLite file databases default to a new connection per checkout.
+    poolclass=QueuePool,
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
     future=True,
 )
+
+if is_sqlite:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets the readers run while a session is being committed
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.database_busy_timeout_ms}")
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=True, bind=engine)
 
 Base = declarative_base()
@@ -33,7 +53,131 @@ class MPCSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     eth_address = Column(String, index=True, nullable=False)
     uid = Column(Integer, index=True, nullable=False)
+    # Pack file of the proof archive, or the proof file for the sessions shared before the archive
     tlsn_proof_path = Column(String, nullable=False)
+    # Digest of the proof in the proof archive, see `proof_archive.py`
+    tlsn_proof_digest = Column(String, nullable=True)
+    # Index of the data in the shares, 1-based
+    secret_index = Column(Integer, index=True, nullable=True)
+    # Public TLSN data commitment hash of the shared data, hex string without 0x prefix
+    data_commitment = Column(String, nullable=True)
+
+
+# Index of the proof archive: where each proof is in the pack file
+class TLSNProofEntry(Base):
+    __tablename__ = "tlsn_proofs"
+    # SHA-256 of the compact JSON of the proof
+    digest = Column(String, primary_key=True)
+    offset = Column(Integer, nullable=False)
+    compressed_size = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+# Counters of the dataset, updated in the same transaction as the `MPCSession` inserts
+# so that they don't need to be computed with `COUNT(*)`. Single row.
+class DatasetMetadata(Base):
+    __tablename__ = "dataset_metadata"
+    id = Column(Integer, primary_key=True)
+    num_data_providers = Column(Integer, nullable=False)
+    next_secret_index = Column(Integer, nullable=False)
+
+
+DATASET_METADATA_ID = 1
+
+
+@dataclass(frozen=True)
+class DatasetCounters:
+    num_data_providers: int
+    next_secret_index: int
+
+
+# Queries used by the async routes. They block, so the routes run them with `run_in_threadpool`.
+
+# Only `id` is selected, so that the lookups are answered by the `eth_address` and `uid` indexes alone
+
+def has_address_shared_data(db: Session, eth_address: str) -> bool:
+    return db.query(MPCSession.id).filter(MPCSession.eth_address == eth_address).first() is not None
+
+
+def has_uid_shared_data(db: Session, uid: int) -> bool:
+    return db.query(MPCSession.id).filter(MPCSession.uid == uid).first() is not None
+
+
+def get_dataset_counters(db: Session) -> DatasetCounters:
+    metadata = db.get(DatasetMetadata, DATASET_METADATA_ID)
+    return DatasetCounters(metadata.num_data_providers, metadata.next_secret_index)
+
+
+def read_dataset_counters() -> DatasetCounters:
+    with SessionLocal() as db:
+        return get_dataset_counters(db)
+
+
+def init_dataset_metadata() -> DatasetCounters:
+    """Create the metadata row from the existing sessions if missing, and return the counters"""
+    with SessionLocal() as db:
+        if db.get(DatasetMetadata, DATASET_METADATA_ID) is None:
+            num_data_providers = db.query(MPCSession).count()
+            max_secret_index = db.query(func.max(MPCSession.secret_index)).scalar() or 0
+            db.add(DatasetMetadata(
+                id=DATASET_METADATA_ID,
+                num_data_providers=num_data_providers,
+                next_secret_index=max(num_data_providers, max_secret_index) + 1,
+            ))
+            db.commit()
+            logger.info(f"Initialized dataset metadata with {num_data_providers} data providers")
+        return get_dataset_counters(db)
+
+
+def get_proof_entry(db: Session, secret_index: int) -> tuple[Optional[MPCSession], Optional[TLSNProofEntry]]:
+    """(session shared with `secret_index`, its entry in the proof archive if archived)"""
+    mpc_session = db.query(MPCSession).filter(MPCSession.secret_index == secret_index).first()
+    if mpc_session is None or mpc_session.tlsn_proof_digest is None:
+        return mpc_session, None
+    return mpc_session, db.get(TLSNProofEntry, mpc_session.tlsn_proof_digest)
+
+
+def get_commitments_page(db: Session, offset: int, limit: int) -> tuple[int, list]:
+    """(number of sessions, (id, secret_index, data_commitment) of the sessions in the page)"""
+    total = get_dataset_counters(db).num_data_providers
+    rows = db.query(MPCSession.id, MPCSession.secret_index, MPCSession.data_commitment) \
+        .order_by(MPCSession.id) \
+        .offset(offset) \
+        .limit(limit) \
+        .all()
+    return total, rows
+
+
+def add_mpc_session(mpc_session: MPCSession) -> DatasetCounters:
+    """Insert the session and update the dataset counters in one transaction"""
+    # A new session, since the request's session is possibly closed when the MPC finishes
+    with SessionLocal() as db:
+        db.add(mpc_session)
+        db.query(DatasetMetadata).filter(DatasetMetadata.id == DATASET_METADATA_ID).update({
+            DatasetMetadata.num_data_providers: DatasetMetadata.num_data_providers + 1,
+            DatasetMetadata.next_secret_index: case(
+                (DatasetMetadata.next_secret_index > mpc_session.secret_index, DatasetMetadata.next_secret_index),
+                else_=mpc_session.secret_index + 1,
+            ),
+        }, synchronize_session=False)
+        db.commit()
+        return get_dataset_counters(db)
+
+
+def add_missing_columns():
+    """Add columns introduced after the tables were created, since `create_all` skips existing tables"""
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            logger.info(f"Added column {column.name} to table {table.name}")
 
 
 def create_tables():
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from .database import DatasetCounters
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetVersion:
+    """
+    Monotonic version of the shared dataset, bumped every time the shares of a new
+    data provider are committed. Consumers can long-poll on it to only rerun a
+    query when the data has actually changed.
+
+    The version is the number of data providers in the `dataset_metadata` row, which is
+    shared by all the workers. The worker committing the shares wakes its own waiters
+    right away, the other workers see the change when they poll the row, at most every
+    `poll_interval` seconds.
+    """
+    def __init__(self, read_counters: Callable[[], DatasetCounters], poll_interval: float):
+        self.read_counters = read_counters
+        self.poll_interval = poll_interval
+        self.counters = read_counters()
+        self._refreshed_at = time.monotonic()
+        self._changed = asyncio.Condition()
+
+    @property
+    def version(self) -> int:
+        return self.counters.num_data_providers
+
+    async def _set(self, counters: DatasetCounters) -> None:
+        async with self._changed:
+            changed = counters.num_data_providers != self.version
+            self.counters = counters
+            if changed:
+                self._changed.notify_all()
+        if changed:
+            logger.info(f"Dataset version changed to {self.version}")
+
+    async def bump(self, counters: DatasetCounters) -> int:
+        """Record the counters committed along with the shares of a new data provider"""
+        self._refreshed_at = time.monotonic()
+        await self._set(counters)
+        return self.version
+
+    async def refresh(self) -> DatasetCounters:
+        """Counters read from the database at most `poll_interval` seconds ago"""
+        if time.monotonic() - self._refreshed_at >= self.poll_interval:
+            self._refreshed_at = time.monotonic()
+            await self._set(await run_in_threadpool(self.read_counters))
+        return self.counters
+
+    async def wait_for_change(self, after: int, timeout: float) -> int:
+        """
+        Wait until the version differs from `after`, or until `timeout` seconds passed.
+        Returns the current version in both cases.
+        """
+        deadline = time.monotonic() + timeout
+        await self.refresh()
+        while self.version == after:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self.version != after),
+                        timeout=min(remaining, self.poll_interval),
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            await self.refresh()
+        return self.version
@@ -0,0 +1,125 @@
+import asyncio
+import secrets
+import sqlite3
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLockBase(ABC):
+    """
+    Like `asyncio.Lock`, so that the lock can be shared by several processes. `release` and
+    `locked` are awaitable too, as a shared lock may have to query its store.
+    """
+    @abstractmethod
+    async def acquire(self) -> bool:
+        pass
+
+    @abstractmethod
+    async def release(self) -> None:
+        pass
+
+    @abstractmethod
+    async def locked(self) -> bool:
+        pass
+
+
+class LocalLock(AsyncLockBase):
+    """Lock of a single coordination server process"""
+    def __init__(self):
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> bool:
+        return await self.lock.acquire()
+
+    async def release(self) -> None:
+        self.lock.release()
+
+    async def locked(self) -> bool:
+        return self.lock.locked()
+
+
+class SqliteLeaseLock(AsyncLockBase):
+    """
+    Lock shared by the coordination server workers on a host through a SQLite database.
+    The lock is leased for `lease_seconds` so that it's not held forever by a worker that died.
+    The queries may wait up to `busy_timeout_ms` for another worker, so they run in the
+    threadpool instead of on the event loop, one at a time on the shared connection.
+    """
+    def __init__(self, db_path: str, name: str, lease_seconds: int, poll_interval: float = 0.1, busy_timeout_ms: int = 5000):
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.owner = None
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn_lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+
+    def _try_acquire(self, owner: str) -> bool:
+        with self.conn_lock:
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row is not None and row[0] > now:
+                    return False
+                if row is not None:
+                    logger.warning(f"Lease of lock {self.name} expired, taking it over")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (self.name, owner, now + self.lease_seconds),
+                )
+                return True
+            finally:
+                self.conn.execute("COMMIT")
+
+    def _release(self, owner: str) -> None:
+        with self.conn_lock:
+            self.conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, owner))
+
+    def _locked(self) -> bool:
+        with self.conn_lock:
+            row = self.conn.execute("SELECT expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    async def acquire(self) -> bool:
+        owner = secrets.token_hex(8)
+        while True:
+            attempt = asyncio.ensure_future(run_in_threadpool(self._try_acquire, owner))
+            try:
+                acquired = await asyncio.shield(attempt)
+            except asyncio.CancelledError:
+                # The attempt still runs in its thread, give the lease back if it takes it
+                attempt.add_done_callback(lambda attempt: self._release_abandoned(attempt, owner))
+                raise
+            if acquired:
+                break
+            await asyncio.sleep(self.poll_interval)
+        self.owner = owner
+        return True
+
+    def _release_abandoned(self, attempt: asyncio.Future, owner: str) -> None:
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result():
+            asyncio.get_running_loop().run_in_executor(None, self._release, owner)
+
+    async def release(self) -> None:
+        if self.owner is None:
+            raise RuntimeError(f"Lock {self.name} is not acquired")
+        owner, self.owner = self.owner, None
+        await run_in_threadpool(self._release, owner)
+
+    async def locked(self) -> bool:
+        return await run_in_threadpool(self._locked)
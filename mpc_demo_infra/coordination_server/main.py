@@ -3,18 +3,23 @@ import csv
 import logging
 import secrets
 import sys
+from pathlib import Path
 
 from fastapi import FastAPI
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi import _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
 
-from .routes import router
-from .database import engine, Base, SessionLocal, MPCSession
+import asyncio
+
+from .routes import router, QUEUE_LENGTH, QUEUE_HEAD_WAIT_SECONDS
+from .database import engine, Base, SessionLocal, MPCSession, add_missing_columns, init_dataset_metadata, read_dataset_counters
 from .config import settings
-from .limiter import limiter
-from .user_queue import UserQueue
+from .rate_limiter import create_rate_limiter
+from .backends import create_user_queue, create_sharing_data_lock
+from .dataset_version import DatasetVersion
+from .preprocessing import replenish_preprocessing_when_idle
+from .proof_archive import get_proof_archive
 from contextlib import asynccontextmanager
+from ..compression import CompressionMiddleware
+from ..tracing import TracingMiddleware, configure_tracing
 from ..logger_config import configure_file_console_loggers
 
 configure_file_console_loggers(
@@ -22,13 +27,29 @@ configure_file_console_loggers(
     max_bytes_mb=settings.max_bytes_mb,
     backup_count=settings.backup_count
 )
+configure_tracing('coord', settings.tracing_path)
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    app.state.user_queue = UserQueue(settings.user_queue_size, settings.user_queue_head_timeout)
+    app.state.user_queue = create_user_queue()
+    QUEUE_LENGTH.set_function(app.state.user_queue.size)
+    QUEUE_HEAD_WAIT_SECONDS.set_function(app.state.user_queue.head_wait_time)
+    # Prevents concurrent sharing data requests
+    app.state.sharing_data_lock = create_sharing_data_lock()
+    app.state.rate_limiter = create_rate_limiter()
+    init_dataset_metadata()
+    app.state.dataset_version = DatasetVersion(read_dataset_counters, settings.dataset_version_poll_interval)
+    preprocessing_task = None
+    if settings.preprocessing_enabled:
+        preprocessing_task = asyncio.create_task(
+            replenish_preprocessing_when_idle(app.state.user_queue, app.state.sharing_data_lock)
+        )
+        preprocessing_task.set_name('preprocessing_replenisher')
     yield
     logger.info("shutting down")
+    if preprocessing_task is not None:
+        preprocessing_task.cancel()
 
 app = FastAPI(
     title="Coordination Server",
@@ -39,11 +60,15 @@ app = FastAPI(
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+add_missing_columns()
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    max_request_size=settings.max_request_size,
+)
+app.add_middleware(TracingMiddleware)
 
-# Set up limiter
-# app.state.limiter = limiter
-# app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-# app.add_middleware(SlowAPIMiddleware)
 # Include API routes
 app.include_router(router)
 
@@ -61,6 +86,11 @@ async def shutdown_event():
 def run():
     import uvicorn
     logger.info(f"Running coordination server on port {settings.port} with settings: {settings}")
+    if settings.workers > 1 and settings.queue_backend == "memory":
+        raise ValueError("Running several workers requires a shared queue backend, e.g. `queue_backend=sqlite`")
+    if settings.workers > 1 and settings.preprocessing_enabled:
+        # Each worker would run its own replenisher on the same MPC ports and pick batches independently
+        raise ValueError("Preprocessing is only supported with a single worker, set `preprocessing_enabled=false` or `workers=1`")
     if settings.party_web_protocol == 'https':
         uvicorn.run(
             "mpc_demo_infra.coordination_server.main:app",
@@ -68,14 +98,16 @@ def run():
             port=settings.port,
             ssl_keyfile=settings.privkey_pem_path,
             ssl_certfile=settings.fullchain_pem_path,
-            log_level="debug"
+            log_level="debug",
+            workers=settings.workers,
         )
     else:
         uvicorn.run(
             "mpc_demo_infra.coordination_server.main:app",
             host="0.0.0.0",
             port=settings.port,
-            log_level="debug"
+            log_level="debug",
+            workers=settings.workers,
         )
 
 
@@ -85,9 +117,42 @@ def list_mpc_sessions():
         mpc_sessions = db.query(MPCSession).all()
         number_of_sessions = len(mpc_sessions)
         logger.info(f"Number of MPC sessions: {number_of_sessions}")
-        writer.writerow(["id", "eth_address", "uid", "tlsn_proof_path"])
+        writer.writerow(["id", "eth_address", "uid", "tlsn_proof_path", "tlsn_proof_digest", "secret_index", "data_commitment"])
+        for mpc_session in mpc_sessions:
+            writer.writerow([
+                mpc_session.id,
+                mpc_session.eth_address,
+                mpc_session.uid,
+                mpc_session.tlsn_proof_path,
+                mpc_session.tlsn_proof_digest,
+                mpc_session.secret_index,
+                mpc_session.data_commitment,
+            ])
+
+
+def migrate_proofs():
+    parser = argparse.ArgumentParser(description="Move the TLSN proof files of the shared data into the proof archive")
+    parser.add_argument("--keep-files", action="store_true", help="Keep the proof files after archiving them")
+    args = parser.parse_args()
+
+    archive = get_proof_archive()
+    num_migrated = 0
+    with SessionLocal() as db:
+        mpc_sessions = db.query(MPCSession).filter(MPCSession.tlsn_proof_digest.is_(None)).all()
+        logger.info(f"Migrating the TLSN proofs of {len(mpc_sessions)} MPC sessions to {archive.pack_path}")
         for mpc_session in mpc_sessions:
-            writer.writerow([mpc_session.id, mpc_session.eth_address, mpc_session.uid, mpc_session.tlsn_proof_path])
+            proof_path = Path(mpc_session.tlsn_proof_path)
+            if not proof_path.exists():
+                logger.warning(f"TLSN proof {proof_path} of MPC session {mpc_session.id} not found, skipping")
+                continue
+            mpc_session.tlsn_proof_digest = archive.add(db, proof_path.read_text())
+            mpc_session.tlsn_proof_path = str(archive.pack_path)
+            db.commit()
+            # Only removed once the archived proof is committed
+            if not args.keep_files:
+                proof_path.unlink()
+            num_migrated += 1
+    logger.info(f"Migrated {num_migrated} TLSN proofs")
 
 
 def gen_party_api_key():
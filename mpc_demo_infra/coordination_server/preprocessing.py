@@ -0,0 +1,146 @@
+"""
+Keeps the preprocessing pool of the computation parties stocked.
+
+A batch is only usable if all parties hold it, so the coordination server requests each
+batch from all parties at once, while no user is in the queue and no data is being
+shared, and picks a batch held by all parties for each MPC session. The parties only
+stock batches with the `mascot` protocol, otherwise the pool is turned off.
+"""
+import asyncio
+import logging
+import secrets
+import time
+from typing import Optional
+
+import aiohttp
+
+from .config import settings
+from .user_queue import UserQueueBase
+from .locks import AsyncLockBase
+from ..constants import PREPROCESSING_PROGRAMS
+
+logger = logging.getLogger(__name__)
+
+# Batches picked for a session but possibly not deleted by the parties yet. Kept in memory,
+# which is why preprocessing requires a single worker.
+_taken_batch_ids: set[str] = set()
+# Cleared once the parties turn out to stock no program, so that sessions stop fetching the stock
+_parties_stock_preprocessing = True
+
+
+def new_batch_id() -> str:
+    # Ids sort by creation time so that the oldest batches are used first
+    return f"{time.time_ns():016x}{secrets.token_hex(4)}"
+
+
+def get_preprocessing_mpc_port_base() -> int:
+    # Right after the ports used by share data and query computation MPCs
+    return settings.free_ports_start + 2 * settings.num_parties
+
+
+async def fetch_preprocessing_stock(session: aiohttp.ClientSession) -> list[dict[str, list[str]]]:
+    async def fetch(party_host: str, party_port: int) -> dict[str, list[str]]:
+        url = f"{settings.party_web_protocol}://{party_host}:{party_port}/preprocessing_stock"
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to fetch preprocessing stock from {url}: {response.status} {await response.text()}")
+            return (await response.json())["stock"]
+    return await asyncio.gather(*[
+        fetch(party_host, party_port) for party_host, party_port in zip(settings.party_hosts, settings.party_ports)
+    ])
+
+
+def get_stock_levels(stocks: list[dict[str, list[str]]]) -> dict[str, int]:
+    """Number of usable batches of each program stocked by all parties"""
+    programs = set.intersection(*[set(stock) for stock in stocks])
+    return {
+        program: len(get_common_batches(stocks, program))
+        for program in PREPROCESSING_PROGRAMS if program in programs
+    }
+
+
+def get_common_batches(stocks: list[dict[str, list[str]]], program: str) -> list[str]:
+    """Ids of the batches of `program` held by all parties, oldest first"""
+    common = set.intersection(*[set(stock.get(program, [])) for stock in stocks])
+    return sorted(common - _taken_batch_ids)
+
+
+async def take_preprocessing_batch(program: str) -> Optional[str]:
+    """
+    Pick the batch to be used up by the next `program` session, or None to generate the
+    preprocessing inline.
+    """
+    if not settings.preprocessing_enabled or not _parties_stock_preprocessing:
+        return None
+    try:
+        async with aiohttp.ClientSession() as session:
+            stocks = await fetch_preprocessing_stock(session)
+    except Exception as e:
+        logger.warning(f"Failed to fetch preprocessing stock, generating preprocessing inline: {e}")
+        return None
+    # Forget the batches the parties already deleted
+    held_batch_ids = set().union(*[batch_ids for stock in stocks for batch_ids in stock.values()])
+    _taken_batch_ids.intersection_update(held_batch_ids)
+    batch_ids = get_common_batches(stocks, program)
+    if len(batch_ids) == 0:
+        logger.info(f"No preprocessing batch in stock for {program}, generating preprocessing inline")
+        return None
+    batch_id = batch_ids[0]
+    _taken_batch_ids.add(batch_id)
+    logger.info(f"Using preprocessing batch {batch_id} for {program}, {len(batch_ids) - 1} left in stock")
+    return batch_id
+
+
+async def request_preprocessing_all_parties(session: aiohttp.ClientSession, program: str, batch_id: str):
+    mpc_port_base = get_preprocessing_mpc_port_base()
+    headers = {"X-API-Key": settings.party_api_key}
+    tasks = []
+    for party_host, party_port in zip(settings.party_hosts, settings.party_ports):
+        url = f"{settings.party_web_protocol}://{party_host}:{party_port}/request_preprocessing_mpc"
+        tasks.append(session.post(url, json={
+            "program": program,
+            "batch_id": batch_id,
+            "mpc_port_base": mpc_port_base,
+        }, headers=headers))
+    responses = await asyncio.gather(*tasks)
+    for party_id, response in enumerate(responses):
+        if response.status != 200:
+            raise Exception(f"Failed to generate preprocessing batch {batch_id} of {program} on party {party_id}: {response.status} {await response.text()}")
+
+
+async def is_idle(user_queue: UserQueueBase, sharing_data_lock: AsyncLockBase) -> bool:
+    return user_queue.size() == 0 and not await sharing_data_lock.locked()
+
+
+async def replenish_preprocessing_when_idle(user_queue: UserQueueBase, sharing_data_lock: AsyncLockBase):
+    """
+    Generate a batch for the program with the lowest stock whenever the parties are idle,
+    until every program has `preprocessing_target_stock` batches. Stops if the parties
+    stock no program.
+    """
+    global _parties_stock_preprocessing
+    while True:
+        try:
+            await asyncio.sleep(settings.preprocessing_check_interval)
+            if not await is_idle(user_queue, sharing_data_lock):
+                continue
+            async with aiohttp.ClientSession() as session:
+                stocks = await fetch_preprocessing_stock(session)
+                stock_levels = get_stock_levels(stocks)
+                logger.debug(f"Preprocessing stock levels: {stock_levels}")
+                if len(stock_levels) == 0:
+                    logger.warning("The parties stock no preprocessing, only the mascot protocol has an offline phase binary. Turning the preprocessing pool off")
+                    _parties_stock_preprocessing = False
+                    return
+                program, level = min(stock_levels.items(), key=lambda item: item[1])
+                if level >= settings.preprocessing_target_stock or not await is_idle(user_queue, sharing_data_lock):
+                    continue
+                batch_id = new_batch_id()
+                logger.info(f"Parties are idle, generating preprocessing batch {batch_id} for {program} ({level=})")
+                await request_preprocessing_all_parties(session, program, batch_id)
+                logger.info(f"Generated preprocessing batch {batch_id} for {program}")
+        except asyncio.CancelledError:
+            logger.info("Preprocessing task cancelled")
+            break
+        except Exception as e:
+            logger.error(f"Error replenishing preprocessing: {str(e)}")
@@ -0,0 +1,90 @@
+"""
+Append-only, content-addressed archive of the accepted TLSN proofs.
+
+Proofs are re-encoded as compact JSON, compressed with zlib and appended to a single
+pack file under `tlsn_proofs_dir`. The `tlsn_proofs` table indexes them by the SHA-256
+digest of the compact JSON, so identical proofs are stored once.
+"""
+import hashlib
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import Iterator
+
+from filelock import FileLock
+from sqlalchemy.orm import Session
+
+from .config import settings
+from . import database
+from .database import TLSNProofEntry
+from ..tlsn_proof import parse_tlsn_proof
+
+logger = logging.getLogger(__name__)
+
+PACK_FILE_NAME = "proofs.pack"
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class ProofArchive:
+    def __init__(self, archive_dir: str):
+        self.archive_dir = Path(archive_dir)
+        self.pack_path = self.archive_dir / PACK_FILE_NAME
+        # Serializes the appends of the coordination server workers
+        self.lock = FileLock(str(self.pack_path) + ".lock")
+
+    def add(self, db: Session, proof: str) -> str:
+        """Archive the proof if not archived yet, and return its digest. The caller commits `db`."""
+        # Reuses the parse of the checks of `share_data`
+        canonical = parse_tlsn_proof(proof).canonical_json
+        digest = hashlib.sha256(canonical).hexdigest()
+        if db.get(TLSNProofEntry, digest) is not None:
+            return digest
+        compressed = zlib.compress(canonical, 9)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            with open(self.pack_path, "ab") as f:
+                offset = f.tell()
+                f.write(compressed)
+                f.flush()
+                os.fsync(f.fileno())
+        # Bytes appended without an index entry, e.g. when the commit below fails, are never read
+        db.add(TLSNProofEntry(digest=digest, offset=offset, compressed_size=len(compressed), size=len(canonical)))
+        logger.info(f"Archived TLSN proof {digest}: {len(proof)} bytes stored in {len(compressed)} bytes")
+        return digest
+
+    def iter_proof(self, entry: TLSNProofEntry, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream the compact JSON of the proof, checking its digest"""
+        decompressor = zlib.decompressobj()
+        hasher = hashlib.sha256()
+        with open(self.pack_path, "rb") as f:
+            f.seek(entry.offset)
+            remaining = entry.compressed_size
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if len(chunk) == 0:
+                    raise ValueError(f"TLSN proof {entry.digest} is truncated in {self.pack_path}")
+                remaining -= len(chunk)
+                data = decompressor.decompress(chunk)
+                hasher.update(data)
+                yield data
+            data = decompressor.flush()
+            hasher.update(data)
+            yield data
+        if hasher.hexdigest() != entry.digest:
+            raise ValueError(f"TLSN proof {entry.digest} is corrupted in {self.pack_path}")
+
+    def read_proof(self, entry: TLSNProofEntry) -> str:
+        return b"".join(self.iter_proof(entry)).decode("utf-8")
+
+
+def get_proof_archive() -> ProofArchive:
+    return ProofArchive(settings.tlsn_proofs_dir)
+
+
+def archive_proof(proof: str) -> str:
+    """Archive the proof in its own transaction and return its digest"""
+    with database.SessionLocal() as db:
+        digest = get_proof_archive().add(db, proof)
+        db.commit()
+    return digest
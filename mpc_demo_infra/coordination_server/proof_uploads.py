@@ -0,0 +1,74 @@
+"""
+TLSN proofs uploaded by the clients before `share_data`, stored gzip-compressed by
+digest under `tlsn_proofs_dir/uploads`. The parties pull the proof by digest instead of
+receiving it in the body of `/request_sharing_data_mpc`.
+"""
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from .config import settings
+from ..tlsn_proof import compress_proof, decompress_proof, proof_digest
+
+logger = logging.getLogger(__name__)
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ProofUploads:
+    def __init__(self, uploads_dir: Path, max_size: int, ttl: int):
+        self.uploads_dir = uploads_dir
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def _path(self, digest: str) -> Path:
+        if not DIGEST_PATTERN.match(digest):
+            raise ValueError(f"Invalid proof digest {digest}")
+        return self.uploads_dir / f"{digest}.json.gz"
+
+    def put(self, compressed: bytes) -> str:
+        """Store a gzip-compressed proof and return its digest"""
+        digest = proof_digest(decompress_proof(compressed, self.max_size))
+        self.uploads_dir.mkdir(parents=True, exist_ok=True)
+        self._prune()
+        with tempfile.NamedTemporaryFile(dir=self.uploads_dir, delete=False) as f:
+            f.write(compressed)
+        os.replace(f.name, self._path(digest))
+        logger.info(f"Stored uploaded TLSN proof {digest} ({len(compressed)} bytes)")
+        return digest
+
+    def put_proof(self, proof: str) -> str:
+        return self.put(compress_proof(proof))
+
+    def get_compressed(self, digest: str) -> Optional[bytes]:
+        path = self._path(digest)
+        return path.read_bytes() if path.exists() else None
+
+    def get_proof(self, digest: str) -> Optional[str]:
+        compressed = self.get_compressed(digest)
+        return None if compressed is None else decompress_proof(compressed, self.max_size)
+
+    def remove(self, digest: str) -> None:
+        self._path(digest).unlink(missing_ok=True)
+
+    def _prune(self) -> None:
+        """Remove the uploads never used by a `share_data` within `ttl` seconds"""
+        expiry = time.time() - self.ttl
+        for path in self.uploads_dir.glob("*.json.gz"):
+            try:
+                if path.stat().st_mtime < expiry:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def get_proof_uploads() -> ProofUploads:
+    return ProofUploads(
+        Path(settings.tlsn_proofs_dir) / "uploads",
+        settings.tlsn_proof_max_size,
+        settings.tlsn_proof_upload_ttl,
+    )
@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class QueueJournal:
+    """
+    Append-only log of the changes to the in-memory `UserQueue`, one JSON event per line:
+    - {"op": "add", "access_key": ...}
+    - {"op": "add_priority", "access_key": ...}
+    - {"op": "head", "access_key": ..., "computation_key": ..., "time_at_queue_head": ...}
+    - {"op": "pop"}
+    Replaying the events restores the queue after a restart. The log is rewritten as a
+    snapshot of the queue once it has `compact_threshold` events.
+    """
+    def __init__(self, path: str, fsync: bool = False, compact_threshold: int = 10000):
+        self.path = Path(path)
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self.num_events = 0
+        self.file = None
+        self.lock = threading.Lock()
+
+    def read_events(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with open(self.path) as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be partially written, when the server died while appending it
+                    logger.warning(f"Ignoring corrupted line {line_number} of queue journal {self.path}")
+
+    def append(self, event: dict) -> None:
+        with self.lock:
+            self.file.write(json.dumps(event) + "\n")
+            self.file.flush()
+            if self.fsync:
+                os.fsync(self.file.fileno())
+            self.num_events += 1
+
+    def needs_compaction(self) -> bool:
+        return self.num_events >= self.compact_threshold
+
+    def compact(self, events: Iterable[dict]) -> None:
+        """Replace the log with `events` describing the current queue and keep appending to it"""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            num_events = 0
+            with open(tmp_path, "w") as f:
+                for event in events:
+                    f.write(json.dumps(event) + "\n")
+                    num_events += 1
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.num_events = num_events
+            self.file = open(self.path, "a")
+
+    def close(self) -> None:
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,101 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, Request
+
+from .config import settings
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by client, e.g. IP or access key. Each bucket holds up to `burst`
+    tokens and is refilled at `rate` tokens per second. Only the `max_keys` most recently
+    used buckets are kept, the least recently used one being evicted in O(1).
+    """
+    def __init__(self, rate: float, burst: int, max_keys: int):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> [tokens, time of the last refill]
+        self.buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take a token for `key`. Returns 0 if allowed, else the seconds until a token is available"""
+        if now is None:
+            now = time.monotonic()
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys:
+                self.buckets.popitem(last=False)
+            bucket = [float(self.burst), now]
+            self.buckets[key] = bucket
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+
+class RateLimiter:
+    """Per IP and per access key limits of the queue endpoints"""
+    def __init__(
+        self,
+        ip_rate: float,
+        ip_burst: int,
+        access_key_rate: float,
+        access_key_burst: int,
+        max_keys: int,
+    ):
+        self.ip_limiter = TokenBucketLimiter(ip_rate, ip_burst, max_keys)
+        self.access_key_limiter = TokenBucketLimiter(access_key_rate, access_key_burst, max_keys)
+
+    def check(self, ip: str, access_key: str) -> None:
+        """Raise 429 with `Retry-After` if the IP or the access key is over its limit"""
+        retry_after = self.ip_limiter.acquire(ip)
+        if retry_after == 0:
+            retry_after = self.access_key_limiter.acquire(access_key)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+
+def create_rate_limiter() -> Optional[RateLimiter]:
+    if not settings.rate_limit_enabled:
+        return None
+    return RateLimiter(
+        settings.rate_limit_ip_rate,
+        settings.rate_limit_ip_burst,
+        settings.rate_limit_access_key_rate,
+        settings.rate_limit_access_key_burst,
+        settings.rate_limit_max_keys,
+    )
+
+
+def get_client_ip(x: Request) -> str:
+    """
+    IP of the client. For requests of a trusted proxy, the last `X-Forwarded-For` address not
+    added by a trusted proxy, as the addresses before it can be forged by the client.
+    """
+    ip = x.client.host if x.client is not None else ""
+    if ip not in settings.rate_limit_trusted_proxies:
+        return ip
+    forwarded_for = [address.strip() for address in x.headers.get("x-forwarded-for", "").split(",")]
+    for address in reversed(forwarded_for):
+        if address and address not in settings.rate_limit_trusted_proxies:
+            return address
+    return ip
+
+
+def check_rate_limit(x: Request, access_key: str) -> None:
+    rate_limiter = x.app.state.rate_limiter
+    if rate_limiter is None:
+        return
+    rate_limiter.check(get_client_ip(x), access_key)
@@ -1,104 +1,259 @@
 import re
-import json
+import random
 import asyncio
 import tempfile
+import time
 from pathlib import Path
 import logging
+from collections import Counter, OrderedDict
 
 import aiohttp
-from fastapi import APIRouter, Depends, HTTPException, Request
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 logger = logging.getLogger(__name__)
 
 from .schemas import (
     RequestHasAddressSharedDataRequest, RequestHasAddressSharedDataResponse,
-    RequestSharingDataRequest, RequestSharingDataResponse,
+    RequestSharingDataRequest, RequestSharingDataResponse, RequestUploadTLSNProofResponse,
     RequestQueryComputationRequest, RequestQueryComputationResponse,
     RequestGetPositionRequest, RequestGetPositionResponse,
     RequestValidateComputationKeyRequest, RequestValidateComputationKeyResponse,
     RequestFinishComputationRequest, RequestFinishComputationResponse,
     RequestAddUserToQueueRequest, RequestAddUserToQueueResponse,
+    RequestDatasetVersionResponse, RequestStatsResponse,
+    RequestCommitmentsResponse, DataCommitment,
+)
+from .database import (
+    MPCSession, get_db,
+    has_address_shared_data as db_has_address_shared_data,
+    has_uid_shared_data, get_dataset_counters, add_mpc_session, get_commitments_page,
+    get_proof_entry,
 )
-from .database import MPCSession, get_db, SessionLocal
 from .config import settings
 from ..constants import MAX_CLIENT_ID, CLIENT_TIMEOUT
 from .user_queue import AddResult
+from .preprocessing import take_preprocessing_batch
+from .rate_limiter import check_rate_limit
+from .proof_archive import archive_proof, get_proof_archive
+from .proof_uploads import get_proof_uploads
 from ..client_lib.lib import locate_binance_verifier
+from ..tlsn_proof import parse_tlsn_proof
+from ..metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, counter, gauge, histogram, render_metrics
+from ..tracing import current_trace_id, stage, trace_headers
 
 router = APIRouter()
 
+QUEUE_LENGTH = gauge("coord_queue_length", "Users in the queue, including the head")
+QUEUE_HEAD_WAIT_SECONDS = gauge("coord_queue_head_wait_seconds", "Seconds the user at the head has held the computation key")
+TIME_TO_HEAD_SECONDS = histogram(
+    "coord_time_to_head_seconds",
+    "Seconds from joining the queue to getting the computation key",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200),
+)
+QUEUE_REQUESTS = counter("coord_queue_requests_total", "Queue endpoint requests by endpoint and result", ("event",))
+# Stages: verify, lock_wait, parties_mpc, archive
+STAGE_SECONDS = histogram(
+    "coord_stage_seconds",
+    "Seconds spent in each stage of the share data and query computation requests",
+    ("program", "stage"),
+)
+
 TLSN_VERIFIER_PATH = Path(settings.tlsn_project_root) / "tlsn" / "examples" / "binance"
 TLSN_VERIFIER_BUILD_PATH = Path(settings.tlsn_project_root) / "tlsn" / "target" / "release" / "examples"
 CMD_VERIFY_TLSN_PROOF = "cargo run --release --example binance_verifier"
 CMD_TLSN_VERIFIER = "./binance_verifier"
 
 
-# Global lock for sharing data, to prevent concurrent sharing data requests.
-sharing_data_lock = asyncio.Lock()
-
-
 @router.get("/has_address_shared_data", response_model=RequestHasAddressSharedDataResponse)
 async def has_address_shared_data(eth_address: str, db: Session = Depends(get_db)) -> bool:
-    res = db.query(MPCSession).filter(MPCSession.eth_address == eth_address).first() is not None
+    res = await run_in_threadpool(db_has_address_shared_data, db, eth_address)
     logger.info(f"has_address_shared_data: {eth_address}; {res}")
     return RequestHasAddressSharedDataResponse(has_shared_data=res)
 
-def add_user_impl(add_user_func, queue_to_str, access_key: str):
+@router.get("/dataset_version", response_model=RequestDatasetVersionResponse)
+async def dataset_version(x: Request, after: Optional[int] = None, timeout: int = 0):
+    """
+    Return the current dataset version. If `after` is given, hold the request until the
+    version differs from it or until `timeout` seconds (capped by `dataset_version_max_wait`) passed.
+    """
+    version = x.app.state.dataset_version
+    if after is None or timeout <= 0:
+        await version.refresh()
+        return RequestDatasetVersionResponse(version=version.version)
+    wait = min(timeout, settings.dataset_version_max_wait)
+    return RequestDatasetVersionResponse(version=await version.wait_for_change(after, wait))
+
+@router.get("/stats", response_model=RequestStatsResponse)
+async def stats(x: Request):
+    """Dataset counters and queue size, with the counters read at most `dataset_version_poll_interval` seconds ago"""
+    dataset_counters = await x.app.state.dataset_version.refresh()
+    return RequestStatsResponse(
+        num_data_providers=dataset_counters.num_data_providers,
+        dataset_version=dataset_counters.num_data_providers,
+        queue_size=x.app.state.user_queue.size(),
+    )
+
+@router.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@router.get("/commitments", response_model=RequestCommitmentsResponse)
+async def commitments(offset: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    Return the public data commitments recorded at `share_data` time, ordered by secret index.
+    """
+    if offset < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="`offset` must be non-negative and `limit` positive")
+    limit = min(limit, settings.commitments_page_max_limit)
+    total, rows = await run_in_threadpool(get_commitments_page, db, offset, limit)
+    return RequestCommitmentsResponse(
+        commitments=[
+            # Sessions recorded before `secret_index` was stored were assigned their id
+            DataCommitment(secret_index=row.secret_index or row.id, data_commitment=row.data_commitment)
+            for row in rows
+        ],
+        total=total,
+    )
+
+# Number of queue endpoint requests by endpoint and result, logged instead of the queue
+queue_request_counts: Counter = Counter()
+# When this worker added each user still waiting for the head, to observe the time to reach it
+queue_add_times: OrderedDict[str, float] = OrderedDict()
+
+def count_queue_request(x: Request, event: str) -> None:
+    """
+    Count the request and, for a `queue_dump_sample_rate` sample of the requests, log the
+    whole queue at debug level, as building the dump walks all the users.
+    """
+    queue_request_counts[event] += 1
+    QUEUE_REQUESTS.inc(event)
+    if random.random() < settings.queue_dump_sample_rate and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Queue requests: %s; queue: %s",
+            dict(queue_request_counts),
+            x.app.state.user_queue._queue_to_str(),
+        )
+
+@router.get("/tlsn_proofs/{secret_index}")
+async def tlsn_proof(secret_index: int, x_api_key: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Stream the TLSN proof shared with `secret_index`, for audits. Requires one of `api_keys`."""
+    if x_api_key not in settings.api_keys:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    mpc_session, entry = await run_in_threadpool(get_proof_entry, db, secret_index)
+    if mpc_session is None:
+        raise HTTPException(status_code=404, detail=f"No data shared with secret index {secret_index}")
+    if entry is None:
+        # Shared before the proof archive and not migrated yet
+        if not Path(mpc_session.tlsn_proof_path).exists():
+            raise HTTPException(status_code=404, detail=f"TLSN proof of secret index {secret_index} not found")
+        return FileResponse(mpc_session.tlsn_proof_path, media_type="application/json")
+    return StreamingResponse(get_proof_archive().iter_proof(entry), media_type="application/json")
+
+@router.post("/tlsn_proofs", response_model=RequestUploadTLSNProofResponse)
+async def upload_tlsn_proof(x: Request, access_key: str, computation_key: str):
+    """
+    Upload a gzip-compressed TLSN proof as the request body, to be referenced by its digest
+    in `/share_data`. Only the user at the head of the queue can upload.
+    """
+    if not x.app.state.user_queue.validate_computation_key(access_key, computation_key):
+        raise HTTPException(status_code=400, detail=f"Invalid computation key {computation_key}")
+    body = await x.body()
+    if len(body) > settings.tlsn_proof_max_size:
+        raise HTTPException(status_code=413, detail=f"TLSN proof larger than {settings.tlsn_proof_max_size} bytes")
+    try:
+        digest = await run_in_threadpool(get_proof_uploads().put, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid TLSN proof: {e}")
+    return RequestUploadTLSNProofResponse(digest=digest)
+
+@router.get("/tlsn_proofs/uploads/{digest}")
+async def get_uploaded_tlsn_proof(digest: str, x_api_key: Optional[str] = Header(None)):
+    """gzip-compressed uploaded TLSN proof, pulled by the parties during `share_data`"""
+    if x_api_key != settings.party_api_key:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    try:
+        compressed = await run_in_threadpool(get_proof_uploads().get_compressed, digest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if compressed is None:
+        raise HTTPException(status_code=404, detail=f"TLSN proof {digest} not found")
+    return Response(content=compressed, media_type="application/gzip")
+
+def add_user_impl(add_user_func, x: Request, access_key: str, endpoint: str):
     result = add_user_func(access_key)
-    logger.info(f"add_user_to_queue: {access_key}; {queue_to_str()}")
+    count_queue_request(x, f"{endpoint}.{result.name}")
     if result == AddResult.ALREADY_IN_QUEUE:
-        logger.info(f"{access_key} not added. Already in the queue")
+        logger.debug("%s not added. Already in the queue", access_key)
         return RequestAddUserToQueueResponse(result=AddResult.ALREADY_IN_QUEUE)
     elif result == AddResult.QUEUE_IS_FULL:
-        logger.warn(f"{access_key} not added. The queue is full")
+        logger.warning("%s not added. The queue is full", access_key)
         return RequestAddUserToQueueResponse(result=AddResult.QUEUE_IS_FULL)
     else:
-        logger.info(f"Added {access_key} to the queue")
-        return RequestAddUserToQueueResponse(result=AddResult.SUCCEEDED)
+        logger.info("Added %s to the queue", access_key)
+        queue_add_times[access_key] = time.monotonic()
+        # Users leaving without polling their position are never popped, keep the oldest out
+        if len(queue_add_times) > settings.user_queue_size:
+            queue_add_times.popitem(last=False)
+        # The session is traced from here on, under the trace of this request
+        return RequestAddUserToQueueResponse(result=AddResult.SUCCEEDED, trace_id=current_trace_id())
 
 @router.post("/add_user_to_queue", response_model=RequestAddUserToQueueResponse)
 async def add_user_to_queue(request: RequestAddUserToQueueRequest, x: Request):
+    check_rate_limit(x, request.access_key)
     return add_user_impl(
         x.app.state.user_queue.add_user,
-        x.app.state.user_queue._queue_to_str,
-        request.access_key
+        x,
+        request.access_key,
+        "add_user_to_queue",
     )
 
 @router.post("/add_priority_user_to_queue", response_model=RequestAddUserToQueueResponse)
 async def add_priority_user_to_queue(request: RequestAddUserToQueueRequest, x: Request):
     return add_user_impl(
         x.app.state.user_queue.add_priority_user,
-        x.app.state.user_queue._queue_to_str,
-        request.access_key
+        x,
+        request.access_key,
+        "add_priority_user_to_queue",
     )
 
 @router.post("/get_position", response_model=RequestGetPositionResponse)
 async def get_position(request: RequestGetPositionRequest, x: Request):
+    check_rate_limit(x, request.access_key)
     position = x.app.state.user_queue.get_position(request.access_key)
     computation_key = x.app.state.user_queue.get_computation_key(request.access_key)
-    logger.info(f"get_position: {request.access_key}; position={position}, computation_key={computation_key}, queue: {x.app.state.user_queue._queue_to_str()}")
+    count_queue_request(x, "get_position")
+    if computation_key is not None:
+        add_time = queue_add_times.pop(request.access_key, None)
+        if add_time is not None:
+            TIME_TO_HEAD_SECONDS.observe(time.monotonic() - add_time)
+    logger.debug("get_position: %s; position=%s", request.access_key, position)
     return RequestGetPositionResponse(position=position, computation_key=computation_key)
 
 @router.post("/validate_computation_key", response_model=RequestValidateComputationKeyResponse)
 async def validate_computation_key(request: RequestValidateComputationKeyRequest, x: Request):
+    check_rate_limit(x, request.access_key)
     is_valid = x.app.state.user_queue.validate_computation_key(request.access_key, request.computation_key)
-    logger.info(f"validate_computation_key: access_key: {request.access_key}, is_valid: {is_valid}, queue: {x.app.state.user_queue._queue_to_str()}")
+    count_queue_request(x, f"validate_computation_key.{'valid' if is_valid else 'invalid'}")
+    logger.debug("validate_computation_key: %s; is_valid=%s", request.access_key, is_valid)
     return RequestValidateComputationKeyResponse(is_valid=is_valid)
 
 @router.post("/finish_computation", response_model=RequestFinishComputationResponse)
 async def finish_computation(request: RequestFinishComputationRequest, x: Request):
-    logger.info("'finish_computation' endpoint called")
     access_key = request.access_key
     computation_key = request.computation_key
     is_finished = x.app.state.user_queue.finish_computation(access_key, computation_key)
-    logger.info(f"Finished computation: {is_finished=}, {access_key=}, {computation_key=}. Current queue: {x.app.state.user_queue._queue_to_str()}")
+    count_queue_request(x, f"finish_computation.{'finished' if is_finished else 'rejected'}")
+    logger.info("Finished computation: is_finished=%s, access_key=%s, queue size=%d", is_finished, access_key, x.app.state.user_queue.size())
     return RequestFinishComputationResponse(is_finished=is_finished)
 
 @router.post("/share_data", response_model=RequestSharingDataResponse)
 async def share_data(request: RequestSharingDataRequest, x: Request, db: Session = Depends(get_db)):
+    sharing_data_lock = x.app.state.sharing_data_lock
     eth_address = request.eth_address
-    tlsn_proof = request.tlsn_proof
     client_id = request.client_id
     client_cert_file = request.client_cert_file
     access_key = request.access_key
@@ -111,160 +266,188 @@ async def share_data(request: RequestSharingDataRequest, x: Request, db: Session
         raise HTTPException(status_code=400, detail=f"Invalid computation key {computation_key}")
     logger.info(f"{eth_address}: Computation key {computation_key} is valid")
 
-    logger.info(f"Verifying registration for voucher code: {eth_address}")
-    if client_id >= MAX_CLIENT_ID:
-        logger.error(f"{eth_address}: Client ID is out of range: {client_id}")
-        raise HTTPException(status_code=400, detail=f"{eth_address}: Client ID is out of range")
-
-    # Verify TLSN proof.
-    with tempfile.NamedTemporaryFile(delete=False) as temp_tlsn_proof_file:
-        #logger.info(f"TLSN proof: {request.tlsn_proof}")
-        logger.info(f"Writing TLSN proof to temporary file: {temp_tlsn_proof_file.name}")
-        # Store TLSN proof in temporary file.
-        temp_tlsn_proof_file.write(request.tlsn_proof.encode('utf-8'))
-
-        # Run TLSN proof verifier
-        binance_verifier_locations = [
-            (Path('.').resolve(), CMD_TLSN_VERIFIER),
-            (TLSN_VERIFIER_BUILD_PATH, TLSN_VERIFIER_BUILD_PATH / CMD_TLSN_VERIFIER),
-            (TLSN_VERIFIER_PATH, CMD_VERIFY_TLSN_PROOF),
-        ]
-        binance_verifier_dir, binance_verifier_exec_cmd = locate_binance_verifier(binance_verifier_locations)
-        verify_cmd = f"{binance_verifier_exec_cmd} {temp_tlsn_proof_file.name}"
-        logger.info(f"Verifying TLSN proof with: {verify_cmd}")
-        process = await asyncio.create_subprocess_shell(
-            verify_cmd,
-            cwd=binance_verifier_dir,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        uid = 0
-        logger.info(f"Getting TLSN proof verification result...")
-        stdout, stderr = await process.communicate()
+    # The parties pull the proof by digest, so an inline proof is stored as if it was uploaded
+    proof_uploads = get_proof_uploads()
+    if (request.tlsn_proof is None) == (request.tlsn_proof_digest is None):
+        raise HTTPException(status_code=400, detail="Exactly one of `tlsn_proof` and `tlsn_proof_digest` must be given")
+    try:
+        if request.tlsn_proof is not None:
+            tlsn_proof = request.tlsn_proof
+            tlsn_proof_digest = await run_in_threadpool(proof_uploads.put_proof, tlsn_proof)
+        else:
+            tlsn_proof_digest = request.tlsn_proof_digest
+            tlsn_proof = await run_in_threadpool(proof_uploads.get_proof, tlsn_proof_digest)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid TLSN proof: {e}")
+    if tlsn_proof is None:
+        raise HTTPException(status_code=400, detail=f"TLSN proof {tlsn_proof_digest} not uploaded")
+
+    # The sharing task removes the upload once the parties pulled it, remove it here if the
+    # request fails before the task is started
+    try:
+        logger.info(f"Verifying registration for voucher code: {eth_address}")
+        if client_id >= MAX_CLIENT_ID:
+            logger.error(f"{eth_address}: Client ID is out of range: {client_id}")
+            raise HTTPException(status_code=400, detail=f"{eth_address}: Client ID is out of range")
+
+        # Verify TLSN proof.
+        with tempfile.NamedTemporaryFile(delete=False) as temp_tlsn_proof_file:
+            #logger.info(f"TLSN proof: {request.tlsn_proof}")
+            logger.info(f"Writing TLSN proof to temporary file: {temp_tlsn_proof_file.name}")
+            # Store TLSN proof in temporary file.
+            temp_tlsn_proof_file.write(tlsn_proof.encode('utf-8'))
+
+            # Run TLSN proof verifier
+            binance_verifier_locations = [
+                (Path('.').resolve(), CMD_TLSN_VERIFIER),
+                (TLSN_VERIFIER_BUILD_PATH, TLSN_VERIFIER_BUILD_PATH / CMD_TLSN_VERIFIER),
+                (TLSN_VERIFIER_PATH, CMD_VERIFY_TLSN_PROOF),
+            ]
+            binance_verifier_dir, binance_verifier_exec_cmd = locate_binance_verifier(binance_verifier_locations)
+            verify_cmd = f"{binance_verifier_exec_cmd} {temp_tlsn_proof_file.name}"
+            logger.info(f"Verifying TLSN proof with: {verify_cmd}")
+            with stage(STAGE_SECONDS, "share_data", "verify"):
+                process = await asyncio.create_subprocess_shell(
+                    verify_cmd,
+                    cwd=binance_verifier_dir,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                uid = 0
+                logger.info(f"Getting TLSN proof verification result...")
+                stdout, stderr = await process.communicate()
+            try:
+                uid = get_uid_from_tlsn_proof_verifier(stdout.decode('utf-8'))
+                logger.info(f"Got UID from TLSN proof verifier: {uid}")
+            except ValueError as e:
+                logger.error(f"Failed to get UID from TLSN proof verifier: {e}, {stdout.decode('utf-8')=}, {stderr.decode('utf-8')=}")
+                raise HTTPException(status_code=400, detail="Failed to get UID from TLSN proof verifier")
+            if process.returncode != 0:
+                logger.error(f"TLSN proof verification failed with return code {process.returncode}, {stdout=}, {stderr=}")
+                raise HTTPException(status_code=400, detail=f"TLSN proof verification failed with return code {process.returncode}, {stdout=}, {stderr=}")
+            logger.info(f"TLSN proof verification passed")
+
+            if settings.prohibit_multiple_contributions:
+                # Check if uid already in db. If so, raise an error.
+                if await run_in_threadpool(has_uid_shared_data, db, uid):
+                    logger.error(f"UID {uid} already in database")
+                    raise HTTPException(status_code=400, detail=f"UID {uid} already shared data")
+
+        # Acquire lock to prevent concurrent sharing data requests
+        logger.info(f"Acquiring lock for sharing data for {eth_address=}")
+        with stage(STAGE_SECONDS, "share_data", "lock_wait"):
+            await sharing_data_lock.acquire()
+
         try:
-            uid = get_uid_from_tlsn_proof_verifier(stdout.decode('utf-8'))
-            logger.info(f"Got UID from TLSN proof verifier: {uid}")
-        except ValueError as e:
-            logger.error(f"Failed to get UID from TLSN proof verifier: {e}, {stdout.decode('utf-8')=}, {stderr.decode('utf-8')=}")
-            raise HTTPException(status_code=400, detail="Failed to get UID from TLSN proof verifier")
-        if process.returncode != 0:
-            logger.error(f"TLSN proof verification failed with return code {process.returncode}, {stdout=}, {stderr=}")
-            raise HTTPException(status_code=400, detail=f"TLSN proof verification failed with return code {process.returncode}, {stdout=}, {stderr=}")
-        logger.info(f"TLSN proof verification passed")
-
-        if settings.prohibit_multiple_contributions:
-            # Check if uid already in db. If so, raise an error.
-            if db.query(MPCSession).filter(MPCSession.uid == uid).first():
-                logger.error(f"UID {uid} already in database")
-                raise HTTPException(status_code=400, detail=f"UID {uid} already shared data")
-
-    # Acquire lock to prevent concurrent sharing data requests
-    logger.info(f"Acquiring lock for sharing data for {eth_address=}")
-    await sharing_data_lock.acquire()
-
-    # Get secret index as number of MPC session
-    num_mpc_sessions = db.query(MPCSession).count()
-    secret_index = num_mpc_sessions + 1
-
-    logger.info(f"Registration verified for voucher code: {eth_address}, {client_id=}")
+            # Read under the lock, since other workers may have added sessions
+            dataset_counters = await run_in_threadpool(get_dataset_counters, db)
+            secret_index = dataset_counters.next_secret_index
 
-    mpc_server_port_base, mpc_client_port_base = get_fixed_mpc_ports()
-    logger.info(f"Acquired lock. Using data sharing MPC ports: {mpc_server_port_base=}, {mpc_client_port_base=}")
+            logger.info(f"Registration verified for voucher code: {eth_address}, {client_id=}")
 
-    try:
-        # l = asyncio.Event()
+            mpc_server_port_base, mpc_client_port_base = get_fixed_mpc_ports()
+            logger.info(f"Acquired lock. Using data sharing MPC ports: {mpc_server_port_base=}, {mpc_client_port_base=}")
 
-        async def request_sharing_data_all_parties():
-            try:
-                logger.info(f"Requesting sharing data MPC for {eth_address=}")
-                async with aiohttp.ClientSession() as session:
-                    tasks = []
-                    for party_host, party_port in zip(settings.party_hosts, settings.party_ports):
-                        url = f"{settings.party_web_protocol}://{party_host}:{party_port}/request_sharing_data_mpc"
-                        logger.info(f"Sending: {url}")
-                        headers = {"X-API-Key": settings.party_api_key}
-                        task = session.post(url, json={
-                            "tlsn_proof": tlsn_proof,
-                            "mpc_port_base": mpc_server_port_base,
-                            "secret_index": secret_index,
-                            "client_id": client_id,
-                            "client_port_base": mpc_client_port_base,
-                            "client_cert_file": client_cert_file,
-                        }, headers=headers)
-                        tasks.append(task)
-                    # l.set()
-
-                    # Send all requests concurrently
-                    logger.info(f"Concurrently sent sharing data request to all parties")
-                    responses = await asyncio.gather(*tasks)
-                    logger.info(f"Received responses for sharing data MPC for {eth_address=}")
-                    # Check if all responses are successful
-                    for party_id, response in enumerate(responses):
-                        if response.status != 200:
-                            logger.error(f"Failed to request sharing data MPC from party {party_id}: {response.status}")
-                            raise HTTPException(status_code=500, detail=f"Failed to request sharing data MPC from {party_id}. Details: {await response.text()}")
-                    # Check if all data commitments are the same
-                    data_commitments = [(await response.json())["data_commitment"] for response in responses]
-                logger.info(f"All responses for sharing data MPC for {eth_address=} are successful. data_commitments={data_commitments}")
-                if len(set(data_commitments)) != 1:
-                    logger.error(f"Data commitments mismatch for {eth_address=}. Something is wrong with MPC. {data_commitments=}")
-                    raise HTTPException(status_code=400, detail="Data commitments mismatch")
-                logger.info(f"Data commitments for {eth_address=} are the same: {data_commitments=}")
-                # Check if data commitment hash from TLSN proof and MPC matches
-                tlsn_data_commitment_hash = get_data_commitment_hash_from_tlsn_proof(tlsn_proof)
-                logger.info(f"tlsn_data_commitment_hash={tlsn_data_commitment_hash}, data_commitments[0]={data_commitments[0]}")
-                # FIXME:
-                # if tlsn_data_commitment_hash != data_commitments[0]:
-                #     logger.error(f"Data commitment hash mismatch for {eth_address=}. Something is wrong with TLSN proof. {tlsn_data_commitment_hash=} != {data_commitments[0]=}")
-                #     raise HTTPException(status_code=400, detail="Data commitment hash mismatch")
-                logger.info(f"Data commitment hash from TLSN proof and MPC matches for {eth_address=}")
-
-                # Proof is valid, copy to tlsn_proofs_dir, and delete the temp file.
-                tlsn_proofs_dir = Path(settings.tlsn_proofs_dir)
-                tlsn_proofs_dir.mkdir(parents=True, exist_ok=True)
-                tlsn_proof_path = tlsn_proofs_dir / f"proof_{secret_index}.json"
-                tlsn_proof_path.write_text(request.tlsn_proof)
+            preprocessing_batch_id = await take_preprocessing_batch("share_data")
+
+            # l = asyncio.Event()
+
+            async def request_sharing_data_all_parties():
                 try:
-                    temp_tlsn_proof_file.close()
-                except IOError as e:
-                    logger.warn(f"Failed to close temporary TLSN proof file: {e}")
-                Path(temp_tlsn_proof_file.name).unlink(missing_ok=True)
-                logger.info(f"TLSN proof saved to {tlsn_proof_path}")
-                # Mark the voucher as used. A new db session is used to avoid using
-                # `db`, which is possibly closed after we return.
-                with SessionLocal() as db_session:
-                    # Add MPC session to database
-                    mpc_session = MPCSession(
+                    logger.info(f"Requesting sharing data MPC for {eth_address=}")
+                    async with aiohttp.ClientSession() as session:
+                        tasks = []
+                        for party_host, party_port in zip(settings.party_hosts, settings.party_ports):
+                            url = f"{settings.party_web_protocol}://{party_host}:{party_port}/request_sharing_data_mpc"
+                            logger.info(f"Sending: {url}")
+                            headers = {"X-API-Key": settings.party_api_key, **trace_headers()}
+                            task = session.post(url, json={
+                                "tlsn_proof_digest": tlsn_proof_digest,
+                                "mpc_port_base": mpc_server_port_base,
+                                "secret_index": secret_index,
+                                "client_id": client_id,
+                                "client_port_base": mpc_client_port_base,
+                                "client_cert_file": client_cert_file,
+                                "preprocessing_batch_id": preprocessing_batch_id,
+                            }, headers=headers)
+                            tasks.append(task)
+                        # l.set()
+
+                        # Send all requests concurrently
+                        logger.info(f"Concurrently sent sharing data request to all parties")
+                        with stage(STAGE_SECONDS, "share_data", "parties_mpc"):
+                            responses = await asyncio.gather(*tasks)
+                        logger.info(f"Received responses for sharing data MPC for {eth_address=}")
+                        # Check if all responses are successful
+                        for party_id, response in enumerate(responses):
+                            if response.status != 200:
+                                logger.error(f"Failed to request sharing data MPC from party {party_id}: {response.status}")
+                                raise HTTPException(status_code=500, detail=f"Failed to request sharing data MPC from {party_id}. Details: {await response.text()}")
+                        # Check if all data commitments are the same
+                        data_commitments = [(await response.json())["data_commitment"] for response in responses]
+                    logger.info(f"All responses for sharing data MPC for {eth_address=} are successful. data_commitments={data_commitments}")
+                    if len(set(data_commitments)) != 1:
+                        logger.error(f"Data commitments mismatch for {eth_address=}. Something is wrong with MPC. {data_commitments=}")
+                        raise HTTPException(status_code=400, detail="Data commitments mismatch")
+                    logger.info(f"Data commitments for {eth_address=} are the same: {data_commitments=}")
+                    # Check if data commitment hash from TLSN proof and MPC matches
+                    tlsn_data_commitment_hash = parse_tlsn_proof(tlsn_proof).data_commitment_hash
+                    logger.info(f"tlsn_data_commitment_hash={tlsn_data_commitment_hash}, data_commitments[0]={data_commitments[0]}")
+                    # FIXME:
+                    # if tlsn_data_commitment_hash != data_commitments[0]:
+                    #     logger.error(f"Data commitment hash mismatch for {eth_address=}. Something is wrong with TLSN proof. {tlsn_data_commitment_hash=} != {data_commitments[0]=}")
+                    #     raise HTTPException(status_code=400, detail="Data commitment hash mismatch")
+                    logger.info(f"Data commitment hash from TLSN proof and MPC matches for {eth_address=}")
+
+                    # Proof is valid, add it to the proof archive, and delete the temp file.
+                    with stage(STAGE_SECONDS, "share_data", "archive"):
+                        archived_proof_digest = await run_in_threadpool(archive_proof, tlsn_proof)
+                    try:
+                        temp_tlsn_proof_file.close()
+                    except IOError as e:
+                        logger.warn(f"Failed to close temporary TLSN proof file: {e}")
+                    Path(temp_tlsn_proof_file.name).unlink(missing_ok=True)
+                    logger.info(f"TLSN proof archived with digest {archived_proof_digest}")
+                    # Mark the voucher as used
+                    dataset_counters = await run_in_threadpool(add_mpc_session, MPCSession(
                         eth_address=eth_address,
                         uid=uid,
-                        tlsn_proof_path=str(tlsn_proof_path),
-                    )
-                    db_session.add(mpc_session)
-                    db_session.commit()
+                        tlsn_proof_path=str(get_proof_archive().pack_path),
+                        tlsn_proof_digest=archived_proof_digest,
+                        secret_index=secret_index,
+                        data_commitment=data_commitments[0],
+                    ))
                     logger.info(f"Committed changes to database for {eth_address=}")
-            finally:
-                sharing_data_lock.release()
-                logger.info(f"Released lock for sharing data for {eth_address=}")
-
-        logger.info(f"Creating task for sharing data MPC for {eth_address=}")
-        share_data_task = asyncio.create_task(request_sharing_data_all_parties())
-        #await asyncio.gather(share_data_task)
-        logger.info(f"Waiting for sharing data MPC for {eth_address=}")
-        # Wait until `gather` called, with a timeout
-        # try:
-        #     await asyncio.wait_for(l.wait(), timeout=CLIENT_TIMEOUT)
-        # except asyncio.TimeoutError as e:
-        #     logger.error(f"Timeout waiting for sharing data MPC for {eth_address=}, {CLIENT_TIMEOUT=}")
-        #     raise e
-        # Change the return statement
-        return RequestSharingDataResponse(
-            client_port_base=mpc_client_port_base
-        )
-    except Exception as e:
-        logger.error(f"Failed to share data: {str(e)}")
-        sharing_data_lock.release()
-        logger.info(f"Released lock for sharing data for {eth_address=} after getting exception")
-        raise HTTPException(status_code=400, detail="Failed to share data")
+                    # Notify data consumers waiting on the dataset version
+                    await x.app.state.dataset_version.bump(dataset_counters)
+                finally:
+                    # All parties responded, so they already pulled the proof
+                    proof_uploads.remove(tlsn_proof_digest)
+                    await sharing_data_lock.release()
+                    logger.info(f"Released lock for sharing data for {eth_address=}")
+
+            logger.info(f"Creating task for sharing data MPC for {eth_address=}")
+            share_data_task = asyncio.create_task(request_sharing_data_all_parties())
+            #await asyncio.gather(share_data_task)
+            logger.info(f"Waiting for sharing data MPC for {eth_address=}")
+            # Wait until `gather` called, with a timeout
+            # try:
+            #     await asyncio.wait_for(l.wait(), timeout=CLIENT_TIMEOUT)
+            # except asyncio.TimeoutError as e:
+            #     logger.error(f"Timeout waiting for sharing data MPC for {eth_address=}, {CLIENT_TIMEOUT=}")
+            #     raise e
+            # Change the return statement
+            return RequestSharingDataResponse(
+                client_port_base=mpc_client_port_base
+            )
+        except Exception as e:
+            logger.error(f"Failed to share data: {str(e)}")
+            await sharing_data_lock.release()
+            logger.info(f"Released lock for sharing data for {eth_address=} after getting exception")
+            raise HTTPException(status_code=400, detail="Failed to share data")
+    except BaseException:
+        proof_uploads.remove(tlsn_proof_digest)
+        raise
 
 @router.post("/query_computation", response_model=RequestQueryComputationResponse)
 async def query_computation(request: RequestQueryComputationRequest, x: Request, db: Session = Depends(get_db)):
@@ -272,6 +455,7 @@ async def query_computation(request: RequestQueryComputationRequest, x: Request,
     client_cert_file = request.client_cert_file
     access_key = request.access_key
     computation_key = request.computation_key
+    query = request.query
 
     # Check if computation key is valid
     if not x.app.state.user_queue.validate_computation_key(access_key, computation_key):
@@ -288,11 +472,14 @@ async def query_computation(request: RequestQueryComputationRequest, x: Request,
     mpc_server_port_base, mpc_client_port_base = get_fixed_mpc_ports()
     logger.info(f"Using computation query MPC ports: {mpc_server_port_base=}, {mpc_client_port_base=}")
 
-    num_data_providers = db.query(MPCSession).count()
+    dataset_counters = await run_in_threadpool(get_dataset_counters, db)
+    num_data_providers = dataset_counters.num_data_providers
     if num_data_providers == 0:
         logger.error(f"No MPC session found for {client_id=}")
         raise HTTPException(status_code=400, detail="No MPC session found")
 
+    preprocessing_batch_id = await take_preprocessing_batch("query_computation")
+
     # l = asyncio.Event()
 
     async def request_querying_computation_all_parties():
@@ -301,25 +488,32 @@ async def query_computation(request: RequestQueryComputationRequest, x: Request,
             tasks = []
             for party_host, party_port in zip(settings.party_hosts, settings.party_ports):
                 url = f"{settings.party_web_protocol}://{party_host}:{party_port}/request_querying_computation_mpc"
-                headers = {"X-API-Key": settings.party_api_key}
+                headers = {"X-API-Key": settings.party_api_key, **trace_headers()}
                 task = session.post(url, json={
                     "num_data_providers": num_data_providers,
                     "mpc_port_base": mpc_server_port_base,
                     "client_id": client_id,
                     "client_port_base": mpc_client_port_base,
                     "client_cert_file": client_cert_file,
+                    "query": query.dict(),
+                    "preprocessing_batch_id": preprocessing_batch_id,
                 }, headers=headers)
                 tasks.append(task)
             # l.set()
             logger.info(f"Sending all requests concurrently")
-            # Send all requests concurrently
-            responses = await asyncio.gather(*tasks)
-        # Check if all responses are successful
-        logger.info(f"Received responses for querying computation MPC for {client_id=}")
-        for party_id, response in enumerate(responses):
-            if response.status != 200:
-                logger.error(f"Failed to request querying computation MPC from {party_id}: {response.status}")
-                raise HTTPException(status_code=500, detail=f"Failed to request querying computation MPC from {party_id}. Details: {await response.text()}")
+            try:
+                # Send all requests concurrently
+                with stage(STAGE_SECONDS, "query_computation", "parties_mpc"):
+                    responses = await asyncio.gather(*tasks)
+                # Check if all responses are successful
+                logger.info(f"Received responses for querying computation MPC for {client_id=}")
+                for party_id, response in enumerate(responses):
+                    if response.status != 200:
+                        logger.error(f"Failed to request querying computation MPC from {party_id}: {response.status}")
+                        raise HTTPException(status_code=500, detail=f"Failed to request querying computation MPC from {party_id}. Details: {await response.text()}")
+            except Exception:
+                await reset_warm_vms_all_parties(session)
+                raise
         logger.info(f"All responses for querying computation MPC for {client_id=} are successful")
 
     logger.info(f"Creating task for querying computation MPC for {client_id=}")
@@ -338,6 +532,24 @@ async def query_computation(request: RequestQueryComputationRequest, x: Request,
     )
 
 
+async def reset_warm_vms_all_parties(session: aiohttp.ClientSession):
+    """
+    Stop the warm query VMs of all parties after a failed query. The party whose VM failed
+    already stopped it, the others would keep holding the MPC ports waiting for it.
+    """
+    async def reset(party_host: str, party_port: int):
+        url = f"{settings.party_web_protocol}://{party_host}:{party_port}/reset_warm_vm"
+        try:
+            async with session.post(url, headers={"X-API-Key": settings.party_api_key}) as response:
+                if response.status != 200:
+                    logger.error(f"Failed to reset the warm VM of {url}: {response.status} {await response.text()}")
+        except aiohttp.ClientError as e:
+            logger.error(f"Failed to reset the warm VM of {url}: {e}")
+    await asyncio.gather(*[
+        reset(party_host, party_port) for party_host, party_port in zip(settings.party_hosts, settings.party_ports)
+    ])
+
+
 def get_uid_from_tlsn_proof_verifier(stdout_from_tlsn_proof_verifier: str) -> int:
     logger.info(f"Verifier returned: {stdout_from_tlsn_proof_verifier}")
     uid_match = re.search(r'"uid":(\d+)[,}]', stdout_from_tlsn_proof_verifier)
@@ -351,17 +563,6 @@ def get_uid_from_tlsn_proof_verifier(stdout_from_tlsn_proof_verifier: str) -> in
     return int(uid)
 
 
-def get_data_commitment_hash_from_tlsn_proof(tlsn_proof: str) -> str:
-    proof_data = json.loads(tlsn_proof)
-    private_openings = proof_data["substrings"]["private_openings"]
-    if len(private_openings) != 1:
-        raise ValueError(f"Expected 1 private opening, got {len(private_openings)}")
-    _, openings = list(private_openings.items())[0]
-    commitment = openings[1]
-    data_commitment_hash = bytes(commitment["hash"]).hex()
-    return data_commitment_hash
-
-
 # Ports allocation:
 # if num_parties = 3, free_ports_start = 8010, free_ports_end = 8100
 # free_ports = [8010, 8011, 8012, ..., 8100]
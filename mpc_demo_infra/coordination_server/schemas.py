@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from typing import Optional
 from .user_queue import AddResult
+from ..query_descriptor import QueryDescriptor, DEFAULT_QUERY
 
 
 class RequestHasAddressSharedDataRequest(BaseModel):
@@ -11,7 +12,9 @@ class RequestHasAddressSharedDataResponse(BaseModel):
 
 class RequestSharingDataRequest(BaseModel):
     eth_address: str
-    tlsn_proof: str
+    # Either the proof, or the digest returned by `/tlsn_proofs` after uploading it
+    tlsn_proof: Optional[str] = None
+    tlsn_proof_digest: Optional[str] = None
     client_id: int
     client_cert_file: str
     access_key: str
@@ -20,11 +23,15 @@ class RequestSharingDataRequest(BaseModel):
 class RequestSharingDataResponse(BaseModel):
     client_port_base: int
 
+class RequestUploadTLSNProofResponse(BaseModel):
+    digest: str
+
 class RequestQueryComputationRequest(BaseModel):
     client_id: int
     client_cert_file: str
     access_key: str
     computation_key: str
+    query: QueryDescriptor = DEFAULT_QUERY
 
 class RequestQueryComputationResponse(BaseModel):
     client_port_base: int
@@ -34,6 +41,8 @@ class RequestAddUserToQueueRequest(BaseModel):
 
 class RequestAddUserToQueueResponse(BaseModel):
     result: AddResult
+    # Trace of the session, to be continued by the client's requests
+    trace_id: Optional[str] = None
 
 class RequestGetPositionRequest(BaseModel):
     access_key: str
@@ -55,3 +64,19 @@ class RequestFinishComputationRequest(BaseModel):
 
 class RequestFinishComputationResponse(BaseModel):
     is_finished: bool
+
+class RequestDatasetVersionResponse(BaseModel):
+    version: int
+
+class RequestStatsResponse(BaseModel):
+    num_data_providers: int
+    dataset_version: int
+    queue_size: int
+
+class DataCommitment(BaseModel):
+    secret_index: int
+    data_commitment: Optional[str]
+
+class RequestCommitmentsResponse(BaseModel):
+    commitments: list[DataCommitment]
+    total: int
@@ -0,0 +1,164 @@
+import secrets
+import sqlite3
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from .user_queue import UserQueueBase, AddResult
+
+logger = logging.getLogger(__name__)
+
+# Sort key of the queue head, below any other user
+HEAD_SORT_KEY = -(2 ** 62)
+
+
+class SqliteUserQueue(UserQueueBase):
+    """
+    Queue stored in a SQLite database in WAL mode, shared by all the coordination server
+    workers on a host. Users are ordered by a single `sort_key`:
+    - the head has `HEAD_SORT_KEY`
+    - priority users have `-seq`, so the latest one comes right after the head
+    - other users have `seq`, so they come in order of arrival
+    where `seq` increases with every added user.
+    """
+    def __init__(self, db_path: str, max_size: int, queue_head_timeout: int, busy_timeout_ms: int = 5000):
+        self.max_size = max_size
+        self.queue_head_timeout = queue_head_timeout
+        # Autocommit mode, transactions are started explicitly with `BEGIN IMMEDIATE`
+        self.conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS queue_users (
+                access_key TEXT PRIMARY KEY,
+                sort_key INTEGER NOT NULL,
+                computation_key TEXT,
+                time_at_queue_head INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS queue_users_sort_key ON queue_users (sort_key);
+            CREATE TABLE IF NOT EXISTS queue_seq (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                seq INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO queue_seq (id, seq) VALUES (0, 0);
+        """)
+        # The connection is shared by the threads of this process
+        self.thread_lock = threading.Lock()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction, serialized with the other processes sharing the database"""
+        with self.thread_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+
+    def _next_seq(self, conn: sqlite3.Connection) -> int:
+        conn.execute("UPDATE queue_seq SET seq = seq + 1 WHERE id = 0")
+        return conn.execute("SELECT seq FROM queue_seq WHERE id = 0").fetchone()[0]
+
+    def _set_queue_head_data_if_needed(self, conn: sqlite3.Connection) -> None:
+        head = conn.execute(
+            "SELECT access_key, time_at_queue_head FROM queue_users ORDER BY sort_key LIMIT 1"
+        ).fetchone()
+        if head is None or head[1] is not None:
+            return
+        conn.execute(
+            "UPDATE queue_users SET sort_key = ?, computation_key = ?, time_at_queue_head = ? WHERE access_key = ?",
+            (HEAD_SORT_KEY, secrets.token_urlsafe(16), int(time.time()), head[0]),
+        )
+
+    def _timeout_head_user(self) -> None:
+        with self._transaction() as conn:
+            head = conn.execute(
+                "SELECT access_key, time_at_queue_head FROM queue_users WHERE sort_key = ?", (HEAD_SORT_KEY,)
+            ).fetchone()
+            if head is None or int(time.time()) - head[1] <= self.queue_head_timeout:
+                return
+            conn.execute("DELETE FROM queue_users WHERE access_key = ?", (head[0],))
+            self._set_queue_head_data_if_needed(conn)
+
+    def _add(self, access_key: str, is_priority: bool) -> AddResult:
+        with self._transaction() as conn:
+            if self._size(conn) >= self.max_size:
+                return AddResult.QUEUE_IS_FULL
+            if conn.execute("SELECT 1 FROM queue_users WHERE access_key = ?", (access_key,)).fetchone() is not None:
+                return AddResult.ALREADY_IN_QUEUE
+            seq = self._next_seq(conn)
+            conn.execute(
+                "INSERT INTO queue_users (access_key, sort_key) VALUES (?, ?)",
+                (access_key, -seq if is_priority else seq),
+            )
+            self._set_queue_head_data_if_needed(conn)
+        return AddResult.SUCCEEDED
+
+    def add_user(self, access_key: str) -> AddResult:
+        return self._add(access_key, is_priority=False)
+
+    def add_priority_user(self, access_key: str) -> AddResult:
+        return self._add(access_key, is_priority=True)
+
+    def get_position(self, access_key: str) -> Optional[int]:
+        with self.thread_lock:
+            row = self.conn.execute(
+                "SELECT (SELECT COUNT(*) FROM queue_users WHERE sort_key < u.sort_key) FROM queue_users u WHERE access_key = ?",
+                (access_key,),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def _get_head(self) -> Optional[tuple[str, str]]:
+        with self.thread_lock:
+            return self.conn.execute(
+                "SELECT access_key, computation_key FROM queue_users WHERE sort_key = ?", (HEAD_SORT_KEY,)
+            ).fetchone()
+
+    def get_computation_key(self, access_key: str) -> Optional[str]:
+        self._timeout_head_user()
+        head = self._get_head()
+        if head is not None and head[0] == access_key:
+            return head[1]
+        return None
+
+    def validate_computation_key(self, access_key: str, computation_key: str) -> bool:
+        self._timeout_head_user()
+        head = self._get_head()
+        return head is not None and head[0] == access_key and head[1] == computation_key
+
+    def finish_computation(self, access_key: str, computation_key: str) -> bool:
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM queue_users WHERE access_key = ? AND computation_key = ? AND sort_key = ?",
+                (access_key, computation_key, HEAD_SORT_KEY),
+            ).rowcount
+            if deleted == 0:
+                logger.info(f"User '{access_key}' is not at the head of the queue with computation key {computation_key}")
+                return False
+            self._set_queue_head_data_if_needed(conn)
+        return True
+
+    def _size(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM queue_users").fetchone()[0]
+
+    def size(self) -> int:
+        with self.thread_lock:
+            return self._size(self.conn)
+
+    def head_wait_time(self) -> Optional[float]:
+        with self.thread_lock:
+            row = self.conn.execute(
+                "SELECT time_at_queue_head FROM queue_users WHERE sort_key = ?", (HEAD_SORT_KEY,)
+            ).fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def _queue_to_str(self) -> str:
+        with self.thread_lock:
+            rows = self.conn.execute("SELECT access_key FROM queue_users ORDER BY sort_key").fetchall()
+        return ', '.join(row[0] for row in rows)
@@ -1,10 +1,13 @@
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from enum import Enum
 from readerwriterlock import rwlock
 import secrets
 import time
 import logging
-from typing import Optional, Self, Tuple
+from typing import Iterator, Optional, Self, Tuple
+
+from .queue_journal import QueueJournal
 
 logger = logging.getLogger(__name__)
 
@@ -20,8 +23,56 @@ class AddResult(Enum):
     ALREADY_IN_QUEUE = 1
     QUEUE_IS_FULL = 2
 
-class UserQueue:
-    def __init__(self, max_size: int, queue_head_timeout: int):
+class UserQueueBase(ABC):
+    """
+    Queue of the users waiting for their turn to run an MPC. The user at the head gets a
+    computation key, and is removed when finishing the computation or after `queue_head_timeout` seconds.
+    A priority user is inserted right after the head.
+    """
+    @abstractmethod
+    def add_user(self, access_key: str) -> AddResult:
+        pass
+
+    @abstractmethod
+    def add_priority_user(self, access_key: str) -> AddResult:
+        pass
+
+    @abstractmethod
+    def get_position(self, access_key: str) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    def get_computation_key(self, access_key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def validate_computation_key(self, access_key: str, computation_key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def finish_computation(self, access_key: str, computation_key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+    @abstractmethod
+    def head_wait_time(self) -> Optional[float]:
+        """Seconds the user at the head has held the computation key, None if the queue is empty"""
+        pass
+
+    @abstractmethod
+    def _queue_to_str(self) -> str:
+        pass
+
+
+class UserQueue(UserQueueBase):
+    """
+    In-memory queue, only usable by a single coordination server process.
+    If a journal is given, the queue is restored from it and its changes are appended to it.
+    """
+    def __init__(self, max_size: int, queue_head_timeout: int, journal: Optional[QueueJournal] = None):
         self.users_head: User = None
         self.users_tail: User = None
         self.users_len: int = 0
@@ -29,16 +80,76 @@ class UserQueue:
         self.queue_head_timeout = queue_head_timeout
         self.user_positions = {}
         self.locker = rwlock.RWLockWrite()
+        self.journal = None
+        if journal is not None:
+            self._recover(journal)
+
+    def size(self) -> int:
+        return self.users_len
+
+    def head_wait_time(self) -> Optional[float]:
+        head = self.users_head
+        if head is None or head._time_at_queue_head is None:
+            return None
+        return time.time() - head._time_at_queue_head
+
+    def _iter_users(self) -> Iterator[User]:
+        user = self.users_head
+        while user is not None:
+            yield user
+            user = user.next
 
     def _queue_to_str(self) -> str:
         with self.locker.gen_rlock():
-            users = []
-            user = self.users_head
-            while user is not None:
-                users.append(user.access_key)
-                user = user.next
-            return ', '.join(users)
-    
+            return ', '.join(user.access_key for user in self._iter_users())
+
+    def _head_event(self) -> dict:
+        return {
+            "op": "head",
+            "access_key": self.users_head.access_key,
+            "computation_key": self.users_head.computation_key,
+            "time_at_queue_head": self.users_head._time_at_queue_head,
+        }
+
+    def _snapshot_events(self) -> Iterator[dict]:
+        for user in self._iter_users():
+            yield {"op": "add", "access_key": user.access_key}
+        if self.users_head is not None and self.users_head._time_at_queue_head is not None:
+            yield self._head_event()
+
+    def _journal(self, event: dict) -> None:
+        if self.journal is None:
+            return
+        self.journal.append(event)
+        if self.journal.needs_compaction():
+            self.journal.compact(self._snapshot_events())
+
+    def _recover(self, journal: QueueJournal) -> None:
+        start = time.perf_counter()
+        num_events = 0
+        for event in journal.read_events():
+            num_events += 1
+            op = event.get("op")
+            if op == "add":
+                self._add_user(User(access_key=event["access_key"]))
+            elif op == "add_priority":
+                self._add_priority_user(User(access_key=event["access_key"]))
+            elif op == "pop":
+                self._pop_user()
+            elif op == "head":
+                head = self.users_head
+                if head is not None and head.access_key == event["access_key"]:
+                    head.computation_key = event["computation_key"]
+                    head._time_at_queue_head = event["time_at_queue_head"]
+            else:
+                logger.warning(f"Ignoring unknown queue journal event: {event}")
+        self._build_position_map()
+        journal.compact(self._snapshot_events())
+        self.journal = journal
+        # The head deadline is kept, so a head whose deadline passed during the restart times out as usual
+        self._set_queue_head_data_if_needed()
+        logger.info(f"Recovered {self.users_len} users from {num_events} queue journal events in {time.perf_counter() - start:.3f}s")
+
     def _add_user(self, user: User) -> None:
         if self.users_head == None:
             self.users_head = user
@@ -49,6 +160,7 @@ class UserQueue:
             user.next = None
             self.users_tail = user
         self.users_len += 1
+        self._journal({"op": "add", "access_key": user.access_key})
 
     def _add_priority_user(self, user: User) -> None:
         if self.users_head == None:
@@ -64,6 +176,7 @@ class UserQueue:
             if prev_user_next == None:
                 self.users_tail = user
         self.users_len += 1
+        self._journal({"op": "add_priority", "access_key": user.access_key})
 
     def _pop_user(self) -> User:
         if self.users_head == None:
@@ -73,6 +186,7 @@ class UserQueue:
             self.users_head = user.next
             user.next = None
             self.users_len -= 1
+            self._journal({"op": "pop"})
             return user
 
     def _get_time() -> int:
@@ -83,6 +197,7 @@ class UserQueue:
             user = self.users_head
             user._time_at_queue_head = int(time.time())
             user.computation_key = secrets.token_urlsafe(16)
+            self._journal(self._head_event())
 
     def _build_position_map(self) -> None:
         user = self.users_head
@@ -169,24 +284,22 @@ class UserQueue:
         self._timeout_head_user()
         with self.locker.gen_rlock():
             position, user = self.user_positions.get(access_key, (None, None))
-            print(f"{position=}, {user=}, {access_key=}, {computation_key=}, user_positions={self.user_positions}")
             return position is not None and position == 0 and user.computation_key == computation_key
 
     def finish_computation(self, access_key: str, computation_key: str) -> bool:
-        logger.info(f"Finishing computation: {access_key=}, {computation_key=}, Current queue: {self._queue_to_str()}") 
         with self.locker.gen_wlock():
             position, user = self.user_positions.get(access_key, (None, None))
             if user is None:
-                logger.info(f"User '{access_key}' is no longer in the queue")
+                logger.info("User '%s' is no longer in the queue", access_key)
                 return False
 
-            logger.info(f"Current position of the user '{user}' is {position}")
-            logger.info(f"Current position of the user '{user}' is {position}")
+            # Log the access key only, `user` links to all the users after it
+            logger.debug("Finishing computation of user '%s' at position %s", access_key, position)
             if position is not None and position == 0 and user.computation_key == computation_key:
                 user = self._pop_user()
                 self._set_queue_head_data_if_needed()
                 self._build_position_map()
-                logger.info(f"Popped {user}")
+                logger.info("Popped user '%s'", user.access_key)
                 return True
             else:
                 return False
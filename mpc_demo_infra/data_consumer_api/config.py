@@ -20,8 +20,21 @@ class Settings(BaseSettings):
 
     poll_duration: int = 10
 
-    # cache expires every 10 minutes
-    cache_ttl_seconds: int = Field(default=600, description="Cache TTL in seconds for computation results")
+    # The cache is only refreshed when the coordination server reports a new dataset version.
+    # Each long-poll for a version change is held for at most this many seconds.
+    dataset_version_wait_timeout: int = Field(default=60, description="Long-poll timeout in seconds when waiting for a new dataset version")
+    # Requests arriving before the cache is warm wait for the in-flight refresh at most this long,
+    # then get a 503 with `Retry-After: cache_miss_retry_after`.
+    cache_miss_wait_timeout: float = Field(default=30, description="Max seconds a request waits for the in-flight cache refresh")
+    cache_miss_retry_after: int = Field(default=10, description="Retry-After in seconds sent when the cache refresh takes too long")
+
+    # Responses of at least this many bytes are gzip-compressed for clients accepting it
+    compression_minimum_size: int = 1024
+    # Max bytes of a request body once decompressed
+    max_request_size: int = 16 * 1024 * 1024
+
+    # File the spans of the sessions are appended to in OTLP/JSON. Tracing isn't exported if empty
+    tracing_path: str = ""
 
     # logging
     max_bytes_mb = 20
@@ -7,6 +7,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from .routes import router
 from .config import settings
 from .limiter import limiter
+from ..compression import CompressionMiddleware
+from ..tracing import TracingMiddleware, configure_tracing
 from ..logger_config import configure_file_console_loggers
 
 configure_file_console_loggers(
@@ -14,6 +16,7 @@ configure_file_console_loggers(
     max_bytes_mb=settings.max_bytes_mb,
     backup_count=settings.backup_count
 )
+configure_tracing('consumer', settings.tracing_path)
 logger = logging.getLogger(__name__)
 
 # Get project root
@@ -40,12 +43,19 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 app.add_middleware(SlowAPIMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    max_request_size=settings.max_request_size,
+)
+app.add_middleware(TracingMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Age", "X-Dataset-Version", "X-Cache-Status"],
 )
 
 # Include API routes
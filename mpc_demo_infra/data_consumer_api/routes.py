@@ -1,12 +1,14 @@
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel, Field
 import logging
 from datetime import datetime
 import asyncio
 from fastapi.applications import FastAPI
+from typing import Optional
 
 from ..client_lib import lib as client_lib
+from ..metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, counter, gauge, histogram, render_metrics
 from .config import settings
 
 
@@ -21,26 +23,47 @@ router = APIRouter()
 
 logger = logging.getLogger(__name__)
 
+# Status of the cache when serving a request: fresh, stale, miss (waited for a refresh) or unavailable (503)
+CACHE_REQUESTS = counter("consumer_cache_requests_total", "Query computation requests by cache status", ("status",))
+CACHE_HIT_RATIO = gauge("consumer_cache_hit_ratio", "Ratio of the query computation requests served without waiting for a refresh")
+CACHE_REFRESH_SECONDS = histogram("consumer_cache_refresh_seconds", "Seconds to refresh the cache with a query computation MPC")
+
+def _cache_hit_ratio() -> Optional[float]:
+    hits = CACHE_REQUESTS.value("fresh") + CACHE_REQUESTS.value("stale")
+    total = hits + CACHE_REQUESTS.value("miss") + CACHE_REQUESTS.value("unavailable")
+    return hits / total if total > 0 else None
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratio)
+
 # Add these at module level
 _computation_cache = None
 _last_cache_update = None
+# Dataset version the cached results were computed on
+_cached_dataset_version = None
+# Latest dataset version reported by the coordination server
+_latest_dataset_version = None
 _background_task = None
 _background_task_started = False
+# The cache refresh currently in flight, shared by all callers (single-flight)
+_refresh_task = None
 
 async def update_cache():
-    global _computation_cache, _last_cache_update
-    logger.info(f"Updating cache at {_last_cache_update}")
-    results = await client_lib.query_computation_from_data_consumer_api(
-        all_certs_path=Path(settings.certs_path),
-        coordination_server_url=settings.coordination_server_url,
-        computation_party_hosts=settings.party_hosts,
-        poll_duration=settings.poll_duration,
-        party_web_protocol=settings.party_web_protocol,
-        certs_path=Path(settings.certs_path),
-        party_hosts=settings.party_hosts,
-        party_ports=settings.party_ports,
-        max_client_wait=settings.max_client_wait,
-    )
+    global _computation_cache, _last_cache_update, _cached_dataset_version, _latest_dataset_version
+    # Read the version before querying so that shares committed during the MPC trigger another refresh
+    dataset_version = await client_lib.get_dataset_version(settings.coordination_server_url)
+    logger.info(f"Updating cache for dataset version {dataset_version}, last updated at {_last_cache_update}")
+    with CACHE_REFRESH_SECONDS.time():
+        results = await client_lib.query_computation_from_data_consumer_api(
+            all_certs_path=Path(settings.certs_path),
+            coordination_server_url=settings.coordination_server_url,
+            computation_party_hosts=settings.party_hosts,
+            poll_duration=settings.poll_duration,
+            party_web_protocol=settings.party_web_protocol,
+            certs_path=Path(settings.certs_path),
+            party_hosts=settings.party_hosts,
+            party_ports=settings.party_ports,
+            max_client_wait=settings.max_client_wait,
+        )
     _computation_cache = QueryComputationResponse(
         num_data_providers=results.num_data_providers,
         max=results.max,
@@ -49,53 +72,95 @@ async def update_cache():
         gini_coefficient=results.gini_coefficient,
     )
     _last_cache_update = datetime.now()
-    logger.info(f"Cache updated at {_last_cache_update}. {_computation_cache=}")
+    _cached_dataset_version = dataset_version
+    if _latest_dataset_version is None or _latest_dataset_version < dataset_version:
+        _latest_dataset_version = dataset_version
+    logger.info(f"Cache updated at {_last_cache_update} for dataset version {dataset_version}. {_computation_cache=}")
+
+def _log_refresh_result(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Cache refresh failed: {task.exception()}")
+
+def refresh_cache() -> asyncio.Task:
+    """
+    Start a cache refresh, or join the one already in flight so that concurrent
+    callers trigger a single MPC query.
+    """
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(update_cache())
+        _refresh_task.set_name('cache_refresh')
+        _refresh_task.add_done_callback(_log_refresh_result)
+    return _refresh_task
 
-async def update_cache_periodically():
-    global _computation_cache, _last_cache_update
+def is_cache_stale() -> bool:
+    return _latest_dataset_version != _cached_dataset_version
+
+async def update_cache_on_dataset_change():
+    """
+    Warm the cache, then only rerun the query when the coordination server reports a
+    new dataset version. The previous results keep being served while refreshing.
+    """
+    global _latest_dataset_version
     while True:
         try:
-            await update_cache()
+            if _computation_cache is None or is_cache_stale():
+                await refresh_cache()
+            # Long-poll until the dataset changes
+            _latest_dataset_version = await client_lib.get_dataset_version(
+                settings.coordination_server_url,
+                after=_cached_dataset_version,
+                timeout=settings.dataset_version_wait_timeout,
+            )
         except asyncio.CancelledError:
             logger.info("Cache update task cancelled")
             break
         except Exception as e:
             logger.error(f"Error updating cache: {str(e)}")
-        try:
-            await asyncio.sleep(settings.cache_ttl_seconds)
-        except asyncio.CancelledError:
-            logger.info("Cache update task cancelled during sleep")
-            break
+            try:
+                await asyncio.sleep(settings.poll_duration)
+            except asyncio.CancelledError:
+                logger.info("Cache update task cancelled during sleep")
+                break
 
 @router.get("/query-computation")
-async def query_computation():
-    global _background_task_started
-
-    # First time we fetch certs and update cache
-    if not _background_task_started:
-        await update_cache()
-        # Start background task to update cache periodically
-        _background_task = asyncio.create_task(update_cache_periodically())
-        _background_task.set_name('cache_updater')
-        _background_task_started = True
-        logger.info("Started background cache update task")
-
+async def query_computation(response: Response):
+    cache_miss = _computation_cache is None
+    if cache_miss:
+        # Cache miss: join the in-flight refresh instead of starting another MPC.
+        # `shield` keeps the shared refresh running when this request gives up waiting.
+        try:
+            await asyncio.wait_for(asyncio.shield(refresh_cache()), timeout=settings.cache_miss_wait_timeout)
+        except asyncio.TimeoutError:
+            logger.info(f"Cache refresh not finished within {settings.cache_miss_wait_timeout} seconds")
+        except Exception as e:
+            logger.error(f"Failed to initialize cache: {str(e)}")
     if _computation_cache is None:
+        CACHE_REQUESTS.inc("unavailable")
         raise HTTPException(
             status_code=503,
-            detail="Cache not yet initialized. Please try again in a few seconds."
+            detail="Cache not yet initialized. Please try again in a few seconds.",
+            headers={"Retry-After": str(settings.cache_miss_retry_after)},
         )
 
+    response.headers["Age"] = str(int((datetime.now() - _last_cache_update).total_seconds()))
+    response.headers["X-Dataset-Version"] = str(_cached_dataset_version)
+    response.headers["X-Cache-Status"] = "STALE" if is_cache_stale() else "FRESH"
+    CACHE_REQUESTS.inc("miss" if cache_miss else response.headers["X-Cache-Status"].lower())
     return _computation_cache
 
-# @router.on_event("startup")
-# async def startup_event():
-#     global _background_task, _background_task_started
-#     if not _background_task_started:
-#         _background_task = asyncio.create_task(update_cache_periodically())
-#         _background_task.set_name('cache_updater')
-#         _background_task_started = True
-#         logger.info("Started background cache update task")
+@router.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@router.on_event("startup")
+async def startup_event():
+    global _background_task, _background_task_started
+    if not _background_task_started:
+        _background_task = asyncio.create_task(update_cache_on_dataset_change())
+        _background_task.set_name('cache_updater')
+        _background_task_started = True
+        logger.info("Started background cache update task")
 
 @router.on_event("shutdown")
 async def shutdown_event():
@@ -1,6 +1,8 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 format = '%(asctime)s [%(levelname)s] %(message)s'
 datefmt = '%Y-%m-%d %H:%M:%S'
@@ -15,6 +17,18 @@ def configure_console_logger():
         ],
     )
 
+def _start_queue_listener(handlers: list[logging.Handler]) -> QueueHandler:
+    """
+    Hand the records to `handlers` in a background thread, so that the console and file
+    writes don't block the event loop. The records are formatted by the returned handler.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Flush the records left in the queue on exit
+    atexit.register(listener.stop)
+    return QueueHandler(log_queue)
+
 def configure_file_console_loggers(name: str, max_bytes_mb: int, backup_count: int):
     log_dir = 'logs'
     os.makedirs(log_dir, exist_ok=True)
@@ -29,12 +43,13 @@ def configure_file_console_loggers(name: str, max_bytes_mb: int, backup_count: i
         format=format,
         datefmt=datefmt,
         handlers=[
-            logging.StreamHandler(),
-            RotatingFileHandler(
-                f'logs/{name}_{pid}.log',
-                maxBytes=max_bytes_mb * mb,
-                backupCount=backup_count
-            ),
+            _start_queue_listener([
+                logging.StreamHandler(),
+                RotatingFileHandler(
+                    log_file,
+                    maxBytes=max_bytes_mb * mb,
+                    backupCount=backup_count
+                ),
+            ]),
         ],
     )
-
@@ -0,0 +1,105 @@
+import math
+from enum import Enum
+
+from pydantic import BaseModel, root_validator
+
+from .constants import MAX_DATA_PROVIDERS, VALUE_SCALE
+
+
+class Statistic(str, Enum):
+    MAX = "max"
+    MIN = "min"
+    MEAN = "mean"
+    MEDIAN = "median"
+    GINI_COEFFICIENT = "gini_coefficient"
+    VARIANCE = "variance"
+    PERCENTILES = "percentiles"
+    HISTOGRAM = "histogram"
+    TOP_K = "top_k"
+
+
+DEFAULT_STATISTICS = [
+    Statistic.MAX,
+    Statistic.MEAN,
+    Statistic.MEDIAN,
+    Statistic.GINI_COEFFICIENT,
+]
+
+
+class QueryDescriptor(BaseModel):
+    """
+    Selects the statistics computed by `query_computation.mpc`. Only the outputs
+    needed by the selected statistics are computed and revealed.
+    """
+    statistics: list[Statistic] = DEFAULT_STATISTICS
+    # Percentiles in [0, 100], used by `Statistic.PERCENTILES`
+    percentiles: list[float] = []
+    # Ascending upper bounds of the histogram buckets in ETH, used by `Statistic.HISTOGRAM`.
+    # Values fall into (-inf, b0], (b0, b1], ..., (b_last, inf).
+    histogram_bounds: list[float] = []
+    # Number of largest values to reveal, used by `Statistic.TOP_K`
+    top_k: int = 0
+
+    @root_validator(skip_on_failure=True)
+    def check_parameters(cls, values):
+        statistics = values["statistics"]
+        if len(statistics) == 0:
+            raise ValueError("At least one statistic must be requested")
+        if Statistic.PERCENTILES in statistics:
+            percentiles = values["percentiles"]
+            if len(percentiles) == 0 or any(p < 0 or p > 100 for p in percentiles):
+                raise ValueError("`percentiles` must be non-empty and within [0, 100]")
+        if Statistic.HISTOGRAM in statistics:
+            bounds = values["histogram_bounds"]
+            if len(bounds) == 0 or any(a >= b for a, b in zip(bounds, bounds[1:])):
+                raise ValueError("`histogram_bounds` must be non-empty and strictly ascending")
+        if Statistic.TOP_K in statistics:
+            if values["top_k"] < 1 or values["top_k"] > MAX_DATA_PROVIDERS:
+                raise ValueError(f"`top_k` must be within [1, {MAX_DATA_PROVIDERS}]")
+        return values
+
+
+DEFAULT_QUERY = QueryDescriptor()
+
+
+def output_layout(query: QueryDescriptor) -> list[tuple[str, int]]:
+    """
+    Raw outputs of `query_computation.mpc` as (name, size), in the order they are
+    revealed to the client. `count` is always the first output.
+    """
+    statistics = set(query.statistics)
+    layout = [("count", 1)]
+    if Statistic.MAX in statistics:
+        layout.append(("max", 1))
+    if Statistic.MIN in statistics:
+        layout.append(("min", 1))
+    if statistics & {Statistic.MEAN, Statistic.GINI_COEFFICIENT, Statistic.VARIANCE}:
+        layout.append(("sum", 1))
+    if Statistic.MEDIAN in statistics:
+        layout.append(("median", 1))
+    if Statistic.GINI_COEFFICIENT in statistics:
+        layout.append(("area", 1))
+    if Statistic.VARIANCE in statistics:
+        layout.append(("sum_of_squares", 1))
+    if Statistic.PERCENTILES in statistics:
+        layout.append(("percentiles", len(query.percentiles)))
+    if Statistic.HISTOGRAM in statistics:
+        layout.append(("histogram", len(query.histogram_bounds)))
+    if Statistic.TOP_K in statistics:
+        layout.append(("top_k", query.top_k))
+    return layout
+
+
+def num_outputs(query: QueryDescriptor) -> int:
+    return sum(size for _, size in output_layout(query))
+
+
+def percentile_index(percentile: float, num_data_providers: int) -> int:
+    """Index of the nearest-rank percentile in the sorted values"""
+    index = math.ceil(percentile / 100 * num_data_providers) - 1
+    return min(max(index, 0), num_data_providers - 1)
+
+
+def scaled_histogram_bounds(query: QueryDescriptor) -> list[int]:
+    """Histogram bounds in the same unit as the shared values"""
+    return [round(bound * VALUE_SCALE) for bound in query.histogram_bounds]
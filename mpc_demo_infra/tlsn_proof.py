@@ -0,0 +1,112 @@
+"""
+Parsed view of a TLSN proof, shared by the coordination and computation party servers.
+
+A proof is parsed once and its fields are extracted on first access, so that the
+checks, the MPC program generation and the proof archive of a request reuse the
+same parse.
+"""
+import gzip
+import hashlib
+import json
+import zlib
+from functools import cached_property, lru_cache
+from itertools import chain
+
+# Bytes of a label and of the delta of the encodings
+WORD_SIZE = 16
+# Labels of each byte of the committed data, one per bit
+WORDS_PER_LABEL = 8
+
+
+class TLSNProof:
+    def __init__(self, proof: str):
+        self.document = json.loads(proof)
+
+    @cached_property
+    def _commitment(self) -> dict:
+        private_openings = self.document["substrings"]["private_openings"]
+        if len(private_openings) != 1:
+            raise ValueError(f"Expected 1 private opening, got {len(private_openings)}")
+        _, (_commitment_info, commitment) = next(iter(private_openings.items()))
+        return commitment
+
+    @cached_property
+    def data_commitment_hash(self) -> str:
+        """Hash of the data commitment, hex string without 0x prefix"""
+        # FIXME: `nonce` shouldn't be included in the proof
+        return bytes(self._commitment["hash"]).hex()
+
+    @cached_property
+    def _encodings(self) -> tuple[int, str, list[str]]:
+        encodings = self.document["encodings"]
+        if len(encodings) == 0:
+            raise ValueError("Expected encodings of at least 1 byte, got none")
+        delta = encodings[0]["U8"]["state"]["delta"]
+        if len(delta) != WORD_SIZE:
+            raise ValueError(f"Expected {WORD_SIZE} bytes in delta, got {len(delta)}")
+        labels = []
+        for e in encodings:
+            if e["U8"]["state"]["delta"] != delta:
+                raise ValueError(f"Expected all deltas to be the same, got {e['U8']['state']['delta']} and {delta}")
+            byte_labels = e["U8"]["labels"]
+            if len(byte_labels) != WORDS_PER_LABEL:
+                raise ValueError(f"Expected {WORDS_PER_LABEL} labels, got {len(byte_labels)}")
+            labels.extend(byte_labels)
+        if any(len(label) != WORD_SIZE for label in labels):
+            raise ValueError(f"Expected {WORD_SIZE} bytes in every label")
+        # Convert all the labels at once and split the hex string, instead of one `bytes` per label
+        labels_hex = bytes(chain.from_iterable(labels)).hex()
+        label_hex_len = 2 * WORD_SIZE
+        zero_encodings = [labels_hex[i:i + label_hex_len] for i in range(0, len(labels_hex), label_hex_len)]
+        return len(encodings), bytes(delta).hex(), zero_encodings
+
+    @property
+    def num_bytes_input(self) -> int:
+        """Number of bytes of the committed data"""
+        return self._encodings[0]
+
+    @property
+    def delta(self) -> str:
+        """Global delta of the encodings, hex string"""
+        return self._encodings[1]
+
+    @property
+    def zero_encodings(self) -> list[str]:
+        """Hex strings of the labels encoding 0, `WORDS_PER_LABEL` per byte of the committed data"""
+        return self._encodings[2]
+
+    @cached_property
+    def canonical_json(self) -> bytes:
+        """Compact JSON of the proof, without the indentation and spaces of the pretty-printed proofs"""
+        return json.dumps(self.document, separators=(",", ":")).encode("utf-8")
+
+
+@lru_cache(maxsize=8)
+def parse_tlsn_proof(proof: str) -> TLSNProof:
+    """Parse the proof, reusing the parse of the same proof string"""
+    return TLSNProof(proof)
+
+
+# Transport of the proofs between the client, the coordination server and the parties:
+# gzip-compressed UTF-8 JSON, referenced by the SHA-256 of the uncompressed proof.
+
+def proof_digest(proof: str) -> str:
+    return hashlib.sha256(proof.encode("utf-8")).hexdigest()
+
+
+def compress_proof(proof: str) -> bytes:
+    return gzip.compress(proof.encode("utf-8"), compresslevel=6)
+
+
+def decompress_proof(data: bytes, max_size: int) -> str:
+    """Decompress a proof, rejecting proofs larger than `max_size` bytes once decompressed"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        proof = decompressor.decompress(data, max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid gzip data: {e}")
+    if len(proof) > max_size or decompressor.unconsumed_tail:
+        raise ValueError(f"Proof larger than {max_size} bytes")
+    if not decompressor.eof:
+        raise ValueError("Truncated gzip data")
+    return proof.decode("utf-8")
@@ -0,0 +1,235 @@
+"""
+Tracing of the share data and query computation sessions across the client, the
+coordination server and the computation parties.
+
+A trace is started by the coordination server at `add_user_to_queue`, and its id is
+returned to the client. Each HTTP hop carries the current span in a W3C `traceparent`
+header, which `TracingMiddleware` picks up to continue the trace in the next service.
+Spans are appended to a local file, one OTLP/JSON `ExportTraceServiceRequest` per line as
+written by the OpenTelemetry Collector file exporter, so they can be loaded into any
+OTLP-compatible viewer.
+
+Without `configure_tracing`, spans are still created so that the trace id travels
+through the service, but nothing is written.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_OK = 1
+STATUS_CODE_ERROR = 2
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+
+    def to_traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_span_id: Optional[str]
+    kind: int
+    start_time_ns: int
+    attributes: dict[str, object]
+    end_time_ns: Optional[int] = None
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: object) -> None:
+        self.attributes[key] = value
+
+
+_current_span_context: ContextVar[Optional[SpanContext]] = ContextVar("current_span_context", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def parse_traceparent(traceparent: Optional[str]) -> Optional[SpanContext]:
+    if traceparent is None:
+        return None
+    match = TRACEPARENT_PATTERN.match(traceparent.strip().lower())
+    if match is None:
+        return None
+    return SpanContext(trace_id=match.group(1), span_id=match.group(2))
+
+
+def current_trace_id() -> Optional[str]:
+    span_context = _current_span_context.get()
+    return None if span_context is None else span_context.trace_id
+
+
+def trace_headers() -> dict[str, str]:
+    """Headers continuing the current trace in the service receiving the request"""
+    span_context = _current_span_context.get()
+    return {} if span_context is None else {TRACEPARENT_HEADER: span_context.to_traceparent()}
+
+
+def join_trace(trace_id: str) -> None:
+    """Continue the trace `trace_id` in the current context, e.g. the one returned by `add_user_to_queue`"""
+    if re.match(r"^[0-9a-f]{32}$", trace_id) is None:
+        raise ValueError(f"Invalid trace id {trace_id}")
+    _current_span_context.set(SpanContext(trace_id=trace_id, span_id=new_span_id()))
+
+
+def _attribute_value(value: object) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class FileSpanExporter:
+    """Appends the spans to `path` in OTLP/JSON, one request per line"""
+    def __init__(self, path: str, service_name: str):
+        self.path = Path(path)
+        self.service_name = service_name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def _to_otlp(self, span: Span) -> dict:
+        otlp_span = {
+            "traceId": span.context.trace_id,
+            "spanId": span.context.span_id,
+            "name": span.name,
+            "kind": span.kind,
+            "startTimeUnixNano": str(span.start_time_ns),
+            "endTimeUnixNano": str(span.end_time_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": STATUS_CODE_OK} if span.error is None else {"code": STATUS_CODE_ERROR, "message": span.error},
+        }
+        if span.parent_span_id is not None:
+            otlp_span["parentSpanId"] = span.parent_span_id
+        return otlp_span
+
+    def export(self, span: Span) -> None:
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ]},
+                "scopeSpans": [{"scope": {"name": "mpc_demo_infra"}, "spans": [self._to_otlp(span)]}],
+            }],
+        }, separators=(",", ":"))
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+_exporter: Optional[FileSpanExporter] = None
+
+
+def configure_tracing(service_name: str, path: str) -> None:
+    """Export the spans of this process to `path`. Tracing is not exported if `path` is empty"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+    if path:
+        _exporter = FileSpanExporter(path, service_name)
+        logger.info(f"Exporting traces of {service_name} to {path}")
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, parent: Optional[SpanContext] = None, **attributes) -> Iterator[Span]:
+    """
+    Run the block in a span, child of `parent` or of the current span. A new trace is
+    started if there is neither.
+    """
+    if parent is None:
+        parent = _current_span_context.get()
+    context = SpanContext(
+        trace_id=new_trace_id() if parent is None else parent.trace_id,
+        span_id=new_span_id(),
+    )
+    current = Span(
+        name=name,
+        context=context,
+        parent_span_id=None if parent is None else parent.span_id,
+        kind=kind,
+        start_time_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span_context.set(context)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span_context.reset(token)
+        current.end_time_ns = time.time_ns()
+        if _exporter is not None:
+            try:
+                _exporter.export(current)
+            except Exception as e:
+                logger.warning(f"Failed to export span {name}: {e}")
+
+
+@contextmanager
+def stage(histogram: Histogram, program: str, name: str) -> Iterator[Span]:
+    """Time a stage of `program` in `histogram`, labelled by (program, stage), and trace it as a span"""
+    with histogram.time(program, name), span(name, program=program) as stage_span:
+        yield stage_span
+
+
+class TracingMiddleware:
+    """Run each HTTP request in a server span, continuing the trace of its `traceparent` header"""
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        parent = parse_traceparent(Headers(scope=scope).get(TRACEPARENT_HEADER))
+        with span(f"{scope['method']} {scope['path']}", kind=SPAN_KIND_SERVER, parent=parent) as server_span:
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
@@ -0,0 +1,59 @@
+import json
+
+from mpc_demo_infra.client_lib import lib
+
+
+class FakeResponse:
+    status = 200
+
+    async def json(self):
+        return {"client_port_base": 8100}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeSession:
+    def __init__(self, posted: list, **kwargs):
+        self.posted = posted
+
+    def post(self, url, data, headers):
+        self.posted.append(data)
+        return FakeResponse()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+async def test_queries_reuse_the_client_cert(tmp_path, monkeypatch):
+    posted = []
+    keys = []
+
+    async def fake_validate_computation_key(coordination_server_url, access_key, computation_key):
+        return True
+
+    def fake_run_computation_query_client(hosts, port_base, certs_path, client_id, cert_file, key_file, max_client_wait, query):
+        keys.append(open(key_file).read())
+
+    monkeypatch.setattr(lib, "validate_computation_key", fake_validate_computation_key)
+    monkeypatch.setattr(lib.aiohttp, "ClientSession", lambda **kwargs: FakeSession(posted, **kwargs))
+    monkeypatch.setattr(lib, "compress_json", lambda body: (json.dumps(body), {}))
+    monkeypatch.setattr(lib, "run_computation_query_client", fake_run_computation_query_client)
+
+    for _ in range(2):
+        await lib.query_computation(tmp_path, "http://coord", ["127.0.0.1"], "access", "computation", 60)
+    assert len(keys) == 2 and keys[0] == keys[1]
+    # The parties get the same cert, so they can keep their warm VM
+    certs = [json.loads(body)["client_cert_file"] for body in posted]
+    assert certs[0] == certs[1]
+
+    # An expired cert is replaced
+    (tmp_path / "C0.pem").write_text("not a cert")
+    await lib.query_computation(tmp_path, "http://coord", ["127.0.0.1"], "access", "computation", 60)
+    assert keys[2] != keys[0]
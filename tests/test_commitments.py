@@ -0,0 +1,51 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from mpc_demo_infra.coordination_server import routes
+from mpc_demo_infra.coordination_server.database import Base, MPCSession, DatasetMetadata, DATASET_METADATA_ID
+
+
+@pytest.fixture
+def db():
+    # The routes query from a worker thread, so the in-memory database is shared across threads
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+        future=True,
+    )
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        for secret_index in range(1, 6):
+            session.add(MPCSession(
+                eth_address=f"0x{secret_index}",
+                uid=secret_index,
+                tlsn_proof_path=f"proof_{secret_index}.json",
+                secret_index=secret_index,
+                data_commitment=f"{secret_index:064x}",
+            ))
+        session.add(DatasetMetadata(id=DATASET_METADATA_ID, num_data_providers=5, next_secret_index=6))
+        session.commit()
+        yield session
+
+
+async def test_commitments_are_paginated(db):
+    page = await routes.commitments(offset=0, limit=2, db=db)
+    assert page.total == 5
+    assert [c.secret_index for c in page.commitments] == [1, 2]
+
+    page = await routes.commitments(offset=4, limit=2, db=db)
+    assert [c.secret_index for c in page.commitments] == [5]
+    assert page.commitments[0].data_commitment == f"{5:064x}"
+
+
+async def test_commitments_limit_is_capped(db, monkeypatch):
+    monkeypatch.setattr(routes.settings, "commitments_page_max_limit", 3)
+    page = await routes.commitments(offset=0, limit=100, db=db)
+    assert len(page.commitments) == 3
+
+    with pytest.raises(HTTPException):
+        await routes.commitments(offset=-1, limit=10, db=db)
@@ -0,0 +1,94 @@
+import gzip
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from mpc_demo_infra.compression import CompressionMiddleware, compress_json
+
+BIG_PAYLOAD = {"values": list(range(2000))}
+
+
+def create_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024, max_request_size=100_000)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return await request.json()
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/gz")
+    async def gz():
+        return Response(content=gzip.compress(b"payload"), media_type="application/gzip")
+
+    return app
+
+
+async def call(app, method: str, path: str, body: bytes = b"", headers: dict[str, str] = {}):
+    """Send a request to the ASGI app, returns (status, headers, body)"""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    request_messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"body": b""}
+
+    async def receive():
+        return request_messages.pop(0) if request_messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+async def test_compressed_request_and_response():
+    body, headers = compress_json(BIG_PAYLOAD)
+    assert headers["Content-Encoding"] == "gzip"
+    assert len(body) < len(json.dumps(BIG_PAYLOAD)) / 2
+    status, response_headers, response_body = await call(
+        create_app(), "POST", "/echo", body, {**headers, "Accept-Encoding": "gzip"},
+    )
+    assert status == 200
+    assert response_headers["content-encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response_body)) == BIG_PAYLOAD
+
+
+async def test_small_and_uncompressed_bodies_pass_through():
+    body, headers = compress_json({"ok": True})
+    assert "Content-Encoding" not in headers
+    status, response_headers, response_body = await call(create_app(), "POST", "/echo", body, headers)
+    assert status == 200 and json.loads(response_body) == {"ok": True}
+
+    status, response_headers, response_body = await call(create_app(), "GET", "/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response_headers
+    assert json.loads(response_body) == {"ok": True}
+
+    # Already compressed responses are not compressed again
+    status, response_headers, response_body = await call(create_app(), "GET", "/gz", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response_headers
+    assert gzip.decompress(response_body) == b"payload"
+
+
+async def test_invalid_request_bodies_are_rejected():
+    app = create_app()
+    status, _, _ = await call(app, "POST", "/echo", b"not gzip", {"Content-Encoding": "gzip"})
+    assert status == 400
+    status, _, _ = await call(app, "POST", "/echo", gzip.compress(b"0" * 100_001), {"Content-Encoding": "gzip"})
+    assert status == 413
+    status, _, _ = await call(app, "POST", "/echo", b"{}", {"Content-Encoding": "br"})
+    assert status == 415
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from mpc_demo_infra.client_lib.lib import StatsResults
+from mpc_demo_infra.data_consumer_api import routes
+
+
+@pytest.fixture
+def mpc_calls(monkeypatch):
+    """
+    Replace the MPC query with a slow fake and reset the cache state.
+    Returns a dict holding the number of MPC queries triggered.
+    """
+    calls = {"count": 0, "delay": 0.2}
+
+    async def fake_get_dataset_version(coordination_server_url, after=None, timeout=0):
+        return 1
+
+    async def fake_query_computation_from_data_consumer_api(**kwargs):
+        calls["count"] += 1
+        await asyncio.sleep(calls["delay"])
+        return StatsResults(
+            num_data_providers=3,
+            max=3.0,
+            mean=2.0,
+            median=2.0,
+            gini_coefficient=0.2,
+        )
+
+    monkeypatch.setattr(routes.client_lib, "get_dataset_version", fake_get_dataset_version)
+    monkeypatch.setattr(routes.client_lib, "query_computation_from_data_consumer_api", fake_query_computation_from_data_consumer_api)
+    monkeypatch.setattr(routes, "_computation_cache", None)
+    monkeypatch.setattr(routes, "_last_cache_update", None)
+    monkeypatch.setattr(routes, "_cached_dataset_version", None)
+    monkeypatch.setattr(routes, "_latest_dataset_version", None)
+    monkeypatch.setattr(routes, "_refresh_task", None)
+    return calls
+
+
+async def test_concurrent_cache_misses_trigger_one_mpc(mpc_calls):
+    responses = [Response() for _ in range(100)]
+    results = await asyncio.gather(*[routes.query_computation(response) for response in responses])
+
+    assert mpc_calls["count"] == 1
+    assert all(result == results[0] for result in results)
+    assert results[0].num_data_providers == 3
+    assert all(response.headers["X-Dataset-Version"] == "1" for response in responses)
+
+    # Cache hits don't trigger any MPC
+    await routes.query_computation(Response())
+    assert mpc_calls["count"] == 1
+
+
+async def test_cache_miss_wait_is_bounded(mpc_calls, monkeypatch):
+    mpc_calls["delay"] = 1
+    monkeypatch.setattr(routes.settings, "cache_miss_wait_timeout", 0.05)
+    monkeypatch.setattr(routes.settings, "cache_miss_retry_after", 7)
+
+    with pytest.raises(HTTPException) as e:
+        await routes.query_computation(Response())
+    assert e.value.status_code == 503
+    assert e.value.headers["Retry-After"] == "7"
+
+    # The refresh keeps running and is joined by the next request
+    with pytest.raises(HTTPException):
+        await routes.query_computation(Response())
+    assert mpc_calls["count"] == 1
+
+    await routes._refresh_task
+    result = await routes.query_computation(Response())
+    assert result.num_data_providers == 3
+    assert mpc_calls["count"] == 1
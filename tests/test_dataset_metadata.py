@@ -0,0 +1,109 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from mpc_demo_infra.coordination_server import database, routes
+from mpc_demo_infra.coordination_server.database import Base, MPCSession, DatasetCounters
+from mpc_demo_infra.coordination_server.dataset_version import DatasetVersion
+from mpc_demo_infra.coordination_server.locks import LocalLock
+from mpc_demo_infra.coordination_server.proof_uploads import ProofUploads
+from mpc_demo_infra.coordination_server.schemas import RequestSharingDataRequest
+
+
+@pytest.fixture
+def session_local(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'coordination.db'}", future=True)
+    Base.metadata.create_all(bind=engine)
+    session_local = sessionmaker(bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", session_local)
+    return session_local
+
+
+def new_session(secret_index: int) -> MPCSession:
+    return MPCSession(
+        eth_address=f"0x{secret_index}",
+        uid=secret_index,
+        tlsn_proof_path=f"proof_{secret_index}.json",
+        secret_index=secret_index,
+    )
+
+
+def test_metadata_is_initialized_from_existing_sessions(session_local):
+    with session_local() as db:
+        db.add_all([new_session(1), new_session(2)])
+        db.commit()
+    assert database.init_dataset_metadata() == DatasetCounters(num_data_providers=2, next_secret_index=3)
+    # Already initialized
+    assert database.init_dataset_metadata() == DatasetCounters(num_data_providers=2, next_secret_index=3)
+
+
+def test_counters_are_updated_with_inserts(session_local):
+    database.init_dataset_metadata()
+    assert database.add_mpc_session(new_session(1)) == DatasetCounters(num_data_providers=1, next_secret_index=2)
+    assert database.add_mpc_session(new_session(2)) == DatasetCounters(num_data_providers=2, next_secret_index=3)
+    with session_local() as db:
+        assert database.get_dataset_counters(db) == DatasetCounters(num_data_providers=2, next_secret_index=3)
+        assert database.has_uid_shared_data(db, 2)
+        assert not database.has_uid_shared_data(db, 3)
+
+
+async def test_stats():
+    dataset_version = DatasetVersion(lambda: DatasetCounters(num_data_providers=3, next_secret_index=4), poll_interval=60)
+    state = SimpleNamespace(dataset_version=dataset_version, user_queue=SimpleNamespace(size=lambda: 2))
+    response = await routes.stats(SimpleNamespace(app=SimpleNamespace(state=state)))
+    assert response.num_data_providers == 3
+    assert response.dataset_version == 3
+    assert response.queue_size == 2
+
+
+async def test_dataset_version_sees_data_shared_by_other_workers(session_local):
+    database.init_dataset_metadata()
+    # One per worker
+    sharing_worker = DatasetVersion(database.read_dataset_counters, poll_interval=0.05)
+    waiting_worker = DatasetVersion(database.read_dataset_counters, poll_interval=0.05)
+    waiter = asyncio.create_task(waiting_worker.wait_for_change(0, timeout=5))
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+    assert await sharing_worker.bump(database.add_mpc_session(new_session(1))) == 1
+    assert await asyncio.wait_for(waiter, timeout=1) == 1
+    assert (await waiting_worker.refresh()).next_secret_index == 2
+
+
+async def test_dataset_version_wait_times_out(session_local):
+    database.init_dataset_metadata()
+    dataset_version = DatasetVersion(database.read_dataset_counters, poll_interval=0.05)
+    assert await dataset_version.wait_for_change(0, timeout=0.2) == 0
+
+
+async def test_share_data_releases_the_lock_if_reading_counters_fails(monkeypatch, tmp_path):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(routes, "get_proof_uploads", lambda: uploads)
+    monkeypatch.setattr(routes.settings, "prohibit_multiple_contributions", False)
+
+    def failing_get_dataset_counters(db):
+        raise OperationalError("SELECT", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(routes, "get_dataset_counters", failing_get_dataset_counters)
+
+    async def fake_verifier(*args, **kwargs):
+        return SimpleNamespace(returncode=0, communicate=fake_communicate)
+
+    async def fake_communicate():
+        return b'{"uid":1}', b""
+
+    monkeypatch.setattr(routes.asyncio, "create_subprocess_shell", fake_verifier)
+    monkeypatch.setattr(routes, "locate_binance_verifier", lambda locations: (tmp_path, "verifier"))
+    lock = LocalLock()
+    user_queue = SimpleNamespace(validate_computation_key=lambda access_key, computation_key: True)
+    x = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(user_queue=user_queue, sharing_data_lock=lock)))
+    request = RequestSharingDataRequest(
+        eth_address="0x1", tlsn_proof="{}", client_id=0, client_cert_file="", access_key="apple", computation_key="key",
+    )
+    with pytest.raises(HTTPException):
+        await routes.share_data(request, x, db=None)
+    assert not await lock.locked()
@@ -0,0 +1,77 @@
+import pytest
+
+from mpc_demo_infra.coordination_server.sqlite_user_queue import SqliteUserQueue
+from mpc_demo_infra.coordination_server.user_queue import UserQueue
+from mpc_demo_infra.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_render_prometheus_text_format():
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests", ("event",)))
+    queue_length = registry.register(Gauge("queue_length", "Queue length"))
+    stage_seconds = registry.register(Histogram("stage_seconds", "Stage seconds", ("stage",), buckets=(0.1, 1)))
+
+    requests.inc("get_position")
+    requests.inc("get_position")
+    requests.inc('say "hi"', amount=0.5)
+    queue_length.set_function(lambda: 3)
+    for value in [0.05, 0.1, 0.5, 5]:
+        stage_seconds.observe(value, "compile")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{event="get_position"} 2',
+        'requests_total{event="say \\"hi\\""} 0.5',
+        "# HELP queue_length Queue length",
+        "# TYPE queue_length gauge",
+        "queue_length 3",
+        "# HELP stage_seconds Stage seconds",
+        "# TYPE stage_seconds histogram",
+        'stage_seconds_bucket{stage="compile",le="0.1"} 2',
+        'stage_seconds_bucket{stage="compile",le="1"} 3',
+        'stage_seconds_bucket{stage="compile",le="+Inf"} 4',
+        'stage_seconds_sum{stage="compile"} 5.65',
+        'stage_seconds_count{stage="compile"} 4',
+    ]
+
+
+def test_gauge_function_and_inprogress():
+    gauge = Gauge("running", "Running", ("command",))
+    with gauge.track_inprogress("compile"):
+        assert list(gauge.samples()) == [("running", '{command="compile"}', 1)]
+    assert list(gauge.samples()) == [("running", '{command="compile"}', 0)]
+    with pytest.raises(ValueError):
+        gauge.set_function(lambda: 1)
+
+    head_wait = Gauge("head_wait", "Head wait")
+    head_wait.set_function(lambda: None)
+    assert list(head_wait.samples()) == []
+
+
+def test_invalid_labels_and_duplicates():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "Requests", ("event",)))
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        registry.register(Counter("requests_total", "Requests"))
+
+
+def test_histogram_time_observes_on_exception():
+    histogram = Histogram("stage_seconds", "Stage seconds", ("stage",))
+    with pytest.raises(RuntimeError):
+        with histogram.time("mpc_run"):
+            raise RuntimeError()
+    assert dict((name, value) for name, _, value in histogram.samples())["stage_seconds_count"] == 1
+
+
+@pytest.mark.parametrize("create_queue", [
+    lambda tmp_path: UserQueue(10, 60),
+    lambda tmp_path: SqliteUserQueue(str(tmp_path / "queue.db"), 10, 60),
+])
+def test_head_wait_time(tmp_path, create_queue):
+    queue = create_queue(tmp_path)
+    assert queue.head_wait_time() is None
+    queue.add_user("user_1")
+    assert 0 <= queue.head_wait_time() < 2
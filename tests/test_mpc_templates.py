@@ -0,0 +1,50 @@
+import ast
+import re
+from pathlib import Path
+
+import pytest
+
+PROGRAM_DIR = Path(__file__).parent.parent / "mpc_demo_infra" / "program"
+TEMPLATES = sorted(PROGRAM_DIR.glob("*.mpc"))
+
+# Names bound to the max number of data providers. Python-level loops over them are
+# unrolled at compile time into one instruction block per provider.
+PROVIDER_BOUNDS = {"MAX_DATA_PROVIDERS"}
+
+
+def parse_template(source: str) -> ast.Module:
+    # Placeholders like `{max_data_providers}` are filled by the party server
+    return ast.parse(re.sub(r"\{[a-z_]+\}", "0", source))
+
+
+def find_provider_loops(tree: ast.Module) -> list[int]:
+    """Line numbers of Python `for` loops and comprehensions iterating over a range of `PROVIDER_BOUNDS`"""
+    def iterates_over_providers(iter_node: ast.expr) -> bool:
+        return any(isinstance(node, ast.Name) and node.id in PROVIDER_BOUNDS for node in ast.walk(iter_node))
+
+    lines = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.For) and iterates_over_providers(node.iter):
+            lines.append(node.lineno)
+        elif isinstance(node, ast.comprehension) and iterates_over_providers(node.iter):
+            lines.append(node.iter.lineno)
+    return sorted(lines)
+
+
+@pytest.mark.parametrize("template", TEMPLATES, ids=lambda path: path.name)
+def test_no_python_loops_over_max_data_providers(template):
+    lines = find_provider_loops(parse_template(template.read_text()))
+    assert lines == [], f"{template.name} unrolls loops over MAX_DATA_PROVIDERS at lines {lines}, use `for_range` or vectorized operations instead"
+
+
+def test_lint_flags_unrolled_loops():
+    source = """
+MAX_DATA_PROVIDERS = {max_data_providers}
+print_ln('%s', [values[i].reveal() for i in range(MAX_DATA_PROVIDERS)])
+for i in range(1 + MAX_DATA_PROVIDERS):
+    pass
+@for_range(MAX_DATA_PROVIDERS)
+def _(i):
+    pass
+"""
+    assert find_provider_loops(parse_template(source)) == [3, 4]
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from mpc_demo_infra.computation_party_server import preprocessing as party_preprocessing
+from mpc_demo_infra.coordination_server import preprocessing as coord_preprocessing
+
+
+@pytest.fixture
+def preprocessing_root(tmp_path, monkeypatch):
+    offline_binary = tmp_path / "offline.x"
+    offline_binary.touch()
+    monkeypatch.setattr(party_preprocessing, "PREPROCESSING_OFFLINE_BINARY", str(offline_binary))
+    monkeypatch.setattr(party_preprocessing, "PREPROCESSING_ROOT", tmp_path)
+    return tmp_path
+
+
+def test_batch_is_used_up_once(preprocessing_root):
+    (preprocessing_root / "query_computation" / "01").mkdir(parents=True)
+    (preprocessing_root / "query_computation" / "02.partial").mkdir()
+    assert party_preprocessing.list_batches("query_computation") == ["01"]
+    assert party_preprocessing.list_batches("share_data") == []
+
+    with party_preprocessing.use_batch("query_computation", "01") as prep_dir:
+        assert prep_dir.exists()
+        assert party_preprocessing.list_batches("query_computation") == []
+    assert not prep_dir.exists()
+
+    with pytest.raises(HTTPException) as e:
+        with party_preprocessing.use_batch("query_computation", "01"):
+            pass
+    assert e.value.status_code == 409
+
+
+def test_inline_preprocessing_without_batch(preprocessing_root):
+    with party_preprocessing.use_batch("share_data", None) as prep_dir:
+        assert prep_dir is None
+
+
+def test_invalid_batch_id_is_rejected(preprocessing_root):
+    with pytest.raises(HTTPException):
+        party_preprocessing.get_batch_dir("query_computation", "../01")
+    with pytest.raises(HTTPException):
+        party_preprocessing.get_batch_dir("unknown", "01")
+
+
+async def test_take_batch_held_by_all_parties(monkeypatch):
+    stocks = [
+        {"share_data": ["01", "02", "03"], "query_computation": []},
+        {"share_data": ["02", "03"], "query_computation": []},
+        {"share_data": ["01", "02", "03"], "query_computation": []},
+    ]
+
+    async def fake_fetch_preprocessing_stock(session):
+        return stocks
+
+    monkeypatch.setattr(coord_preprocessing.settings, "preprocessing_enabled", True)
+    monkeypatch.setattr(coord_preprocessing, "fetch_preprocessing_stock", fake_fetch_preprocessing_stock)
+    monkeypatch.setattr(coord_preprocessing, "_taken_batch_ids", set())
+
+    assert await coord_preprocessing.take_preprocessing_batch("share_data") == "02"
+    # Not picked again while the parties still hold it
+    assert await coord_preprocessing.take_preprocessing_batch("share_data") == "03"
+    assert await coord_preprocessing.take_preprocessing_batch("share_data") is None
+    assert await coord_preprocessing.take_preprocessing_batch("query_computation") is None
+
+
+def test_no_batches_without_offline_binary(preprocessing_root, monkeypatch):
+    monkeypatch.setattr(party_preprocessing, "PREPROCESSING_OFFLINE_BINARY", None)
+    assert party_preprocessing.preprocessed_programs() == ()
+    monkeypatch.setattr(party_preprocessing, "PREPROCESSING_OFFLINE_BINARY", str(preprocessing_root / "missing-offline.x"))
+    assert party_preprocessing.preprocessed_programs() == ()
+
+
+def test_warm_vm_parties_stock_no_query_batches(preprocessing_root, monkeypatch):
+    monkeypatch.setattr(party_preprocessing.settings, "warm_vm_enabled", True)
+    assert party_preprocessing.preprocessed_programs() == ("share_data",)
+    with pytest.raises(HTTPException):
+        party_preprocessing.get_batch_dir("query_computation", "01")
+
+
+def test_stock_levels_of_programs_stocked_by_all_parties():
+    stocks = [
+        {"share_data": ["01", "02"]},
+        {"share_data": ["01", "02"], "query_computation": ["03"]},
+        {"share_data": ["02"], "query_computation": ["03"]},
+    ]
+    assert coord_preprocessing.get_stock_levels(stocks) == {"share_data": 1}
+
+
+async def test_session_uses_up_the_batch_held_by_all_parties(tmp_path, monkeypatch):
+    offline_binary = tmp_path / "mascot-offline.x"
+    offline_binary.touch()
+    monkeypatch.setattr(party_preprocessing, "PREPROCESSING_OFFLINE_BINARY", str(offline_binary))
+    party_roots = [tmp_path / f"party_{party_id}" for party_id in range(3)]
+    for party_root, batch_ids in zip(party_roots, [["01", "02"], ["01", "02"], ["02"]]):
+        for batch_id in batch_ids:
+            (party_root / "share_data" / batch_id).mkdir(parents=True)
+
+    def party_stock(party_root):
+        monkeypatch.setattr(party_preprocessing, "PREPROCESSING_ROOT", party_root)
+        return {program: party_preprocessing.list_batches(program) for program in party_preprocessing.preprocessed_programs()}
+
+    async def fake_fetch_preprocessing_stock(session):
+        return [party_stock(party_root) for party_root in party_roots]
+
+    monkeypatch.setattr(coord_preprocessing.settings, "preprocessing_enabled", True)
+    monkeypatch.setattr(coord_preprocessing, "fetch_preprocessing_stock", fake_fetch_preprocessing_stock)
+    monkeypatch.setattr(coord_preprocessing, "_taken_batch_ids", set())
+
+    assert coord_preprocessing.get_stock_levels(await fake_fetch_preprocessing_stock(None)) == {"share_data": 1, "query_computation": 0}
+    batch_id = await coord_preprocessing.take_preprocessing_batch("share_data")
+    assert batch_id == "02"
+    for party_root in party_roots:
+        monkeypatch.setattr(party_preprocessing, "PREPROCESSING_ROOT", party_root)
+        with party_preprocessing.use_batch("share_data", batch_id) as prep_dir:
+            assert prep_dir.parent == party_root / "share_data"
+    assert coord_preprocessing.get_stock_levels(await fake_fetch_preprocessing_stock(None)) == {"share_data": 0, "query_computation": 0}
+    assert await coord_preprocessing.take_preprocessing_batch("share_data") is None
+
+
+async def test_pool_turns_off_when_parties_stock_nothing(monkeypatch):
+    fetches = []
+
+    async def fake_fetch_preprocessing_stock(session):
+        fetches.append(session)
+        # Parties running a protocol without offline phase binary
+        return [{}, {}, {}]
+
+    class IdleQueue:
+        def size(self):
+            return 0
+
+    class UnlockedLock:
+        async def locked(self):
+            return False
+
+    monkeypatch.setattr(coord_preprocessing.settings, "preprocessing_enabled", True)
+    monkeypatch.setattr(coord_preprocessing.settings, "preprocessing_check_interval", 0)
+    monkeypatch.setattr(coord_preprocessing, "fetch_preprocessing_stock", fake_fetch_preprocessing_stock)
+    monkeypatch.setattr(coord_preprocessing, "_parties_stock_preprocessing", True)
+
+    await asyncio.wait_for(coord_preprocessing.replenish_preprocessing_when_idle(IdleQueue(), UnlockedLock()), timeout=5)
+    assert await coord_preprocessing.take_preprocessing_batch("share_data") is None
+    assert len(fetches) == 1
@@ -0,0 +1,48 @@
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from mpc_demo_infra.coordination_server import database
+from mpc_demo_infra.coordination_server.database import Base, TLSNProofEntry
+from mpc_demo_infra.coordination_server.proof_archive import ProofArchive
+
+TESTS_DIR = Path(__file__).parent
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'coordination.db'}", future=True)
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+
+def test_proofs_round_trip(db, tmp_path):
+    archive = ProofArchive(str(tmp_path / "tlsn_proofs"))
+    proofs = [(TESTS_DIR / f"proof_{i}.json").read_text() for i in range(1, 4)]
+    digests = [archive.add(db, proof) for proof in proofs]
+    db.commit()
+    # Identical proofs are stored once
+    pack_size = archive.pack_path.stat().st_size
+    assert archive.add(db, proofs[0]) == digests[0]
+    assert archive.pack_path.stat().st_size == pack_size
+    assert pack_size < sum(len(proof) for proof in proofs) / 4
+
+    for proof, digest in zip(proofs, digests):
+        entry = db.get(TLSNProofEntry, digest)
+        assert json.loads(archive.read_proof(entry)) == json.loads(proof)
+        # Streamed in small chunks
+        assert json.loads(b"".join(archive.iter_proof(entry, chunk_size=1000))) == json.loads(proof)
+
+
+def test_corrupted_proof_is_detected(db, tmp_path):
+    archive = ProofArchive(str(tmp_path / "tlsn_proofs"))
+    digest = archive.add(db, (TESTS_DIR / "proof.json").read_text())
+    db.commit()
+    entry = db.get(TLSNProofEntry, digest)
+    entry.digest = "0" * 64
+    with pytest.raises(ValueError):
+        archive.read_proof(entry)
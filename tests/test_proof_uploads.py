@@ -0,0 +1,79 @@
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from mpc_demo_infra.coordination_server import routes
+from mpc_demo_infra.coordination_server.proof_uploads import ProofUploads
+from mpc_demo_infra.coordination_server.schemas import RequestSharingDataRequest
+from mpc_demo_infra.constants import MAX_CLIENT_ID
+from mpc_demo_infra.tlsn_proof import compress_proof, decompress_proof, proof_digest
+
+TESTS_DIR = Path(__file__).parent
+
+
+def test_uploads_round_trip(tmp_path):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1024 * 1024, ttl=3600)
+    proof = (TESTS_DIR / "proof.json").read_text()
+    compressed = compress_proof(proof)
+    assert len(compressed) < len(proof) / 4
+
+    digest = uploads.put(compressed)
+    assert digest == proof_digest(proof)
+    assert uploads.get_compressed(digest) == compressed
+    assert uploads.get_proof(digest) == proof
+    # Inline proofs are stored the same way
+    assert uploads.put_proof(proof) == digest
+
+    uploads.remove(digest)
+    assert uploads.get_proof(digest) is None
+
+
+def test_oversized_and_invalid_proofs_are_rejected(tmp_path):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1000, ttl=3600)
+    with pytest.raises(ValueError):
+        uploads.put(compress_proof("0" * 1001))
+    with pytest.raises(ValueError):
+        uploads.put(b"not gzip")
+    with pytest.raises(ValueError):
+        uploads.put(compress_proof("{}")[:-4])
+    assert decompress_proof(compress_proof("0" * 1000), 1000) == "0" * 1000
+
+
+def test_invalid_digests_are_rejected(tmp_path):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1000, ttl=3600)
+    for digest in ["../../coordination.db", "0" * 63, "G" * 64]:
+        with pytest.raises(ValueError):
+            uploads.get_compressed(digest)
+
+
+def test_expired_uploads_are_pruned(tmp_path):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1000, ttl=60)
+    expired = uploads.put_proof("{}")
+    expired_path = uploads._path(expired)
+    os.utime(expired_path, (time.time() - 120, time.time() - 120))
+    kept = uploads.put_proof("[]")
+    assert uploads.get_proof(expired) is None
+    assert uploads.get_proof(kept) == "[]"
+
+
+async def test_upload_is_removed_when_share_data_fails(tmp_path, monkeypatch):
+    uploads = ProofUploads(tmp_path / "uploads", max_size=1024 * 1024, ttl=3600)
+    monkeypatch.setattr(routes, "get_proof_uploads", lambda: uploads)
+    digest = uploads.put_proof("{}")
+    request = RequestSharingDataRequest(
+        eth_address="0x1",
+        tlsn_proof_digest=digest,
+        client_id=MAX_CLIENT_ID,
+        client_cert_file="",
+        access_key="apple",
+        computation_key="key",
+    )
+    user_queue = SimpleNamespace(validate_computation_key=lambda access_key, computation_key: True)
+    x = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(user_queue=user_queue, sharing_data_lock=None)))
+    with pytest.raises(HTTPException):
+        await routes.share_data(request, x, db=None)
+    assert uploads.get_proof(digest) is None
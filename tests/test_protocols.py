@@ -0,0 +1,49 @@
+import pytest
+
+from mpc_demo_infra.client_lib.domains import Fp
+from mpc_demo_infra.client_lib.client import octetStream
+from mpc_demo_infra.computation_party_server.protocols import (
+    FIELD_STATISTICAL_SECURITY,
+    PROTOCOL_PROFILES,
+    ProtocolDomain,
+    Security,
+    get_protocol_profile,
+)
+
+
+def test_ring_protocol_compiles_for_a_ring_one_bit_wider():
+    profile = get_protocol_profile("malicious-rep-ring")
+    assert profile.domain == ProtocolDomain.RING
+    assert profile.security == Security.MALICIOUS
+    assert profile.compile_args(256) == ["-R", "257"]
+    assert profile.vm_args(256) == []
+    assert profile.vm_binary == "malicious-rep-ring-party.x"
+    # MP-SPDZ has no separate offline phase for replicated secret sharing
+    assert profile.offline_binary is None
+
+
+def test_field_protocol_uses_a_prime_with_statistical_security():
+    profile = get_protocol_profile("mascot")
+    assert profile.domain == ProtocolDomain.FIELD
+    assert not profile.honest_majority
+    assert profile.compile_args(64) == ["-F", "64"]
+    assert profile.vm_args(64) == ["-lgp", str(64 + FIELD_STATISTICAL_SECURITY + 1)]
+    assert profile.offline_binary == "mascot-offline.x"
+
+
+def test_unknown_protocol():
+    with pytest.raises(ValueError):
+        get_protocol_profile("unknown-protocol")
+
+
+def test_profiles_are_keyed_by_name():
+    assert all(name == profile.name for name, profile in PROTOCOL_PROFILES.items())
+
+
+def test_field_domain_round_trip():
+    prime = 2 ** 127 - 1
+    domain = Fp(prime)
+    os = octetStream()
+    domain(-5).pack(os)
+    domain(prime - 1).pack(os)
+    assert [int(os.get(domain)), int(os.get(domain))] == [-5, -1]
@@ -0,0 +1,73 @@
+import pytest
+from pydantic import ValidationError
+
+from mpc_demo_infra.client_lib.lib import decode_stats_results
+from mpc_demo_infra.constants import VALUE_SCALE
+from mpc_demo_infra.query_descriptor import (
+    QueryDescriptor,
+    Statistic,
+    DEFAULT_QUERY,
+    output_layout,
+    num_outputs,
+    percentile_index,
+)
+
+
+def test_default_query_layout():
+    assert output_layout(DEFAULT_QUERY) == [
+        ("count", 1),
+        ("max", 1),
+        ("sum", 1),
+        ("median", 1),
+        ("area", 1),
+    ]
+
+
+def test_layout_only_includes_requested_outputs():
+    query = QueryDescriptor(statistics=[Statistic.MIN, Statistic.PERCENTILES], percentiles=[25, 75])
+    assert output_layout(query) == [("count", 1), ("min", 1), ("percentiles", 2)]
+    assert num_outputs(query) == 4
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"statistics": []},
+    {"statistics": [Statistic.PERCENTILES]},
+    {"statistics": [Statistic.PERCENTILES], "percentiles": [101]},
+    {"statistics": [Statistic.HISTOGRAM], "histogram_bounds": [2, 1]},
+    {"statistics": [Statistic.TOP_K], "top_k": 0},
+])
+def test_invalid_queries(kwargs):
+    with pytest.raises(ValidationError):
+        QueryDescriptor(**kwargs)
+
+
+def test_percentile_index():
+    assert percentile_index(0, 10) == 0
+    assert percentile_index(50, 10) == 4
+    assert percentile_index(100, 10) == 9
+
+
+def test_decode_stats_results():
+    # Values 1, 2, 3 ETH
+    values = [1 * VALUE_SCALE, 2 * VALUE_SCALE, 3 * VALUE_SCALE]
+    query = QueryDescriptor(
+        statistics=[Statistic.MIN, Statistic.MEAN, Statistic.VARIANCE, Statistic.HISTOGRAM, Statistic.TOP_K],
+        histogram_bounds=[1.5, 2.5],
+        top_k=5,
+    )
+    outputs = [
+        3,  # count
+        min(values),
+        sum(values),
+        sum(v * v for v in values),
+        1, 2,  # values <= 1.5, values <= 2.5
+        values[2], values[1], values[0], 0, 0,  # top 5
+    ]
+    results = decode_stats_results(query, outputs)
+    assert results.num_data_providers == 3
+    assert results.min == 1
+    assert results.mean == 2
+    assert results.variance == pytest.approx(2 / 3)
+    assert results.histogram == [1, 1, 1]
+    assert results.top_k == [3, 2, 1]
+    assert results.max is None
@@ -0,0 +1,58 @@
+from mpc_demo_infra.coordination_server.queue_journal import QueueJournal
+from mpc_demo_infra.coordination_server.user_queue import UserQueue, AddResult
+
+
+def get_queue(journal_path, max_size: int = 10, queue_head_timeout: int = 60, compact_threshold: int = 1000) -> UserQueue:
+    journal = QueueJournal(str(journal_path), compact_threshold=compact_threshold)
+    return UserQueue(max_size=max_size, queue_head_timeout=queue_head_timeout, journal=journal)
+
+def test_recover_positions_and_head(tmp_path):
+    journal_path = tmp_path / "queue.jsonl"
+    q = get_queue(journal_path)
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    assert q.add_user('orange') == AddResult.SUCCEEDED
+    assert q.add_priority_user('zk') == AddResult.SUCCEEDED
+    key1 = q.get_computation_key('mpc')
+    assert q.finish_computation('mpc', key1) == True
+    key2 = q.get_computation_key('zk')
+    head_time = q.users_head._time_at_queue_head
+    q.journal.close()
+
+    # Restart
+    q = get_queue(journal_path)
+    assert q._queue_to_str() == 'zk, apple, orange'
+    assert q.get_position('apple') == 1
+    assert q.get_position('mpc') is None
+    assert q.users_head._time_at_queue_head == head_time
+    assert q.validate_computation_key('zk', key2) == True
+    assert q.add_user('apple') == AddResult.ALREADY_IN_QUEUE
+
+def test_recover_ignores_partial_line(tmp_path):
+    journal_path = tmp_path / "queue.jsonl"
+    q = get_queue(journal_path)
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    q.journal.close()
+    with open(journal_path, "a") as f:
+        f.write('{"op": "add", "acc')
+
+    q = get_queue(journal_path)
+    assert q._queue_to_str() == 'mpc'
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    q.journal.close()
+    assert get_queue(journal_path)._queue_to_str() == 'mpc, apple'
+
+def test_compaction(tmp_path):
+    journal_path = tmp_path / "queue.jsonl"
+    q = get_queue(journal_path, compact_threshold=5)
+    for i in range(20):
+        access_key = f'user{i}'
+        assert q.add_user(access_key) == AddResult.SUCCEEDED
+        assert q.finish_computation(access_key, q.get_computation_key(access_key)) == True
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    q.journal.close()
+    assert len(journal_path.read_text().splitlines()) < 5 + 3
+
+    q = get_queue(journal_path)
+    assert q._queue_to_str() == 'mpc, apple'
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from mpc_demo_infra.coordination_server import routes
+from mpc_demo_infra.coordination_server.rate_limiter import TokenBucketLimiter, RateLimiter, get_client_ip
+from mpc_demo_infra.coordination_server.schemas import RequestGetPositionRequest
+from mpc_demo_infra.coordination_server.user_queue import UserQueue
+
+
+def test_token_bucket_refills():
+    limiter = TokenBucketLimiter(rate=2, burst=3, max_keys=10)
+    assert [limiter.acquire("a", now=0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a", now=0) == pytest.approx(0.5)
+    # Other keys have their own bucket
+    assert limiter.acquire("b", now=0) == 0
+    # Half a second refills one token
+    assert limiter.acquire("a", now=0.5) == 0
+    assert limiter.acquire("a", now=0.5) > 0
+    # Never more than `burst` tokens
+    assert [limiter.acquire("a", now=100) for _ in range(4)][-1] > 0
+
+def test_token_bucket_evicts_least_recently_used():
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=2)
+    assert limiter.acquire("a", now=0) == 0
+    assert limiter.acquire("b", now=0) == 0
+    assert limiter.acquire("a", now=0) > 0
+    # "b" is the least recently used and is evicted
+    assert limiter.acquire("c", now=0) == 0
+    assert list(limiter.buckets) == ["a", "c"]
+    assert limiter.acquire("b", now=0) == 0
+
+async def test_get_position_is_rate_limited():
+    user_queue = UserQueue(max_size=10, queue_head_timeout=60)
+    rate_limiter = RateLimiter(ip_rate=0.1, ip_burst=100, access_key_rate=0.1, access_key_burst=2, max_keys=10)
+    x = SimpleNamespace(
+        app=SimpleNamespace(state=SimpleNamespace(user_queue=user_queue, rate_limiter=rate_limiter)),
+        client=SimpleNamespace(host="127.0.0.1"),
+    )
+    request = RequestGetPositionRequest(access_key="mpc")
+    await routes.get_position(request, x)
+    await routes.get_position(request, x)
+    with pytest.raises(HTTPException) as e:
+        await routes.get_position(request, x)
+    assert e.value.status_code == 429
+    assert int(e.value.headers["Retry-After"]) >= 1
+    # Another access key from the same IP is still allowed
+    await routes.get_position(RequestGetPositionRequest(access_key="apple"), x)
+
+
+def test_client_ip_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(routes.settings, "rate_limit_trusted_proxies", ["10.0.0.1", "10.0.0.2"])
+
+    def request(host: str, forwarded_for: str):
+        return SimpleNamespace(client=SimpleNamespace(host=host), headers={"x-forwarded-for": forwarded_for})
+
+    # The client can prepend addresses, the proxies append the address they got the request from
+    assert get_client_ip(request("10.0.0.1", "1.1.1.1, 2.2.2.2")) == "2.2.2.2"
+    assert get_client_ip(request("10.0.0.1", "2.2.2.2, 10.0.0.2")) == "2.2.2.2"
+    # Not sent by a trusted proxy, so the header is ignored
+    assert get_client_ip(request("3.3.3.3", "2.2.2.2")) == "3.3.3.3"
+    assert get_client_ip(request("10.0.0.1", "")) == "10.0.0.1"
@@ -0,0 +1,142 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from mpc_demo_infra.coordination_server.sqlite_user_queue import SqliteUserQueue
+from mpc_demo_infra.coordination_server.user_queue import AddResult
+from mpc_demo_infra.coordination_server.locks import SqliteLeaseLock
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "queue.db")
+
+def get_queue(db_path: str, max_size: int = 10, queue_head_timeout: int = 60) -> SqliteUserQueue:
+    return SqliteUserQueue(db_path, max_size=max_size, queue_head_timeout=queue_head_timeout)
+
+def test_get_position_multiple_users(db_path):
+    q = get_queue(db_path)
+    assert q.get_position('mpc') is None
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    assert q.add_user('orange') == AddResult.SUCCEEDED
+    assert q.get_position('mpc') == 0
+    assert q.get_position('apple') == 1
+    assert q.get_position('orange') == 2
+    assert q.size() == 3
+
+def test_queue_is_shared_between_instances(db_path):
+    # Each worker process opens its own connection to the same database
+    q1 = get_queue(db_path)
+    q2 = get_queue(db_path)
+    assert q1.add_user('mpc') == AddResult.SUCCEEDED
+    assert q2.add_user('mpc') == AddResult.ALREADY_IN_QUEUE
+    assert q2.add_user('apple') == AddResult.SUCCEEDED
+    assert q1.get_position('apple') == 1
+
+    key1 = q2.get_computation_key('mpc')
+    assert key1 is not None
+    assert q1.validate_computation_key('mpc', key1) == True
+    assert q1.finish_computation('mpc', key1) == True
+    assert q2.finish_computation('mpc', key1) == False
+    assert q2.get_position('apple') == 0
+
+def test_get_pop_finish(db_path):
+    q = get_queue(db_path)
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+
+    key1 = q.get_computation_key('mpc')
+    assert key1 is not None
+    assert q.get_computation_key('apple') is None
+    assert q.validate_computation_key('mpc', key1 + 'abc') == False
+    assert q.validate_computation_key('cpm', key1) == False
+
+    assert q.finish_computation('mpc', key1) == True
+    assert q.validate_computation_key('mpc', key1) == False
+
+    key2 = q.get_computation_key('apple')
+    assert key2 is not None
+    assert q.finish_computation('apple', key2) == True
+    assert q.finish_computation('apple', key2) == False
+    assert q.size() == 0
+
+def test_queue_head_timeout(db_path):
+    q = get_queue(db_path, queue_head_timeout=1)
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    assert q.get_computation_key('mpc') is not None
+
+    time.sleep(2)
+
+    assert q.get_computation_key('mpc') is None
+    assert q.get_position('mpc') is None
+    key2 = q.get_computation_key('apple')
+    assert key2 is not None
+    assert q.get_position('apple') == 0
+    assert q.validate_computation_key('apple', key2) == True
+
+def test_add_user(db_path):
+    q = get_queue(db_path, max_size=2)
+    assert q.add_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_user('mpc') == AddResult.ALREADY_IN_QUEUE
+    assert q.add_user('apple') == AddResult.SUCCEEDED
+    assert q.add_user('orange') == AddResult.QUEUE_IS_FULL
+
+def test_add_priority_user(db_path):
+    q = get_queue(db_path)
+    # Same order as the in-memory queue: the latest priority user comes right after the head
+    assert q.add_priority_user('mpc') == AddResult.SUCCEEDED
+    assert q.add_priority_user('zk') == AddResult.SUCCEEDED
+    assert q.add_user('fhe') == AddResult.SUCCEEDED
+    assert q.add_priority_user('ot') == AddResult.SUCCEEDED
+    assert q.add_user('gc') == AddResult.SUCCEEDED
+    assert q._queue_to_str() == 'mpc, ot, zk, fhe, gc'
+
+def test_lease_lock(db_path):
+    async def run():
+        lock1 = SqliteLeaseLock(db_path, "sharing_data", lease_seconds=60, poll_interval=0.01)
+        lock2 = SqliteLeaseLock(db_path, "sharing_data", lease_seconds=60, poll_interval=0.01)
+        await lock1.acquire()
+        assert await lock2.locked()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(lock2.acquire(), 0.1)
+        await lock1.release()
+        assert not await lock2.locked()
+        await asyncio.wait_for(lock2.acquire(), 1)
+        await lock2.release()
+
+        # An expired lease is taken over
+        lock3 = SqliteLeaseLock(db_path, "sharing_data", lease_seconds=0, poll_interval=0.01)
+        await lock3.acquire()
+        await asyncio.wait_for(lock1.acquire(), 1)
+        await lock1.release()
+    asyncio.run(run())
+
+def test_lease_lock_runs_off_the_event_loop(db_path):
+    async def run():
+        lock = SqliteLeaseLock(db_path, "sharing_data", lease_seconds=60, poll_interval=0.01)
+        await lock.acquire()
+        # Another connection holds the write lock, so the queries wait on the busy timeout
+        blocker = sqlite3.connect(db_path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        release = asyncio.create_task(lock.release())
+        await asyncio.sleep(0.3)
+        blocker.execute("COMMIT")
+        await release
+        ticker.cancel()
+        # The loop kept running while the release waited
+        assert ticks >= 10
+        assert not await lock.locked()
+    asyncio.run(run())
@@ -0,0 +1,21 @@
+import pytest
+from pydantic import ValidationError
+
+from mpc_demo_infra.computation_party_server import routes
+from mpc_demo_infra.computation_party_server.config import Settings
+from mpc_demo_infra.query_descriptor import QueryDescriptor, Statistic
+
+
+def test_query_program_compares_at_stats_bits(tmp_path, monkeypatch):
+    monkeypatch.setattr(routes, "MPSPDZ_PROGRAM_DIR", tmp_path)
+    query = QueryDescriptor(statistics=[Statistic.MEDIAN])
+    _, program_path = routes.generate_computation_query_program(15000, 10, 5, query, stats_bits=128)
+    program = program_path.read_text()
+    assert "STATS_BITS = 128\nprogram.set_bit_length(STATS_BITS)" in program
+    assert "{stats_bits}" not in program
+
+
+def test_stats_bits_cannot_exceed_program_bits():
+    assert Settings(program_bits=256, stats_bits=64).stats_bits == 64
+    with pytest.raises(ValidationError):
+        Settings(program_bits=64, stats_bits=128)
@@ -0,0 +1,31 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from mpc_demo_infra.tlsn_proof import TLSNProof, parse_tlsn_proof, WORDS_PER_LABEL
+
+TESTS_DIR = Path(__file__).parent
+
+
+def test_fields():
+    tlsn_proof = (TESTS_DIR / "proof.json").read_text()
+    document = json.loads(tlsn_proof)
+    proof = parse_tlsn_proof(tlsn_proof)
+    encodings = document["encodings"]
+    _, (_, commitment) = next(iter(document["substrings"]["private_openings"].items()))
+    assert proof.data_commitment_hash == bytes(commitment["hash"]).hex()
+    assert proof.num_bytes_input == len(encodings)
+    assert proof.delta == bytes(encodings[0]["U8"]["state"]["delta"]).hex()
+    assert len(proof.zero_encodings) == WORDS_PER_LABEL * len(encodings)
+    assert proof.zero_encodings[-1] == bytes(encodings[-1]["U8"]["labels"][-1]).hex()
+    assert json.loads(proof.canonical_json) == document
+    # Parsed once
+    assert parse_tlsn_proof(tlsn_proof) is proof
+
+
+def test_inconsistent_deltas():
+    document = json.loads((TESTS_DIR / "proof.json").read_text())
+    document["encodings"][1]["U8"]["state"]["delta"] = [0] * 16
+    with pytest.raises(ValueError):
+        TLSNProof(json.dumps(document)).zero_encodings
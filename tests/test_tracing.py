@@ -0,0 +1,106 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+
+from mpc_demo_infra import tracing
+from mpc_demo_infra.coordination_server import routes
+from mpc_demo_infra.coordination_server.user_queue import UserQueue
+from mpc_demo_infra.tracing import TracingMiddleware, configure_tracing, current_trace_id, parse_traceparent, span, trace_headers
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_SPAN_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exported_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    configure_tracing("test", str(path))
+
+    def read():
+        spans = []
+        for line in path.read_text().splitlines():
+            resource_spans = json.loads(line)["resourceSpans"][0]
+            assert resource_spans["resource"]["attributes"][0] == {"key": "service.name", "value": {"stringValue": "test"}}
+            spans += resource_spans["scopeSpans"][0]["spans"]
+        return spans
+
+    yield read
+    configure_tracing("test", "")
+
+
+def test_spans_nest_and_export_otlp_json(exported_spans):
+    with span("share_data") as parent:
+        with span("verify", program="share_data", num_bytes=100):
+            pass
+        with pytest.raises(RuntimeError):
+            with span("mpc_run"):
+                raise RuntimeError("VM crashed")
+    assert current_trace_id() is None
+
+    verify, mpc_run, share_data = exported_spans()
+    assert share_data["traceId"] == verify["traceId"] == mpc_run["traceId"] == parent.context.trace_id
+    assert "parentSpanId" not in share_data
+    assert verify["parentSpanId"] == mpc_run["parentSpanId"] == share_data["spanId"]
+    assert verify["attributes"] == [
+        {"key": "program", "value": {"stringValue": "share_data"}},
+        {"key": "num_bytes", "value": {"intValue": "100"}},
+    ]
+    assert verify["status"] == {"code": tracing.STATUS_CODE_OK}
+    assert mpc_run["status"] == {"code": tracing.STATUS_CODE_ERROR, "message": "RuntimeError: VM crashed"}
+    assert int(share_data["startTimeUnixNano"]) <= int(verify["startTimeUnixNano"]) <= int(share_data["endTimeUnixNano"])
+
+
+def test_traceparent():
+    span_context = parse_traceparent(f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01")
+    assert (span_context.trace_id, span_context.span_id) == (TRACE_ID, PARENT_SPAN_ID)
+    assert span_context.to_traceparent() == f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01"
+    for invalid in [None, "", "00-123-456-01", f"01-{TRACE_ID}"]:
+        assert parse_traceparent(invalid) is None
+    assert trace_headers() == {}
+
+
+async def test_middleware_continues_the_trace(exported_spans):
+    app = FastAPI()
+    app.add_middleware(TracingMiddleware)
+
+    @app.get("/trace")
+    async def trace():
+        return trace_headers()
+
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "path": "/trace",
+        "raw_path": b"/trace",
+        "query_string": b"",
+        "headers": [(b"traceparent", f"00-{TRACE_ID}-{PARENT_SPAN_ID}-01".encode())],
+    }
+    body = b""
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal body
+        if message["type"] == "http.response.body":
+            body += message.get("body", b"")
+
+    await app(scope, receive, send)
+    [server_span] = exported_spans()
+    assert server_span["name"] == "GET /trace"
+    assert server_span["traceId"] == TRACE_ID
+    assert server_span["parentSpanId"] == PARENT_SPAN_ID
+    assert server_span["kind"] == tracing.SPAN_KIND_SERVER
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in server_span["attributes"]
+    # The next hop continues from the server span
+    assert json.loads(body) == {"traceparent": f"00-{TRACE_ID}-{server_span['spanId']}-01"}
+
+
+def test_add_user_returns_the_trace_id():
+    x = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(user_queue=UserQueue(10, 60))))
+    with span("POST /add_user_to_queue") as server_span:
+        response = routes.add_user_impl(x.app.state.user_queue.add_user, x, "user_1", "add_user_to_queue")
+    assert response.trace_id == server_span.context.trace_id
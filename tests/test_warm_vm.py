@@ -0,0 +1,116 @@
+import pytest
+
+from mpc_demo_infra.computation_party_server import routes
+from mpc_demo_infra.computation_party_server.config import ExecutionProfile
+from mpc_demo_infra.computation_party_server.metrics import WARM_VM_JOBS
+from mpc_demo_infra.computation_party_server.warm_vm import JOB_DONE_MARKER, WarmVMError, WarmVMPool
+from mpc_demo_infra.coordination_server import routes as coord_routes
+from mpc_demo_infra.query_descriptor import QueryDescriptor
+
+# Serves two queries, then waits like a VM for its next client
+TWO_JOBS_COMMAND = f"printf 'first\\n{JOB_DONE_MARKER}\\nsecond\\n{JOB_DONE_MARKER}\\n'; sleep 10"
+
+
+@pytest.fixture
+def pool():
+    pool = WarmVMPool()
+    yield pool
+    pool.stop()
+
+
+def test_vm_serves_jobs_until_stopped(pool, tmp_path):
+    vm = pool.start("key", TWO_JOBS_COMMAND, str(tmp_path), num_jobs=10)
+    assert pool.get("key") is vm
+    assert pool.run_job(vm, timeout=5) == ["first"]
+    assert pool.run_job(vm, timeout=5) == ["second"]
+    assert vm.jobs_left == 8
+
+    failed = WARM_VM_JOBS.value("failed")
+    with pytest.raises(WarmVMError):
+        pool.run_job(vm, timeout=0.2)
+    assert WARM_VM_JOBS.value("failed") == failed + 1
+    # A VM whose job failed is stopped, the next query starts a new one
+    assert pool.get("key") is None
+    assert vm.process.poll() is not None
+
+
+def test_vm_exiting_fails_the_job(pool, tmp_path):
+    vm = pool.start("key", "echo starting; exit 3", str(tmp_path), num_jobs=10)
+    with pytest.raises(WarmVMError, match="exited with 3"):
+        pool.run_job(vm, timeout=5)
+
+
+def test_other_program_replaces_the_vm(pool, tmp_path):
+    vm = pool.start("key", TWO_JOBS_COMMAND, str(tmp_path), num_jobs=10)
+    assert pool.get("other_key") is None
+    assert vm.process.wait(timeout=5) is not None
+
+
+def test_vm_is_replaced_after_max_jobs(pool, tmp_path):
+    vm = pool.start("key", TWO_JOBS_COMMAND, str(tmp_path), num_jobs=1)
+    pool.run_job(vm, timeout=5)
+    assert pool.get("key") is None
+
+
+def test_query_program_serves_num_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(routes, "MPSPDZ_PROGRAM_DIR", tmp_path)
+    _, program_path = routes.generate_computation_query_program(15000, 10, 5, QueryDescriptor(), num_jobs=100)
+    program = program_path.read_text()
+    assert "NUM_JOBS = 100\n" in program
+    assert f"JOB_DONE_MARKER = {JOB_DONE_MARKER!r}\n" in program
+
+
+def test_other_client_replaces_the_vm(tmp_path, monkeypatch):
+    started = []
+
+    class FakePool(WarmVMPool):
+        def start(self, key, command, cwd, num_jobs):
+            started.append(key)
+            return super().start(key, TWO_JOBS_COMMAND, cwd, num_jobs)
+
+    pool = FakePool()
+    monkeypatch.setattr(routes, "warm_vm_pool", pool)
+    monkeypatch.setattr(routes, "compile_program", lambda circuit_name, profile: None)
+    monkeypatch.setattr(routes, "mpc_vm_command", lambda *args: "")
+    program_path = tmp_path / "query.mpc"
+    program_path.write_text("program")
+    try:
+        for client_cert_file in ["cert A", "cert A", "cert B"]:
+            routes.run_warm_computation_query_program("query", program_path, "ip", ExecutionProfile(), client_cert_file)
+    finally:
+        pool.stop()
+    # The second query of client A reuses its VM
+    assert len(started) == 2 and started[0] != started[1]
+
+
+def test_reset_stops_the_vm(tmp_path, monkeypatch):
+    pool = WarmVMPool()
+    monkeypatch.setattr(routes, "warm_vm_pool", pool)
+    vm = pool.start("key", TWO_JOBS_COMMAND, str(tmp_path), num_jobs=10)
+    routes.reset_warm_vm()
+    assert pool.get("key") is None
+    assert vm.process.poll() is not None
+
+
+async def test_coordination_server_resets_all_parties(monkeypatch):
+    posted = []
+
+    class FakeResponse:
+        status = 200
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *args):
+            pass
+
+    class FakeSession:
+        def post(self, url, headers):
+            posted.append(url)
+            return FakeResponse()
+
+    await coord_routes.reset_warm_vms_all_parties(FakeSession())
+    assert sorted(posted) == sorted(
+        f"http://{host}:{port}/reset_warm_vm"
+        for host, port in zip(coord_routes.settings.party_hosts, coord_routes.settings.party_ports)
+    )